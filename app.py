@@ -4,25 +4,34 @@ Flask Application für Vercel Serverless
 """
 
 import os
-import feedparser
-import google.generativeai as genai
-from flask import Flask, render_template_string, request, Response
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import requests
-from datetime import datetime, timezone
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import signal
+import socket
+import threading
+import click
+from flask import Flask, render_template_string, request, Response, stream_with_context
+from datetime import datetime, timedelta, timezone
+import email.utils
+import json
 import logging
+import sqlite3
 import time
 import re
-from urllib.parse import quote_plus
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from collections import deque
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from urllib.parse import quote_plus, urlparse
+from html import unescape
+from html.entities import name2codepoint
+from xml.etree.ElementTree import XMLPullParser, ParseError
 
-# Load environment variables
-load_dotenv()
+# Heavy dependencies (google.generativeai, supabase, httpx, requests, smtplib)
+# are imported on first use so that dashboard and /health requests on a cold
+# serverless instance don't pay for clients only the cron path needs.
+
+# Load environment variables from a local .env file (Vercel injects them directly)
+if os.path.exists('.env') or os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 app = Flask(__name__)
 
@@ -42,57 +51,1409 @@ BASIC_AUTH_USER = os.getenv('BASIC_AUTH_USER', 'admin')
 BASIC_AUTH_PASSWORD = os.getenv('BASIC_AUTH_PASSWORD', 'changeme')
 CRON_SECRET = os.getenv('CRON_SECRET', 'change-this-secret-token')
 
-# Initialize Supabase (lazy initialization)
-supabase: Client = None
-supabase_error = None
-if SUPABASE_URL and SUPABASE_KEY:
-    try:
-        # Remove trailing slash if present and ensure proper format
-        supabase_url_clean = SUPABASE_URL.rstrip('/')
-        # Initialize Supabase client
-        supabase = create_client(supabase_url_clean, SUPABASE_KEY)
-        logging.info("Supabase initialized successfully")
-    except Exception as e:
-        supabase_error = str(e)
-        logging.error(f"Failed to initialize Supabase: {e}")
-        import traceback
-        logging.error(traceback.format_exc())
-else:
-    if not SUPABASE_URL:
-        supabase_error = "SUPABASE_URL is not set"
-    elif not SUPABASE_KEY:
-        supabase_error = "SUPABASE_KEY is not set"
+# Storage backend: 'supabase' (default) or 'sqlite' (embedded, WAL mode)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase').strip().lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'arbibot.db')
 
-# Initialize Gemini AI (lazy initialization)
 # Using gemini-2.0-flash-lite for best free tier compatibility (30 RPM, 1M TPM)
-gemini_model = None
 GEMINI_MODEL_NAME = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-lite')  # Default to 2.0-flash-lite for free tier (30 RPM)
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        logging.info(f"Gemini initialized with model: {GEMINI_MODEL_NAME}")
-    except Exception as e:
-        logging.error(f"Failed to initialize Gemini: {e}")
-
-# Create requests session with retry strategy for eBay API
-session = requests.Session()
-retry_strategy = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["GET"]
-)
-adapter = HTTPAdapter(max_retries=retry_strategy)
-session.mount("https://", adapter)
 
-# RSS Feed Sources
+
+def _parse_host_timeouts(value):
+    """Parse "host=seconds,..." into {host: seconds}; malformed entries are logged and skipped
+    so that the host keeps HTTP_TIMEOUT_SECONDS instead of failing the import"""
+    timeouts = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        host, _, seconds = item.partition('=')
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            seconds = None
+        if not host.strip() or seconds is None or not 0 < seconds < float('inf'):
+            logging.warning(f"Ignoring invalid HTTP_HOST_TIMEOUTS entry '{item.strip()}' (expected host=seconds)")
+            continue
+        timeouts[host.strip().lower()] = seconds
+    return timeouts
+
+
+# Shared HTTP client for feed downloads
+HTTP_TIMEOUT_SECONDS = float(os.getenv('HTTP_TIMEOUT_SECONDS', '15'))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('HTTP_CONNECT_TIMEOUT_SECONDS', '5'))
+# Per-host read timeouts, e.g. "www.mydealz.de=10,schnaeppchenfuchs.com=20"
+HTTP_HOST_TIMEOUTS = _parse_host_timeouts(os.getenv('HTTP_HOST_TIMEOUTS', ''))
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '10'))
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'false').lower() == 'true'  # Requires the 'h2' package
+HTTP_USER_AGENT = os.getenv('HTTP_USER_AGENT', 'Mozilla/5.0 (compatible; ArbiBot/1.0)')
+
+# Token-lean product extraction with Gemini (structured JSON output)
+GEMINI_DESCRIPTION_CHARS = int(os.getenv('GEMINI_DESCRIPTION_CHARS', '400'))  # Plain-text description chars per entry
+
+EXTRACTION_SYSTEM_INSTRUCTION = """Extrahiere physische Produkte mit Preis aus deutschen Deal-Einträgen (Titel + Beschreibung).
+- Nur physische Produkte. Tarife/Verträge/SIM, Reisen/Hotels/Flüge, Abos/Streaming/Software, Gutscheine/Cashback, Dienstleistungen/Versicherungen/Finanzprodukte, Events/Tickets: products = [].
+- Mehrere Produkte (inkl., +, GRATIS, und): jedes einzeln, jedes mit dem GESAMTEN Preis.
+- name: kurz für die eBay-Suche, Marke + Modell, max. 10 Wörter, ohne Marketingtext (GRATIS, inkl., Zugabe, Geschenk).
+- price: aktueller bzw. niedrigster Preis in Euro, ohne Versand; 0 wenn kein Preis genannt ist.
+- confidence: 0 bis 1, wie sicher Name und Preis stimmen.
+Beispiel: "Bosch Professional GHG 18V-50 inkl. L-BOXX + GRATIS Akkupack ProCORE18V 4.0Ah für 164,90€" -> products: [{"name": "Bosch Professional GHG 18V-50", "price": 164.9, "confidence": 0.95}, {"name": "Bosch Professional ProCORE18V 4.0Ah", "price": 164.9, "confidence": 0.9}]"""
+
+EXTRACTION_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "products": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "price": {"type": "number"},
+                    "confidence": {"type": "number"}
+                },
+                "required": ["name", "price", "confidence"]
+            }
+        }
+    },
+    "required": ["products"]
+}
+
+# Tiered extraction: the cheap primary model handles all entries within its own rate budget,
+# low-confidence or multi-product results escalate to a stronger model and overflow spills to an
+# alternate model while the primary is throttled. An empty model name disables a tier.
+GEMINI_PRIMARY_RPM = int(os.getenv('GEMINI_PRIMARY_RPM', '30'))
+GEMINI_ESCALATION_MODEL = os.getenv('GEMINI_ESCALATION_MODEL', 'gemini-2.0-flash').strip()
+GEMINI_ESCALATION_RPM = int(os.getenv('GEMINI_ESCALATION_RPM', '15'))
+GEMINI_OVERFLOW_MODEL = os.getenv('GEMINI_OVERFLOW_MODEL', 'gemini-2.5-flash-lite').strip()
+GEMINI_OVERFLOW_RPM = int(os.getenv('GEMINI_OVERFLOW_RPM', '15'))
+GEMINI_ESCALATION_CONFIDENCE = float(os.getenv('GEMINI_ESCALATION_CONFIDENCE', '0.7'))  # Escalate below this
+GEMINI_MAX_WAIT_SECONDS = float(os.getenv('GEMINI_MAX_WAIT_SECONDS', '60'))  # Max wait for a free rate slot per entry
+
+# Source extractors read product and price from structured feed fields / title layouts before Gemini
+SOURCE_EXTRACTORS_ENABLED = os.getenv('SOURCE_EXTRACTORS_ENABLED', 'true').lower() == 'true'
+SOURCE_EXTRACTOR_MIN_CONFIDENCE = float(os.getenv('SOURCE_EXTRACTOR_MIN_CONFIDENCE', '0.9'))  # Below: ask Gemini
+
+# Circuit breakers for external dependencies (eBay, Gemini, Supabase, SMTP)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))  # Consecutive failures until open
+CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', '60'))  # Open time before a half-open probe
+EBAY_CALL_DEADLINE_SECONDS = float(os.getenv('EBAY_CALL_DEADLINE_SECONDS', '20'))  # Per eBay provider incl. retries
+EBAY_REQUEST_TIMEOUT_SECONDS = 15
+EBAY_MAX_ATTEMPTS = 3  # Per request, 429/5xx and network errors are retried while the deadline allows
+
+# Market price providers, queried in parallel per product (see fetch_market_prices)
+PRICE_PROVIDERS = [name.strip() for name in os.getenv('PRICE_PROVIDERS', 'ebay_sold,ebay_offer,price_history').split(',') if name.strip()]
+PRICE_LOOKUP_BUDGET_SECONDS = float(os.getenv('PRICE_LOOKUP_BUDGET_SECONDS', str(EBAY_CALL_DEADLINE_SECONDS)))
+PRICE_HEDGE_AFTER_SECONDS = float(os.getenv('PRICE_HEDGE_AFTER_SECONDS', '0'))  # 0 = no hedged requests (each costs eBay quota)
+PRICE_FANOUT_WORKERS = int(os.getenv('PRICE_FANOUT_WORKERS', '8'))
+PRICE_HISTORY_PROVIDER_WEIGHT = 0.5  # Rolling history counts half as much as live eBay sales
+STATIC_PRICES_FILE = os.getenv('STATIC_PRICES_FILE', '')  # JSON {"product name": price} for the 'static' provider
+
+# Import-time budget for app.py (checked with `flask --app app check-import-time`)
+IMPORT_TIME_BUDGET_MS = int(os.getenv('IMPORT_TIME_BUDGET_MS', '300'))
+IMPORT_TIME_RUNS = int(os.getenv('IMPORT_TIME_RUNS', '5'))  # The budget applies to the median of these runs
+# Modules that must not be loaded at import time
+LAZY_IMPORTS = ('google.generativeai', 'supabase', 'httpx', 'requests', 'smtplib')
+
+# Clients are created lazily by the accessor functions below
+_client_lock = threading.RLock()
+_supabase_client = None
+_supabase_initialized = False
+supabase_error = None
+_gemini_model = None
+_gemini_initialized = False
+gemini_error = None
+_gemini_extraction_models = {}
+_extraction_tiers = None
+_http_session = None
+_http_client = None
+_storage = None
+_smtp_connection = None
+_price_providers = None
+_price_executor = None
+_storage_initialized = False
+storage_error = None
+
+
+def get_supabase():
+    """Return the shared Supabase client, creating it on first use
+    Returns None if Supabase is not configured or initialization failed (see supabase_error)"""
+    global _supabase_client, _supabase_initialized, supabase_error
+    if _supabase_initialized:
+        return _supabase_client
+    with _client_lock:
+        if _supabase_initialized:
+            return _supabase_client
+        if not SUPABASE_URL:
+            supabase_error = "SUPABASE_URL is not set"
+        elif not SUPABASE_KEY:
+            supabase_error = "SUPABASE_KEY is not set"
+        else:
+            try:
+                from supabase import create_client
+                # Remove trailing slash if present and ensure proper format
+                _supabase_client = create_client(SUPABASE_URL.rstrip('/'), SUPABASE_KEY)
+                logging.info("Supabase initialized successfully")
+            except Exception as e:
+                supabase_error = str(e)
+                logging.error(f"Failed to initialize Supabase: {e}")
+                import traceback
+                logging.error(traceback.format_exc())
+        _supabase_initialized = True
+    return _supabase_client
+
+
+def get_gemini_model():
+    """Return the shared Gemini model, configuring the SDK on first use
+    Returns None if GEMINI_API_KEY is not set or initialization failed (see gemini_error)"""
+    global _gemini_model, _gemini_initialized, gemini_error
+    if _gemini_initialized:
+        return _gemini_model
+    with _client_lock:
+        if _gemini_initialized:
+            return _gemini_model
+        if not GEMINI_API_KEY:
+            gemini_error = "GEMINI_API_KEY is not set"
+        else:
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                logging.info(f"Gemini initialized with model: {GEMINI_MODEL_NAME}")
+            except Exception as e:
+                gemini_error = str(e)
+                logging.error(f"Failed to initialize Gemini: {e}")
+        _gemini_initialized = True
+    return _gemini_model
+
+
+def get_gemini_extraction_model(model_name=None):
+    """Return a cached Gemini model set up for product extraction
+    The compact rules are sent once as system instruction on the reused model object and replies are
+    constrained to JSON matching EXTRACTION_RESPONSE_SCHEMA. (Explicit context caching needs prompts of
+    32k+ tokens, far more than the extraction rules.)"""
+    model_name = model_name or GEMINI_MODEL_NAME
+    if model_name in _gemini_extraction_models:
+        return _gemini_extraction_models[model_name]
+    if not get_gemini_model():
+        return None
+    with _client_lock:
+        if model_name not in _gemini_extraction_models:
+            import google.generativeai as genai
+            _gemini_extraction_models[model_name] = genai.GenerativeModel(
+                model_name,
+                system_instruction=EXTRACTION_SYSTEM_INSTRUCTION,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": EXTRACTION_RESPONSE_SCHEMA,
+                    "temperature": 0
+                }
+            )
+    return _gemini_extraction_models[model_name]
+
+
+def get_http_client():
+    """Return the shared httpx client for feed downloads
+    Connections are kept alive between feeds, responses are decompressed transparently (gzip/deflate)
+    and HTTP/2 is used when HTTP2_ENABLED is set and the h2 package is installed"""
+    global _http_client
+    if _http_client is not None:
+        return _http_client
+    with _client_lock:
+        if _http_client is None:
+            import httpx
+            http2 = HTTP2_ENABLED
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logging.warning("HTTP2_ENABLED is set but the 'h2' package is not installed, using HTTP/1.1")
+                    http2 = False
+            limits = httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=60
+            )
+            _http_client = httpx.Client(
+                transport=httpx.HTTPTransport(http2=http2, limits=limits, retries=2),
+                timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+                headers={'User-Agent': HTTP_USER_AGENT},
+                follow_redirects=True
+            )
+    return _http_client
+
+
+def get_http_timeout(url):
+    """Return the httpx timeout for a URL, honoring HTTP_HOST_TIMEOUTS"""
+    import httpx
+    host = (urlparse(url).hostname or '').lower()
+    read_timeout = HTTP_HOST_TIMEOUTS.get(host, HTTP_TIMEOUT_SECONDS)
+    return httpx.Timeout(read_timeout, connect=min(HTTP_CONNECT_TIMEOUT_SECONDS, read_timeout))
+
+
+def get_http_session():
+    """Return the shared requests session for the eBay API
+    Retries are done by _ebay_get() so they stay within the call's deadline"""
+    global _http_session
+    if _http_session is not None:
+        return _http_session
+    with _client_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(max_retries=0))
+            _http_session = session
+    return _http_session
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one external dependency
+    closed -> open after failure_threshold failures in a row; after reset_seconds one half-open
+    probe call is let through, which closes the circuit on success or reopens it on failure"""
+    
+    def __init__(self, name, failure_threshold, reset_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.last_error_type = None
+        self.total_failures = 0
+        self.rejected_calls = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    def is_open(self):
+        """True while calls would be rejected (does not use up the half-open probe)"""
+        with self._lock:
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at < self.reset_seconds
+            return self.state == 'half_open' and self._probe_in_flight
+    
+    def allow(self):
+        """Check whether a call may go through; moves open -> half_open once reset_seconds have passed"""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected_calls += 1
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self, error=None):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self.last_error = str(error)[:200] if error is not None else None
+            self.last_error_type = type(error).__name__ if error is not None else None
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logging.warning(f"Circuit breaker '{self.name}' opened after {self.consecutive_failures} failures: {self.last_error}")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+    
+    def call(self, function, *args, **kwargs):
+        """Call function through the breaker, raising CircuitOpenError while it is open"""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit breaker '{self.name}' is open")
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+    
+    def snapshot(self, include_error_text=False):
+        """State for /health; the error text can contain request URLs with credentials (eBay
+        SECURITY-APPNAME), so it is only included for the authenticated /api/circuits"""
+        with self._lock:
+            retry_in = None
+            if self.state == 'open':
+                retry_in = round(max(self.reset_seconds - (time.monotonic() - self.opened_at), 0), 1)
+            snapshot = {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "rejected_calls": self.rejected_calls,
+                "retry_in_seconds": retry_in,
+                "last_error_type": self.last_error_type
+            }
+            if include_error_text:
+                snapshot["last_error"] = self.last_error
+            return snapshot
+
+
+CIRCUIT_BREAKERS = {
+    name: CircuitBreaker(name, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+    for name in ('ebay', 'gemini', 'supabase', 'smtp')
+}
+
+
+def get_circuit_breaker(name):
+    """Return the circuit breaker of a dependency ('ebay', 'gemini', 'supabase', 'smtp')"""
+    return CIRCUIT_BREAKERS[name]
+
+
+class StorageBackend(ABC):
+    """Persistence interface for logs, eBay queries, deals, the price-history cache, the feed registry
+    and retention. Rows are plain dicts using the column names from schema.sql"""
+    
+    name = None
+    
+    # Logs
+    @abstractmethod
+    def create_log(self, entry):
+        """Insert a log entry and return its id"""
+    
+    @abstractmethod
+    def update_log(self, log_id, fields):
+        """Update columns of a log entry"""
+    
+    @abstractmethod
+    def recent_logs(self, limit=100):
+        """Latest log entries, newest first"""
+    
+    @abstractmethod
+    def logs_updated_since(self, cursor, limit=100):
+        """Log entries with updated_at > cursor (ISO timestamp), oldest change first"""
+    
+    # Deals
+    @abstractmethod
+    def insert_deal(self, deal):
+        """Insert a profitable deal"""
+    
+    @abstractmethod
+    def recent_deals(self, limit=100):
+        """Latest deals, newest first"""
+    
+    @abstractmethod
+    def deals_after(self, deal_id, limit=100):
+        """Deals with id > deal_id, in insertion order"""
+    
+    @abstractmethod
+    def latest_deal_id(self):
+        """Highest deal id (0 if there are no deals)"""
+    
+    # eBay queries
+    @abstractmethod
+    def insert_ebay_query(self, entry):
+        """Insert an eBay query result"""
+    
+    @abstractmethod
+    def ebay_queries_for_log(self, log_id):
+        """eBay queries of one log entry, newest first"""
+    
+    @abstractmethod
+    def recent_ebay_queries(self, limit):
+        """Latest eBay queries (product_name, rss_price, ebay_sold_price), newest first"""
+    
+    # Price-history cache
+    @abstractmethod
+    def get_price_histories(self, canonical_names):
+        """product_price_history rows for the given canonical names"""
+    
+    @abstractmethod
+    def upsert_price_history(self, row):
+        """Insert or replace a product_price_history row"""
+    
+    # Feed registry
+    @abstractmethod
+    def enabled_feeds(self):
+        """Enabled rows of the feeds table, ordered by id"""
+    
+    @abstractmethod
+    def update_feed(self, feed_id, fields):
+        """Update columns of a feed"""
+    
+    # Entry backlog
+    @abstractmethod
+    def add_feed_entries(self, rows):
+        """Insert feed_entries rows as pending, keeping entries that are already known (key: feed_url, guid)"""
+    
+    @abstractmethod
+    def pending_feed_entries(self, feed_url, since, limit):
+        """Pending feed_entries of a feed first seen from since (ISO timestamp) on, newest first"""
+    
+    @abstractmethod
+    def mark_feed_entries_processed(self, feed_url, guids):
+        """Set the given entries of a feed to processed"""
+    
+    @abstractmethod
+    def purge_feed_entries(self, before):
+        """Delete feed_entries first seen before the ISO timestamp and return their count"""
+    
+    # Run lock
+    @abstractmethod
+    def acquire_run_lock(self, name, owner, lease_seconds):
+        """Take the lock if it is free, expired or already held by owner; returns True on success"""
+    
+    @abstractmethod
+    def renew_run_lock(self, name, owner, lease_seconds):
+        """Extend the lease of a lock held by owner; returns False if owner lost the lock"""
+    
+    @abstractmethod
+    def release_run_lock(self, name, owner):
+        """Release the lock if owner still holds it"""
+    
+    # Re-scoring
+    @abstractmethod
+    def rescore_ebay_queries(self, policy, live_threshold, since=None, page_size=None, progress=None):
+        """Score every ebay_query_prices row (ebay_queries plus the archived prices of compacted rows), optionally
+        from since on, under policy into ebay_query_scores (key: policy, query_id)
+        Returns {"rows", "scored", "profitable", "profit_sum", "live_rule_profitable" (gross profit > live_threshold)}"""
+    
+    # Search
+    @abstractmethod
+    def search_products(self, query, limit, offset=0):
+        """Deals and per-product eBay query history (raw and compacted) containing every query word, best match
+        first. Each source is cut to its best search_candidate_limit() rows before eBay queries are grouped
+        Rows: kind ('deal'/'query'), id, product_name, source, hits, rss_price, ebay_price, profit, last_seen, rank"""
+    
+    # Statistics rollup
+    @abstractmethod
+    def increment_daily_stats(self, day, source, counts):
+        """Atomically add STATS_COUNTERS (and profit_max as maximum) to the stats_daily row of day and source"""
+    
+    @abstractmethod
+    def daily_stats(self, since_day):
+        """stats_daily rows from since_day (ISO date) on, newest first"""
+    
+    # Profiles
+    @abstractmethod
+    def insert_profile(self, row):
+        """Store a run profile and return its id"""
+    
+    @abstractmethod
+    def recent_profiles(self, limit=50):
+        """Latest profiles without their stacks, newest first"""
+    
+    @abstractmethod
+    def get_profile(self, profile_id):
+        """A profile including collapsed stacks and report, or None"""
+    
+    # Maintenance
+    @abstractmethod
+    def run_retention(self, query_retention_days, log_retention_days):
+        """Compact old eBay queries into daily summaries and delete old logs
+        Returns {"ebay_queries_compacted": n, "logs_deleted": m}"""
+    
+    def close(self):
+        """Release connections held by this backend (worker shutdown)"""
+        pass
+
+
+class SupabaseStorage(StorageBackend):
+    """Storage on Supabase (PostgreSQL via PostgREST), the default backend"""
+    
+    name = 'supabase'
+    
+    def __init__(self, client):
+        self.client = client
+    
+    @staticmethod
+    def _execute(request):
+        """Execute a PostgREST request through the Supabase circuit breaker"""
+        return get_circuit_breaker('supabase').call(request.execute)
+    
+    @staticmethod
+    def _rows(response):
+        return response.data if hasattr(response, 'data') and response.data else []
+    
+    def create_log(self, entry):
+        rows = self._rows(self._execute(self.client.table('logs').insert(entry)))
+        if rows and rows[0].get('id'):
+            return rows[0]['id']
+        # Fallback if the insert didn't return the row
+        latest = self._rows(self._execute(self.client.table('logs').select('id').eq('source', entry['source']).order('timestamp', desc=True).limit(1)))
+        return latest[0]['id'] if latest else None
+    
+    def update_log(self, log_id, fields):
+        self._execute(self.client.table('logs').update(fields).eq('id', log_id))
+    
+    def recent_logs(self, limit=100):
+        return self._rows(self._execute(self.client.table('logs').select('*').order('timestamp', desc=True).limit(limit)))
+    
+    def logs_updated_since(self, cursor, limit=100):
+        return self._rows(self._execute(self.client.table('logs').select('*').gt('updated_at', cursor).order('updated_at').limit(limit)))
+    
+    def insert_deal(self, deal):
+        self._execute(self.client.table('deals').insert(deal))
+    
+    def recent_deals(self, limit=100):
+        return self._rows(self._execute(self.client.table('deals').select('*').order('timestamp', desc=True).limit(limit)))
+    
+    def deals_after(self, deal_id, limit=100):
+        return self._rows(self._execute(self.client.table('deals').select('*').gt('id', deal_id).order('id').limit(limit)))
+    
+    def latest_deal_id(self):
+        rows = self._rows(self._execute(self.client.table('deals').select('id').order('id', desc=True).limit(1)))
+        return rows[0]['id'] if rows else 0
+    
+    def insert_ebay_query(self, entry):
+        self._execute(self.client.table('ebay_queries').insert(entry))
+    
+    def ebay_queries_for_log(self, log_id):
+        return self._rows(self._execute(self.client.table('ebay_queries').select('*').eq('log_id', log_id).order('timestamp', desc=True)))
+    
+    def recent_ebay_queries(self, limit):
+        return self._rows(self._execute(self.client.table('ebay_queries').select('product_name, rss_price, ebay_sold_price').order('timestamp', desc=True).limit(limit)))
+    
+    def get_price_histories(self, canonical_names):
+        rows = []
+        for offset in range(0, len(canonical_names), 100):
+            batch = canonical_names[offset:offset + 100]
+            rows.extend(self._rows(self._execute(self.client.table('product_price_history').select('*').in_('canonical_name', batch))))
+        return rows
+    
+    def upsert_price_history(self, row):
+        self._execute(self.client.table('product_price_history').upsert(row, on_conflict='canonical_name'))
+    
+    def enabled_feeds(self):
+        return self._rows(self._execute(self.client.table('feeds').select('*').eq('enabled', True).order('id')))
+    
+    def update_feed(self, feed_id, fields):
+        self._execute(self.client.table('feeds').update(fields).eq('id', feed_id))
+    
+    def add_feed_entries(self, rows):
+        if rows:
+            self._execute(self.client.table('feed_entries').upsert(rows, on_conflict='feed_url,guid', ignore_duplicates=True))
+    
+    def pending_feed_entries(self, feed_url, since, limit):
+        return self._rows(self._execute(
+            self.client.table('feed_entries').select('*').eq('feed_url', feed_url).eq('status', 'pending')
+            .gte('first_seen_at', since).order('first_seen_at', desc=True).limit(limit)
+        ))
+    
+    def mark_feed_entries_processed(self, feed_url, guids):
+        for offset in range(0, len(guids), 100):
+            self._execute(self.client.table('feed_entries').update({"status": "processed", "processed_at": _utc_now_iso()})
+                          .eq('feed_url', feed_url).in_('guid', guids[offset:offset + 100]))
+    
+    def purge_feed_entries(self, before):
+        return len(self._rows(self._execute(self.client.table('feed_entries').delete().lt('first_seen_at', before))))
+    
+    def acquire_run_lock(self, name, owner, lease_seconds):
+        params = {"p_name": name, "p_owner": owner, "p_lease_seconds": lease_seconds}
+        return bool(self._execute(self.client.rpc('acquire_run_lock', params)).data)
+    
+    def renew_run_lock(self, name, owner, lease_seconds):
+        params = {"p_name": name, "p_owner": owner, "p_lease_seconds": lease_seconds}
+        return bool(self._execute(self.client.rpc('renew_run_lock', params)).data)
+    
+    def release_run_lock(self, name, owner):
+        self._execute(self.client.rpc('release_run_lock', {"p_name": name, "p_owner": owner}))
+    
+    def rescore_ebay_queries(self, policy, live_threshold, since=None, page_size=None, progress=None):
+        """One set-based rescore_ebay_queries() call in schema.sql instead of a round trip per page"""
+        rows = self._rows(self._execute(self.client.rpc('rescore_ebay_queries', {
+            "p_policy": policy.name, "p_fee_rate": policy.fee_rate, "p_fixed_fee": policy.fixed_fee,
+            "p_shipping": policy.shipping_cost, "p_threshold": policy.threshold, "p_since": since,
+            "p_live_threshold": live_threshold
+        })))
+        row = rows[0] if rows else {}
+        totals = {
+            "rows": int(row.get('row_count') or 0),
+            "scored": int(row.get('scored') or 0),
+            "profitable": int(row.get('profitable') or 0),
+            "profit_sum": round(float(row.get('profit_sum') or 0), 2),
+            "live_rule_profitable": int(row.get('live_rule_profitable') or 0)
+        }
+        if progress:
+            progress(totals)
+        return totals
+    
+    def search_products(self, query, limit, offset=0):
+        return self._rows(self._execute(self.client.rpc('search_products', {
+            "p_query": query, "p_limit": limit, "p_offset": offset, "p_candidates": search_candidate_limit(limit, offset)
+        })))
+    
+    def increment_daily_stats(self, day, source, counts):
+        self._execute(self.client.rpc('increment_stats_daily', {"p_day": day, "p_source": source, "p_counts": counts}))
+    
+    def daily_stats(self, since_day):
+        return self._rows(self._execute(self.client.table('stats_daily').select('*').gte('day', since_day).order('day', desc=True)))
+    
+    def insert_profile(self, row):
+        rows = self._rows(self._execute(self.client.table('profiles').insert(row)))
+        return rows[0]['id'] if rows else None
+    
+    def recent_profiles(self, limit=50):
+        return self._rows(self._execute(self.client.table('profiles').select(PROFILE_LIST_COLUMNS).order('created_at', desc=True).limit(limit)))
+    
+    def get_profile(self, profile_id):
+        rows = self._rows(self._execute(self.client.table('profiles').select('*').eq('id', profile_id).limit(1)))
+        return rows[0] if rows else None
+    
+    def run_retention(self, query_retention_days, log_retention_days):
+        response = self._execute(self.client.rpc('run_retention', {
+            "p_query_retention_days": query_retention_days,
+            "p_log_retention_days": log_retention_days
+        }))
+        return response.data
+
+
+# Schema of the embedded SQLite backend (mirrors schema.sql; timestamps are ISO strings in UTC)
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL,
+    products_found INTEGER DEFAULT 0,
+    message TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_logs_updated_at ON logs(updated_at);
+
+CREATE TABLE IF NOT EXISTS deals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    source TEXT NOT NULL,
+    product_name TEXT NOT NULL,
+    product_url TEXT,
+    rss_price REAL NOT NULL,
+    ebay_price REAL NOT NULL,
+    profit REAL NOT NULL,
+    ebay_fees REAL DEFAULT 0,
+    rss_item_title TEXT,
+    rss_item_link TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deals_timestamp ON deals(timestamp DESC);
+
+CREATE TABLE IF NOT EXISTS ebay_queries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    log_id INTEGER,
+    source TEXT NOT NULL,
+    product_name TEXT NOT NULL,
+    rss_price REAL,
+    ebay_price REAL,
+    ebay_sold_price REAL,
+    ebay_offer_price REAL,
+    ebay_median_price REAL,
+    ebay_items_found INTEGER DEFAULT 0,
+    ebay_sold_items_found INTEGER DEFAULT 0,
+    ebay_offer_items_found INTEGER DEFAULT 0,
+    profit REAL,
+    query_successful INTEGER DEFAULT 0,
+    error_message TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ebay_queries_log_id ON ebay_queries(log_id);
+CREATE INDEX IF NOT EXISTS idx_ebay_queries_timestamp ON ebay_queries(timestamp DESC);
+
+CREATE TABLE IF NOT EXISTS ebay_query_daily_summaries (
+    day TEXT NOT NULL,
+    source TEXT NOT NULL,
+    product_name TEXT NOT NULL,
+    query_count INTEGER DEFAULT 0,
+    successful_count INTEGER DEFAULT 0,
+    avg_rss_price REAL,
+    rss_price_count INTEGER DEFAULT 0,
+    min_sold_price REAL,
+    median_sold_price REAL,
+    max_sold_price REAL,
+    min_offer_price REAL,
+    max_profit REAL,
+    PRIMARY KEY (day, source, product_name)
+);
+
+CREATE TABLE IF NOT EXISTS product_price_history (
+    canonical_name TEXT PRIMARY KEY,
+    product_name TEXT NOT NULL,
+    sample_count INTEGER DEFAULT 0,
+    median_price REAL,
+    min_price REAL,
+    last_price REAL,
+    trend_slope REAL,
+    samples TEXT DEFAULT '[]',
+    first_seen TEXT,
+    last_seen TEXT,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS feeds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    name TEXT,
+    enabled INTEGER DEFAULT 1,
+    max_entries INTEGER,
+    poll_interval_minutes INTEGER DEFAULT 120,
+    min_poll_interval_minutes INTEGER,
+    max_poll_interval_minutes INTEGER,
+    new_entries_per_hour REAL,
+    recent_guids TEXT DEFAULT '[]',
+    last_polled_at TEXT,
+    next_poll_at TEXT,
+    created_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS feed_entries (
+    feed_url TEXT NOT NULL,
+    guid TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    link TEXT,
+    published_at TEXT,
+    categories TEXT DEFAULT '[]',
+    temperature REAL,
+    merchant_price TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    first_seen_at TEXT NOT NULL,
+    processed_at TEXT,
+    PRIMARY KEY (feed_url, guid)
+);
+CREATE INDEX IF NOT EXISTS idx_feed_entries_pending ON feed_entries(feed_url, status, first_seen_at DESC);
+
+CREATE TABLE IF NOT EXISTS stats_daily (
+    day TEXT NOT NULL,
+    source TEXT NOT NULL,
+    runs INTEGER DEFAULT 0,
+    feed_errors INTEGER DEFAULT 0,
+    entries_seen INTEGER DEFAULT 0,
+    products_extracted INTEGER DEFAULT 0,
+    ebay_queries INTEGER DEFAULT 0,
+    ebay_hits INTEGER DEFAULT 0,
+    history_hits INTEGER DEFAULT 0,
+    ebay_skipped INTEGER DEFAULT 0,
+    deals INTEGER DEFAULT 0,
+    profit_sum REAL DEFAULT 0,
+    profit_max REAL,
+    updated_at TEXT,
+    PRIMARY KEY (day, source)
+);
+
+CREATE TABLE IF NOT EXISTS ebay_query_archive (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    source TEXT,
+    rss_price REAL,
+    ebay_price REAL,
+    ebay_sold_price REAL
+);
+CREATE VIEW IF NOT EXISTS ebay_query_prices AS
+    SELECT id, timestamp, source, rss_price, ebay_price, ebay_sold_price FROM ebay_queries
+    UNION ALL
+    SELECT id, timestamp, source, rss_price, ebay_price, ebay_sold_price FROM ebay_query_archive;
+
+CREATE TABLE IF NOT EXISTS ebay_query_scores (
+    policy TEXT NOT NULL,
+    query_id INTEGER NOT NULL,
+    day TEXT,
+    source TEXT,
+    rss_price REAL,
+    market_price REAL,
+    fees REAL,
+    shipping_cost REAL,
+    gross_profit REAL,
+    net_profit REAL,
+    profitable INTEGER,
+    scored_at TEXT,
+    PRIMARY KEY (policy, query_id)
+);
+CREATE VIEW IF NOT EXISTS ebay_query_score_summary AS
+    SELECT policy, COUNT(*) AS scored, SUM(profitable) AS profitable,
+           SUM(CASE WHEN profitable THEN net_profit ELSE 0 END) AS profit_sum,
+           AVG(net_profit) AS avg_net_profit, MIN(day) AS first_day, MAX(day) AS last_day
+    FROM ebay_query_scores GROUP BY policy;
+
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    duration_seconds REAL,
+    sample_count INTEGER,
+    run_status TEXT,
+    collapsed_stacks TEXT,
+    report TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_profiles_created_at ON profiles(created_at DESC);
+
+CREATE TABLE IF NOT EXISTS run_locks (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    acquired_at TEXT NOT NULL,
+    heartbeat_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+"""
+
+# Columns of ebay_queries read by the rescore command (also kept in ebay_query_archive after compaction)
+RESCORE_COLUMNS = 'id, timestamp, source, rss_price, ebay_price, ebay_sold_price'
+
+# Columns of /api/profiles (stacks and report only come with a single profile)
+PROFILE_LIST_COLUMNS = 'id, created_at, mode, duration_seconds, sample_count, run_status'
+
+
+def search_rank(query, product_name):
+    """Relevance of a product name for a search query between 0 and 1 (SQLite stand-in for pg_trgm word_similarity)
+    Whole words count fully, parts of words half; shorter names win ties"""
+    name = (product_name or '').lower()
+    words = set(name.split())
+    tokens = query.lower().split()
+    if not tokens:
+        return 0.0
+    matched = sum(1.0 if token in words else 0.5 if token in name else 0.0 for token in tokens) / len(tokens)
+    return round(0.9 * matched + 0.1 * min(len(query) / max(len(name), 1), 1.0), 3)
+
+
+def search_candidate_limit(limit, offset):
+    """Rows read per source (deals, ebay_queries, daily summaries) before the history is grouped"""
+    return max(SEARCH_CANDIDATE_LIMIT, offset + limit)
+
+
+def _utc_now_iso():
+    """Current UTC time as ISO string (same format Supabase returns)"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SQLiteStorage(StorageBackend):
+    """Embedded SQLite storage in WAL mode for self-hosted runs and fast local tests
+    Each thread gets its own connection (all are tracked so close() also ends those of pool threads);
+    WAL lets the dashboard read while a run writes"""
+    
+    name = 'sqlite'
+    JSON_COLUMNS = ('samples', 'recent_guids', 'categories')
+    BOOLEAN_COLUMNS = ('query_successful', 'enabled')
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._connection().executescript(SQLITE_SCHEMA)
+        summary_columns = {row['name'] for row in self._query('PRAGMA table_info(ebay_query_daily_summaries)')}
+        if 'rss_price_count' not in summary_columns:
+            # Same backfill as migration_add_summary_rss_price_count.sql
+            self._execute('ALTER TABLE ebay_query_daily_summaries ADD COLUMN rss_price_count INTEGER DEFAULT 0')
+            self._execute('UPDATE ebay_query_daily_summaries SET rss_price_count = query_count WHERE avg_rss_price IS NOT NULL')
+        # Seed the feed registry like schema.sql does for Supabase
+        now = _utc_now_iso()
+        for url in RSS_SOURCES:
+            self._execute('INSERT OR IGNORE INTO feeds (url, next_poll_at, created_at) VALUES (?, ?, ?)', (url, now, now))
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.create_function('search_rank', 2, search_rank, deterministic=True)
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+    
+    def _execute(self, sql, params=()):
+        return self._connection().execute(sql, params)
+    
+    def _query(self, sql, params=()):
+        rows = []
+        for row in self._execute(sql, params).fetchall():
+            row = dict(row)
+            for column in self.JSON_COLUMNS:
+                if isinstance(row.get(column), str):
+                    row[column] = json.loads(row[column])
+            for column in self.BOOLEAN_COLUMNS:
+                if column in row and row[column] is not None:
+                    row[column] = bool(row[column])
+            rows.append(row)
+        return rows
+    
+    def _encode(self, row):
+        encoded = {}
+        for column, value in row.items():
+            if column in self.JSON_COLUMNS and not isinstance(value, str):
+                value = json.dumps(value)
+            encoded[column] = value
+        return encoded
+    
+    def _insert(self, table, row, replace=False):
+        row = self._encode(row)
+        columns = ', '.join(row)
+        placeholders = ', '.join('?' for _ in row)
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT'
+        return self._execute(f'{verb} INTO {table} ({columns}) VALUES ({placeholders})', tuple(row.values())).lastrowid
+    
+    def _update(self, table, row_id, fields):
+        fields = self._encode(fields)
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        self._execute(f'UPDATE {table} SET {assignments} WHERE id = ?', tuple(fields.values()) + (row_id,))
+    
+    def create_log(self, entry):
+        now = _utc_now_iso()
+        return self._insert('logs', dict(entry, timestamp=now, created_at=now, updated_at=now))
+    
+    def update_log(self, log_id, fields):
+        self._update('logs', log_id, dict(fields, updated_at=_utc_now_iso()))
+    
+    def recent_logs(self, limit=100):
+        return self._query('SELECT * FROM logs ORDER BY timestamp DESC LIMIT ?', (limit,))
+    
+    def logs_updated_since(self, cursor, limit=100):
+        return self._query('SELECT * FROM logs WHERE updated_at > ? ORDER BY updated_at LIMIT ?', (cursor, limit))
+    
+    def insert_deal(self, deal):
+        now = _utc_now_iso()
+        self._insert('deals', dict(deal, timestamp=now, created_at=now))
+    
+    def recent_deals(self, limit=100):
+        return self._query('SELECT * FROM deals ORDER BY timestamp DESC LIMIT ?', (limit,))
+    
+    def deals_after(self, deal_id, limit=100):
+        return self._query('SELECT * FROM deals WHERE id > ? ORDER BY id LIMIT ?', (deal_id, limit))
+    
+    def latest_deal_id(self):
+        return self._execute('SELECT COALESCE(MAX(id), 0) FROM deals').fetchone()[0]
+    
+    def insert_ebay_query(self, entry):
+        now = _utc_now_iso()
+        self._insert('ebay_queries', dict(entry, timestamp=now, created_at=now))
+    
+    def ebay_queries_for_log(self, log_id):
+        return self._query('SELECT * FROM ebay_queries WHERE log_id = ? ORDER BY timestamp DESC', (log_id,))
+    
+    def recent_ebay_queries(self, limit):
+        return self._query('SELECT product_name, rss_price, ebay_sold_price FROM ebay_queries ORDER BY timestamp DESC LIMIT ?', (limit,))
+    
+    def get_price_histories(self, canonical_names):
+        rows = []
+        for offset in range(0, len(canonical_names), 500):
+            batch = canonical_names[offset:offset + 500]
+            placeholders = ', '.join('?' for _ in batch)
+            rows.extend(self._query(f'SELECT * FROM product_price_history WHERE canonical_name IN ({placeholders})', tuple(batch)))
+        return rows
+    
+    def upsert_price_history(self, row):
+        self._insert('product_price_history', row, replace=True)
+    
+    def enabled_feeds(self):
+        return self._query('SELECT * FROM feeds WHERE enabled = 1 ORDER BY id')
+    
+    def update_feed(self, feed_id, fields):
+        self._update('feeds', feed_id, fields)
+    
+    def add_feed_entries(self, rows):
+        if not rows:
+            return
+        rows = [self._encode(row) for row in rows]
+        columns = list(rows[0])
+        self._connection().executemany(
+            f'INSERT OR IGNORE INTO feed_entries ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})',
+            [tuple(row[column] for column in columns) for row in rows]
+        )
+    
+    def pending_feed_entries(self, feed_url, since, limit):
+        return self._query(
+            "SELECT * FROM feed_entries WHERE feed_url = ? AND status = 'pending' AND first_seen_at >= ? "
+            "ORDER BY first_seen_at DESC LIMIT ?", (feed_url, since, limit)
+        )
+    
+    def mark_feed_entries_processed(self, feed_url, guids):
+        now = _utc_now_iso()
+        self._connection().executemany(
+            "UPDATE feed_entries SET status = 'processed', processed_at = ? WHERE feed_url = ? AND guid = ?",
+            [(now, feed_url, guid) for guid in guids]
+        )
+    
+    def purge_feed_entries(self, before):
+        return self._execute('DELETE FROM feed_entries WHERE first_seen_at < ?', (before,)).rowcount
+    
+    def acquire_run_lock(self, name, owner, lease_seconds):
+        """Same semantics as acquire_run_lock() in schema.sql; BEGIN IMMEDIATE serializes concurrent callers"""
+        now = datetime.now(timezone.utc)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT owner, expires_at FROM run_locks WHERE name = ?', (name,)).fetchone()
+            if row is not None and row['owner'] != owner and row['expires_at'] > now.isoformat():
+                connection.execute('COMMIT')
+                return False
+            connection.execute(
+                'INSERT OR REPLACE INTO run_locks (name, owner, acquired_at, heartbeat_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (name, owner, now.isoformat(), now.isoformat(), (now + timedelta(seconds=lease_seconds)).isoformat())
+            )
+            connection.execute('COMMIT')
+            return True
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+    
+    def renew_run_lock(self, name, owner, lease_seconds):
+        now = datetime.now(timezone.utc)
+        return self._execute(
+            'UPDATE run_locks SET heartbeat_at = ?, expires_at = ? WHERE name = ? AND owner = ?',
+            (now.isoformat(), (now + timedelta(seconds=lease_seconds)).isoformat(), name, owner)
+        ).rowcount > 0
+    
+    def release_run_lock(self, name, owner):
+        self._execute('DELETE FROM run_locks WHERE name = ? AND owner = ?', (name, owner))
+    
+    def rescore_ebay_queries(self, policy, live_threshold, since=None, page_size=None, progress=None):
+        """Same result as rescore_ebay_queries() in schema.sql: pages through ebay_query_prices (keyset on id)
+        and writes the scores of each page in one transaction"""
+        page_size = page_size or RESCORE_PAGE_SIZE
+        totals = {"rows": 0, "scored": 0, "profitable": 0, "profit_sum": 0.0, "live_rule_profitable": 0}
+        columns = None
+        after_id = 0
+        while True:
+            if since:
+                page = self._query(f'SELECT {RESCORE_COLUMNS} FROM ebay_query_prices WHERE id > ? AND timestamp >= ? ORDER BY id LIMIT ?',
+                                   (after_id, since, page_size))
+            else:
+                page = self._query(f'SELECT {RESCORE_COLUMNS} FROM ebay_query_prices WHERE id > ? ORDER BY id LIMIT ?', (after_id, page_size))
+            if not page:
+                break
+            after_id = page[-1]['id']
+            scored_at = _utc_now_iso()
+            scores = []
+            for row in page:
+                score = score_ebay_query(row, policy, scored_at)
+                if score is None:
+                    continue
+                scores.append(score)
+                if score["profitable"]:
+                    totals["profitable"] += 1
+                    totals["profit_sum"] += score["net_profit"]
+                if score["gross_profit"] > live_threshold:
+                    totals["live_rule_profitable"] += 1
+            if scores:
+                columns = columns or list(scores[0])
+                connection = self._connection()
+                connection.execute('BEGIN')
+                try:
+                    connection.executemany(
+                        f'INSERT OR REPLACE INTO ebay_query_scores ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})',
+                        [tuple(score[column] for column in columns) for score in scores]
+                    )
+                    connection.execute('COMMIT')
+                except Exception:
+                    connection.execute('ROLLBACK')
+                    raise
+            totals["rows"] += len(page)
+            totals["scored"] += len(scores)
+            if progress:
+                progress(totals)
+            if len(page) < page_size:
+                break
+        totals["profit_sum"] = round(totals["profit_sum"], 2)
+        return totals
+    
+    def search_products(self, query, limit, offset=0):
+        """Same matching and candidate limit as search_products() in schema.sql, ranked with search_rank()"""
+        words = query.lower().split()
+        condition = ' AND '.join("product_name LIKE ? ESCAPE '\\'" for _ in words)
+        params = tuple('%' + re.sub(r'([\\%_])', r'\\\1', word) + '%' for word in words)
+        candidates = (query, search_candidate_limit(limit, offset))
+        rows = self._query(
+            "SELECT 'deal' AS kind, id, product_name, source, 1 AS hits, rss_price, ebay_price, profit, timestamp AS last_seen "
+            f"FROM deals WHERE {condition} ORDER BY search_rank(?, product_name) DESC, timestamp DESC LIMIT ?", params + candidates
+        )
+        rows.extend(dict(row, kind='query', id=None) for row in self._query(
+            'SELECT product_name, MIN(source) AS source, SUM(hits) AS hits, ROUND(AVG(rss_price), 2) AS rss_price, '
+            'ROUND(AVG(sold_price), 2) AS ebay_price, MAX(profit) AS profit, MAX(seen_at) AS last_seen FROM ('
+            'SELECT * FROM (SELECT product_name, source, 1 AS hits, rss_price, ebay_sold_price AS sold_price, profit, timestamp AS seen_at '
+            f'FROM ebay_queries WHERE {condition} ORDER BY search_rank(?, product_name) DESC, timestamp DESC LIMIT ?) '
+            'UNION ALL SELECT * FROM (SELECT product_name, source, query_count, avg_rss_price, median_sold_price, max_profit, day '
+            f'FROM ebay_query_daily_summaries WHERE {condition} ORDER BY search_rank(?, product_name) DESC, day DESC LIMIT ?)) '
+            'GROUP BY product_name', (params + candidates) * 2
+        ))
+        for row in rows:
+            row['rank'] = search_rank(query, row['product_name'])
+        rows.sort(key=lambda row: (row['rank'], row['last_seen'] or ''), reverse=True)
+        return rows[offset:offset + limit]
+    
+    def increment_daily_stats(self, day, source, counts):
+        """Same semantics as increment_stats_daily() in schema.sql"""
+        columns = ', '.join(STATS_COUNTERS)
+        placeholders = ', '.join('?' for _ in STATS_COUNTERS)
+        increments = ', '.join(f'{column} = stats_daily.{column} + excluded.{column}' for column in STATS_COUNTERS)
+        self._execute(
+            f'INSERT INTO stats_daily (day, source, {columns}, profit_max, updated_at) VALUES (?, ?, {placeholders}, ?, ?) '
+            f'ON CONFLICT (day, source) DO UPDATE SET {increments}, '
+            'profit_max = max(COALESCE(stats_daily.profit_max, excluded.profit_max), COALESCE(excluded.profit_max, stats_daily.profit_max)), '
+            'updated_at = excluded.updated_at',
+            (day, source) + tuple(counts.get(column) or 0 for column in STATS_COUNTERS) + (counts.get('profit_max'), _utc_now_iso())
+        )
+    
+    def daily_stats(self, since_day):
+        return self._query('SELECT * FROM stats_daily WHERE day >= ? ORDER BY day DESC, source', (since_day,))
+    
+    def insert_profile(self, row):
+        return self._insert('profiles', dict(row, created_at=_utc_now_iso()))
+    
+    def recent_profiles(self, limit=50):
+        return self._query(f'SELECT {PROFILE_LIST_COLUMNS} FROM profiles ORDER BY created_at DESC LIMIT ?', (limit,))
+    
+    def get_profile(self, profile_id):
+        rows = self._query('SELECT * FROM profiles WHERE id = ?', (profile_id,))
+        return rows[0] if rows else None
+    
+    def run_retention(self, query_retention_days, log_retention_days):
+        """Same semantics as run_retention() in schema.sql"""
+        day_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        query_cutoff = (day_start - timedelta(days=query_retention_days)).isoformat()
+        log_cutoff = (datetime.now(timezone.utc) - timedelta(days=log_retention_days)).isoformat()
+        
+        groups = {}
+        for row in self._query('SELECT * FROM ebay_queries WHERE timestamp < ?', (query_cutoff,)):
+            groups.setdefault((row['timestamp'][:10], row['source'], row['product_name']), []).append(row)
+        
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for (day, source, product_name), rows in groups.items():
+                summary = _summarize_ebay_queries(rows)
+                existing = self._query('SELECT * FROM ebay_query_daily_summaries WHERE day = ? AND source = ? AND product_name = ?', (day, source, product_name))
+                if existing:
+                    summary = _merge_daily_summaries(existing[0], summary)
+                self._insert('ebay_query_daily_summaries', dict(summary, day=day, source=source, product_name=product_name), replace=True)
+            # Keep the prices rescore needs before the raw rows go
+            connection.execute(
+                f'INSERT OR IGNORE INTO ebay_query_archive ({RESCORE_COLUMNS}) SELECT {RESCORE_COLUMNS} FROM ebay_queries '
+                'WHERE timestamp < ? AND rss_price IS NOT NULL AND (ebay_price IS NOT NULL OR ebay_sold_price IS NOT NULL)',
+                (query_cutoff,)
+            )
+            queries_compacted = connection.execute('DELETE FROM ebay_queries WHERE timestamp < ?', (query_cutoff,)).rowcount
+            logs_deleted = connection.execute('DELETE FROM logs WHERE timestamp < ?', (log_cutoff,)).rowcount
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return {"ebay_queries_compacted": queries_compacted, "logs_deleted": logs_deleted}
+    
+    def close(self):
+        """Close the connections of all threads (price executor, SSE streams, heartbeat included)"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        # Fresh thread-local state: a thread that keeps using the backend opens a new connection
+        self._local = threading.local()
+
+
+def _summarize_ebay_queries(rows):
+    """Aggregate raw ebay_queries rows of one product and day like compact_ebay_queries() in schema.sql"""
+    sold = sorted(r['ebay_sold_price'] for r in rows if r.get('ebay_sold_price') is not None)
+    rss = [r['rss_price'] for r in rows if r.get('rss_price') is not None]
+    offers = [r['ebay_offer_price'] for r in rows if r.get('ebay_offer_price') is not None]
+    profits = [r['profit'] for r in rows if r.get('profit') is not None]
+    median = None
+    if sold:
+        middle = len(sold) // 2
+        median = sold[middle] if len(sold) % 2 else (sold[middle - 1] + sold[middle]) / 2
+    return {
+        "query_count": len(rows),
+        "successful_count": sum(1 for r in rows if r.get('query_successful')),
+        "avg_rss_price": sum(rss) / len(rss) if rss else None,
+        "rss_price_count": len(rss),
+        "min_sold_price": sold[0] if sold else None,
+        "median_sold_price": median,
+        "max_sold_price": sold[-1] if sold else None,
+        "min_offer_price": min(offers) if offers else None,
+        "max_profit": max(profits) if profits else None
+    }
+
+
+def _merge_daily_summaries(existing, new):
+    """Merge late rows into an already compacted day (medians as count-weighted mean, the RSS average
+    weighted by the rows that had a price)"""
+    def pick(function, a, b):
+        values = [v for v in (a, b) if v is not None]
+        return function(values) if values else None
+    
+    def weighted(a, a_count, b, b_count):
+        if a is None or not a_count:
+            return b
+        if b is None or not b_count:
+            return a
+        return (a * a_count + b * b_count) / (a_count + b_count)
+    
+    return {
+        "query_count": existing['query_count'] + new['query_count'],
+        "successful_count": existing['successful_count'] + new['successful_count'],
+        "avg_rss_price": weighted(existing['avg_rss_price'], existing['rss_price_count'], new['avg_rss_price'], new['rss_price_count']),
+        "rss_price_count": (existing['rss_price_count'] or 0) + new['rss_price_count'],
+        "min_sold_price": pick(min, existing['min_sold_price'], new['min_sold_price']),
+        "median_sold_price": weighted(existing['median_sold_price'], existing['successful_count'], new['median_sold_price'], new['successful_count']),
+        "max_sold_price": pick(max, existing['max_sold_price'], new['max_sold_price']),
+        "min_offer_price": pick(min, existing['min_offer_price'], new['min_offer_price']),
+        "max_profit": pick(max, existing['max_profit'], new['max_profit'])
+    }
+
+
+def get_storage():
+    """Return the configured storage backend (STORAGE_BACKEND), creating it on first use
+    Returns None if the backend could not be initialized (see storage_error)"""
+    global _storage, _storage_initialized, storage_error
+    if _storage_initialized:
+        return _storage
+    with _client_lock:
+        if _storage_initialized:
+            return _storage
+        try:
+            if STORAGE_BACKEND == 'sqlite':
+                _storage = SQLiteStorage(SQLITE_PATH)
+                logging.info(f"SQLite storage initialized at {SQLITE_PATH}")
+            elif STORAGE_BACKEND == 'supabase':
+                client = get_supabase()
+                if client:
+                    _storage = SupabaseStorage(client)
+                else:
+                    storage_error = supabase_error
+            else:
+                storage_error = f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}' (use 'supabase' or 'sqlite')"
+        except Exception as e:
+            storage_error = str(e)
+            logging.error(f"Failed to initialize {STORAGE_BACKEND} storage: {e}")
+        _storage_initialized = True
+    return _storage
+
+
+# RSS Feed Sources (fallback and seed for the feeds table)
 RSS_SOURCES = [
     'https://www.mydealz.de/rss/alles',
     'https://www.dealdoktor.de/feed/',
     'https://schnaeppchenfuchs.com/rss'
 ]
 
+# Adaptive polling for feeds from the feeds table
+FEED_DEFAULT_POLL_MINUTES = int(os.getenv('FEED_DEFAULT_POLL_MINUTES', '120'))
+FEED_MIN_POLL_MINUTES = int(os.getenv('FEED_MIN_POLL_MINUTES', '15'))
+FEED_MAX_POLL_MINUTES = int(os.getenv('FEED_MAX_POLL_MINUTES', '720'))
+FEED_RATE_SMOOTHING = 0.3  # Weight of the latest observation in the new-entry rate (EWMA)
+FEED_RECENT_GUIDS = 500  # GUIDs remembered per feed to detect new entries
+
+# Entry selection: each run reads up to ENTRY_SCAN_LIMIT entries per feed, merges them with the unprocessed
+# backlog of earlier runs (feed_entries) and extracts the max_entries best-scored ones
+ENTRY_SCAN_LIMIT = int(os.getenv('ENTRY_SCAN_LIMIT', '50'))
+ENTRY_MAX_AGE_HOURS = float(os.getenv('ENTRY_MAX_AGE_HOURS', '48'))  # Older entries are no longer picked
+ENTRY_BACKLOG_RETENTION_HOURS = 72  # feed_entries rows are deleted after this (by the retention job)
+ENTRY_RECENCY_HALF_LIFE_HOURS = 6
+ENTRY_SCORE_WEIGHTS = {
+    'recency': 2.0,  # Times 0.5 per half-life of entry age
+    'unseen': 1.0,  # Entry was not in the feed at the previous poll
+    'title_price': 1.5,  # A price is visible in the title (or the mydealz merchant price)
+    'temperature': 2.0,  # Per 500° of mydealz temperature, capped at 1000°
+    'non_physical': -4.0,  # Vouchers, contracts, travel etc. rarely resell on eBay
+}
+ENTRY_NON_PHYSICAL_CATEGORIES = [
+    keyword.strip().lower() for keyword in os.getenv(
+        'ENTRY_NON_PHYSICAL_CATEGORIES',
+        'gutschein,vertrag,verträge,tarif,reise,urlaub,hotel,flug,dienstleistung,versicherung,'
+        'finanzen,kredit,konto,abo,streaming,kostenlos,freebie,gratis'
+    ).split(',') if keyword.strip()
+]
+TITLE_PRICE_PATTERN = re.compile(r'\d+(?:[.,]\d{1,2})?\s?(?:€|eur\b)|€\s?\d', re.IGNORECASE)
+
+# Profit check and eBay lookup budget
+PROFIT_THRESHOLD = float(os.getenv('PROFIT_THRESHOLD', '15'))  # Minimum profit in € for a deal
+EBAY_MAX_QUERIES_PER_RUN = int(os.getenv('EBAY_MAX_QUERIES_PER_RUN', '0'))  # 0 = unlimited
+RUN_TIME_BUDGET_SECONDS = float(os.getenv('RUN_TIME_BUDGET_SECONDS', '0'))  # 0 = unlimited
+EBAY_HISTORY_SAMPLE_SIZE = int(os.getenv('EBAY_HISTORY_SAMPLE_SIZE', '500'))  # Past queries used for ranking
+
+# Fee/shipping model for re-scoring historical ebay_queries (`flask --app app rescore`)
+EBAY_FEE_RATE = float(os.getenv('EBAY_FEE_RATE', '0.10'))  # Share of the sale price (same rate as deals.ebay_fees)
+EBAY_FIXED_FEE = float(os.getenv('EBAY_FIXED_FEE', '0'))  # Per sale in €
+SHIPPING_COST = float(os.getenv('SHIPPING_COST', '0'))  # Paid by the seller per sale in €
+RESCORE_PAGE_SIZE = 1000  # Rows per page of the SQLite rescore (Supabase rescores in one database call)
+
+# Daily run window (local time) and tick interval of the long-running worker (`flask --app app worker`)
+RUN_WINDOW_START_HOUR = 8
+RUN_WINDOW_END_HOUR = 20
+WORKER_INTERVAL_MINUTES = float(os.getenv('WORKER_INTERVAL_MINUTES', '15'))  # Feeds are only polled when due
+
+# Run lock: only one process_rss_feeds at a time (cron, platform retries, manual calls, worker)
+RUN_LOCK_NAME = 'process_rss_feeds'
+RUN_LOCK_LEASE_SECONDS = int(os.getenv('RUN_LOCK_LEASE_SECONDS', '120'))  # A crashed run's lock expires after this
+
+# Rolling price history per canonical product name
+PRICE_HISTORY_WINDOW_DAYS = int(os.getenv('PRICE_HISTORY_WINDOW_DAYS', '30'))
+PRICE_HISTORY_MAX_SAMPLES = 100  # Samples kept per product inside the window
+PRICE_HISTORY_MIN_SAMPLES = int(os.getenv('PRICE_HISTORY_MIN_SAMPLES', '3'))  # Needed to skip a live eBay call
+PRICE_HISTORY_MAX_AGE_HOURS = float(os.getenv('PRICE_HISTORY_MAX_AGE_HOURS', '24'))  # 0 = always query eBay
+
+# Retention: raw ebay_queries older than this are compacted into daily summaries, old logs are deleted
+EBAY_QUERY_RETENTION_DAYS = int(os.getenv('EBAY_QUERY_RETENTION_DAYS', '30'))
+LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', '30'))
+RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'true').lower() == 'true'
+
+# Expected ratio of eBay sold price to deal price, used to rank candidates without history
+DEFAULT_RESALE_RATIO = 1.1
+RESALE_RATIO_PRIORS = {
+    # Brands that hold their value well
+    'apple': 1.25, 'iphone': 1.25, 'ipad': 1.25, 'airpods': 1.2,
+    'dyson': 1.3, 'lego': 1.3, 'festool': 1.3, 'milwaukee': 1.25,
+    'makita': 1.2, 'bosch': 1.2, 'dewalt': 1.2, 'metabo': 1.15,
+    'nintendo': 1.25, 'playstation': 1.2, 'ps5': 1.2, 'xbox': 1.15,
+    'sony': 1.2, 'garmin': 1.2, 'thermomix': 1.3, 'delonghi': 1.15,
+    'samsung': 1.1, 'philips': 1.1, 'braun': 1.1,
+    # Categories that rarely resell above the deal price
+    'kabel': 0.9, 'hülle': 0.85, 'case': 0.9, 'adapter': 0.9, 'folie': 0.85,
+    'bluray': 0.95, 'dvd': 0.85, 'buch': 0.85,
+}
+
+# Streaming feed reader
+FEED_CHUNK_SIZE = 16 * 1024
+# Longest entity that is held back when it could be split across two chunks
+FEED_MAX_ENTITY_LENGTH = 40
+# Double-encoded XML entities as seen in the mydealz feed (e.g. &amp;amp;)
+_DOUBLE_ENCODED_ENTITY_RE = re.compile(rb'&amp;(amp|lt|gt|quot|apos);')
+# HTML named entities (e.g. &nbsp;) are not defined in XML and would abort the parser
+_NAMED_ENTITY_RE = re.compile(rb'&([A-Za-z][A-Za-z0-9]{1,31});')
+_BARE_AMPERSAND_RE = re.compile(rb'&(?![A-Za-z][A-Za-z0-9]*;|#[0-9]+;|#x[0-9A-Fa-f]+;)')
+# CDATA content is literal text, entity repair must not touch it
+_CDATA_START = b'<![CDATA['
+_CDATA_END = b']]>'
+
+# Server-Sent Events live stream for the dashboard
+SSE_POLL_SECONDS = float(os.getenv('SSE_POLL_SECONDS', '2'))
+SSE_MAX_STREAM_SECONDS = float(os.getenv('SSE_MAX_STREAM_SECONDS', '55'))  # Browser reconnects afterwards
+SSE_KEEPALIVE_SECONDS = 15
+
+# Daily statistics rollup (stats_daily): counters added at the end of every run
+STATS_COUNTERS = ('runs', 'feed_errors', 'entries_seen', 'products_extracted', 'ebay_queries', 'ebay_hits',
+                  'history_hits', 'ebay_skipped', 'deals', 'profit_sum')
+STATS_DEFAULT_DAYS = 30
+
+# Product search over deals and the eBay query history (/api/search)
+SEARCH_MIN_QUERY_CHARS = 3  # Trigrams need at least three characters
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_CANDIDATE_LIMIT = 1000  # Best matching rows read per source before grouping
+
+# On-demand profiling of cron runs (/api/cron?profile=sample|cprofile)
+PROFILE_MODES = ('sample', 'cprofile')
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '10'))
+PROFILE_MAX_STACK_DEPTH = 64
+
+# Plain-text conversion of feed descriptions
+_SCRIPT_STYLE_RE = re.compile(r'(?is)<(script|style)\b.*?</\1\s*>')
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
 # HTML Template for Dashboard
 DASHBOARD_TEMPLATE = """
 <!DOCTYPE html>
@@ -193,6 +1554,17 @@ DASHBOARD_TEMPLATE = """
         .refresh-btn:hover {
             background: #5568d3;
         }
+        .stream-status {
+            margin-left: 10px;
+            font-size: 14px;
+            color: #666;
+        }
+        .stream-status.live { color: #28a745; font-weight: 600; }
+        .row-updated { animation: highlight 2s ease-out; }
+        @keyframes highlight {
+            from { background: #fff3cd; }
+            to { background: transparent; }
+        }
     </style>
 </head>
 <body>
@@ -205,10 +1577,13 @@ DASHBOARD_TEMPLATE = """
         <div class="tabs">
             <button class="tab active" onclick="showTab('logs')">Live Logs</button>
             <button class="tab" onclick="showTab('winners')">Winners</button>
+            <button class="tab" onclick="showTab('stats')">Statistiken</button>
+            <button class="tab" onclick="showTab('search')">Suche</button>
         </div>
         
         <div id="logs" class="tab-content active">
             <button class="refresh-btn" onclick="location.reload()">🔄 Aktualisieren</button>
+            <span id="streamStatus" class="stream-status">○ Verbinde...</span>
             <table>
                 <thead>
                     <tr>
@@ -221,7 +1596,7 @@ DASHBOARD_TEMPLATE = """
                 </thead>
                 <tbody>
                     {% for log in logs %}
-                    <tr onclick="showEbayQueries({{ log.id }}, '{{ log.source }}')" style="cursor: pointer;" title="Klicken für eBay-Abfragen">
+                    <tr data-log-id="{{ log.id }}" onclick="showEbayQueries({{ log.id }}, '{{ log.source }}')" style="cursor: pointer;" title="Klicken für eBay-Abfragen">
                         <td>{{ log.timestamp }}</td>
                         <td>{{ log.source }}</td>
                         <td><span class="status-{{ log.status.lower() }}">{{ log.status }}</span></td>
@@ -249,7 +1624,7 @@ DASHBOARD_TEMPLATE = """
                 </thead>
                 <tbody>
                     {% for deal in deals %}
-                    <tr>
+                    <tr data-deal-id="{{ deal.id }}">
                         <td>{{ deal.timestamp }}</td>
                         <td>{{ deal.source }}</td>
                         <td>{{ deal.product_name }}</td>
@@ -262,17 +1637,83 @@ DASHBOARD_TEMPLATE = """
                 </tbody>
             </table>
         </div>
-    </div>
-    
-    <div id="ebayModal" style="display: none; position: fixed; top: 0; left: 0; width: 100%; height: 100%; background: rgba(0,0,0,0.5); z-index: 1000; overflow-y: auto;">
-        <div style="background: white; margin: 50px auto; padding: 30px; border-radius: 10px; max-width: 900px; max-height: 80vh; overflow-y: auto;">
-            <h2>eBay-Abfragen für: <span id="modalSource"></span></h2>
-            <button onclick="closeEbayModal()" style="float: right; background: #dc3545; color: white; border: none; padding: 8px 16px; border-radius: 5px; cursor: pointer;">✕ Schließen</button>
-            <div id="ebayQueriesContent" style="margin-top: 20px;"></div>
-        </div>
-    </div>
-    
-    <script>
+        
+        <div id="stats" class="tab-content">
+            <select id="statsDays" class="refresh-btn" onchange="loadStats()">
+                <option value="7">Letzte 7 Tage</option>
+                <option value="30" selected>Letzte 30 Tage</option>
+                <option value="90">Letzte 90 Tage</option>
+                <option value="365">Letztes Jahr</option>
+            </select>
+            <h3>Pro Quelle</h3>
+            <table id="statsSources">
+                <thead>
+                    <tr>
+                        <th>Quelle</th>
+                        <th>Läufe</th>
+                        <th>Feed-Einträge</th>
+                        <th>Mit Preis</th>
+                        <th>eBay-Abfragen</th>
+                        <th>eBay-Trefferquote</th>
+                        <th>Preis-Historie</th>
+                        <th>Deals</th>
+                        <th>Ø Gewinn</th>
+                        <th>Max. Gewinn</th>
+                    </tr>
+                </thead>
+                <tbody></tbody>
+            </table>
+            <h3>Pro Tag</h3>
+            <table id="statsDaily">
+                <thead>
+                    <tr>
+                        <th>Tag</th>
+                        <th>Quelle</th>
+                        <th>Feed-Einträge</th>
+                        <th>eBay-Abfragen</th>
+                        <th>eBay-Trefferquote</th>
+                        <th>Deals</th>
+                        <th>Gewinn gesamt</th>
+                    </tr>
+                </thead>
+                <tbody></tbody>
+            </table>
+        </div>
+        
+        <div id="search" class="tab-content">
+            <form onsubmit="searchProducts(1); return false;">
+                <input id="searchQuery" type="search" placeholder="Produkt suchen, z.B. Bosch GHG 18V-50" style="padding: 10px; width: 60%; border: 1px solid #ddd; border-radius: 5px;">
+                <button type="submit" class="refresh-btn">🔍 Suchen</button>
+            </form>
+            <table id="searchResults">
+                <thead>
+                    <tr>
+                        <th>Art</th>
+                        <th>Produkt</th>
+                        <th>Quelle</th>
+                        <th>Abfragen</th>
+                        <th>RSS Preis</th>
+                        <th>eBay Preis</th>
+                        <th>Gewinn</th>
+                        <th>Zuletzt</th>
+                    </tr>
+                </thead>
+                <tbody></tbody>
+            </table>
+            <button id="searchPrev" class="refresh-btn" onclick="searchProducts(searchPage - 1)" style="display: none;">← Zurück</button>
+            <button id="searchNext" class="refresh-btn" onclick="searchProducts(searchPage + 1)" style="display: none;">Weiter →</button>
+        </div>
+    </div>
+    
+    <div id="ebayModal" style="display: none; position: fixed; top: 0; left: 0; width: 100%; height: 100%; background: rgba(0,0,0,0.5); z-index: 1000; overflow-y: auto;">
+        <div style="background: white; margin: 50px auto; padding: 30px; border-radius: 10px; max-width: 900px; max-height: 80vh; overflow-y: auto;">
+            <h2>eBay-Abfragen für: <span id="modalSource"></span></h2>
+            <button onclick="closeEbayModal()" style="float: right; background: #dc3545; color: white; border: none; padding: 8px 16px; border-radius: 5px; cursor: pointer;">✕ Schließen</button>
+            <div id="ebayQueriesContent" style="margin-top: 20px;"></div>
+        </div>
+    </div>
+    
+    <script>
         function showTab(tabName) {
             // Hide all tab contents
             document.querySelectorAll('.tab-content').forEach(content => {
@@ -286,6 +1727,77 @@ DASHBOARD_TEMPLATE = """
             document.getElementById(tabName).classList.add('active');
             // Add active class to clicked tab
             event.target.classList.add('active');
+            if (tabName === 'stats') {
+                loadStats();
+            }
+        }
+        
+        function formatRate(hits, queries) {
+            return queries ? (100 * hits / queries).toFixed(1) + ' %' : '-';
+        }
+        
+        function loadStats() {
+            const days = document.getElementById('statsDays').value;
+            fetch(`/api/stats?days=${days}`)
+                .then(response => response.json())
+                .then(data => {
+                    const sources = document.querySelector('#statsSources tbody');
+                    sources.innerHTML = '';
+                    Object.entries(data.sources || {}).concat([['Gesamt', data.total]]).forEach(([source, s]) => {
+                        const row = document.createElement('tr');
+                        [source, s.runs, s.entries_seen, s.products_extracted, s.ebay_queries,
+                         formatRate(s.ebay_hits, s.ebay_queries), s.history_hits, s.deals,
+                         s.avg_profit != null ? formatEuro(s.avg_profit) : '-',
+                         s.profit_max != null ? formatEuro(s.profit_max) : '-'].forEach(value => row.appendChild(makeCell(value)));
+                        sources.appendChild(row);
+                    });
+                    const daily = document.querySelector('#statsDaily tbody');
+                    daily.innerHTML = '';
+                    (data.daily || []).forEach(d => {
+                        const row = document.createElement('tr');
+                        [d.day, d.source, d.entries_seen, d.ebay_queries, formatRate(d.ebay_hits, d.ebay_queries),
+                         d.deals, formatEuro(d.profit_sum)].forEach(value => row.appendChild(makeCell(value)));
+                        daily.appendChild(row);
+                    });
+                })
+                .catch(error => {
+                    document.querySelector('#statsSources tbody').innerHTML = '<tr><td colspan="10" style="color: red;">Fehler beim Laden der Statistiken: ' + error + '</td></tr>';
+                });
+        }
+        
+        let searchPage = 1;
+        
+        function searchProducts(page) {
+            const query = document.getElementById('searchQuery').value.trim();
+            const tbody = document.querySelector('#searchResults tbody');
+            if (query.length < {{ search_min_chars }}) {
+                tbody.innerHTML = '<tr><td colspan="8">Mindestens {{ search_min_chars }} Zeichen eingeben.</td></tr>';
+                return;
+            }
+            fetch(`/api/search?q=${encodeURIComponent(query)}&page=${page}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.error) {
+                        throw data.error;
+                    }
+                    searchPage = data.page;
+                    tbody.innerHTML = '';
+                    data.results.forEach(r => {
+                        const row = document.createElement('tr');
+                        [r.kind === 'deal' ? 'Deal' : 'eBay-Abfrage', r.product_name, r.source, r.hits,
+                         formatEuro(r.rss_price), formatEuro(r.ebay_price), formatEuro(r.profit),
+                         r.last_seen ? new Date(r.last_seen).toLocaleString('de-DE') : '-'].forEach(value => row.appendChild(makeCell(value)));
+                        tbody.appendChild(row);
+                    });
+                    if (!data.results.length) {
+                        tbody.innerHTML = '<tr><td colspan="8">Keine Treffer.</td></tr>';
+                    }
+                    document.getElementById('searchPrev').style.display = data.page > 1 ? 'inline-block' : 'none';
+                    document.getElementById('searchNext').style.display = data.has_more ? 'inline-block' : 'none';
+                })
+                .catch(error => {
+                    tbody.innerHTML = '<tr><td colspan="8" style="color: red;">Fehler bei der Suche: ' + error + '</td></tr>';
+                });
         }
         
         function showEbayQueries(logId, source) {
@@ -331,6 +1843,87 @@ DASHBOARD_TEMPLATE = """
                 closeEbayModal();
             }
         });
+        
+        // Live updates via Server-Sent Events (new/updated logs and new deals)
+        const MAX_ROWS = 100;
+        
+        function makeCell(text, className) {
+            const td = document.createElement('td');
+            if (className) {
+                const span = document.createElement('span');
+                span.className = className;
+                span.textContent = text;
+                td.appendChild(span);
+            } else {
+                td.textContent = text;
+            }
+            return td;
+        }
+        
+        function formatEuro(value) {
+            return (value != null ? Number(value).toFixed(2) : '-') + ' €';
+        }
+        
+        function upsertRow(tbody, attribute, id, row) {
+            row.setAttribute(attribute, id);
+            row.classList.add('row-updated');
+            const existing = tbody.querySelector(`tr[${attribute}="${id}"]`);
+            if (existing) {
+                existing.replaceWith(row);
+            } else {
+                tbody.insertBefore(row, tbody.firstChild);
+                while (tbody.children.length > MAX_ROWS) {
+                    tbody.removeChild(tbody.lastChild);
+                }
+            }
+        }
+        
+        function applyLog(log) {
+            const row = document.createElement('tr');
+            row.style.cursor = 'pointer';
+            row.title = 'Klicken für eBay-Abfragen';
+            row.addEventListener('click', () => showEbayQueries(log.id, log.source));
+            const status = log.status || '';
+            row.appendChild(makeCell(log.timestamp || ''));
+            row.appendChild(makeCell(log.source || ''));
+            row.appendChild(makeCell(status, 'status-' + status.toLowerCase()));
+            row.appendChild(makeCell(log.products_found != null ? log.products_found : 0));
+            row.appendChild(makeCell(log.message || '-'));
+            upsertRow(document.querySelector('#logs tbody'), 'data-log-id', log.id, row);
+        }
+        
+        function applyDeal(deal) {
+            const row = document.createElement('tr');
+            row.appendChild(makeCell(deal.timestamp || ''));
+            row.appendChild(makeCell(deal.source || ''));
+            row.appendChild(makeCell(deal.product_name || ''));
+            row.appendChild(makeCell(formatEuro(deal.rss_price)));
+            row.appendChild(makeCell(formatEuro(deal.ebay_price)));
+            row.appendChild(makeCell(formatEuro(deal.profit), 'profit-positive'));
+            const linkCell = document.createElement('td');
+            const link = document.createElement('a');
+            link.href = deal.product_url || '#';
+            link.target = '_blank';
+            link.textContent = '🔗 Link';
+            linkCell.appendChild(link);
+            row.appendChild(linkCell);
+            upsertRow(document.querySelector('#winners tbody'), 'data-deal-id', deal.id, row);
+        }
+        
+        if (window.EventSource) {
+            const streamStatus = document.getElementById('streamStatus');
+            const stream = new EventSource('/api/stream?cursor=' + encodeURIComponent({{ stream_cursor|tojson }}));
+            stream.onopen = () => {
+                streamStatus.textContent = '● Live';
+                streamStatus.classList.add('live');
+            };
+            stream.onerror = () => {
+                streamStatus.textContent = '○ Verbindung unterbrochen, verbinde neu...';
+                streamStatus.classList.remove('live');
+            };
+            stream.addEventListener('log', e => applyLog(JSON.parse(e.data)));
+            stream.addEventListener('deal', e => applyDeal(JSON.parse(e.data)));
+        }
     </script>
 </body>
 </html>
@@ -362,195 +1955,731 @@ def requires_auth(f):
     return decorated
 
 
-def extract_product_info_with_gemini(item_title, item_description, retry_count=0):
-    """Extract product names and prices using Gemini AI with rate limiting
-    Returns list of (product_name, price) tuples - can contain multiple products"""
+# Records that move through a run. __slots__ keeps them compact; to_row() gives the table columns.
+class _Record:
+    __slots__ = ()
+    
+    def to_row(self):
+        """Column dict for the matching table (field names are the column names)"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass
+class FeedItem(_Record):
+    """A feed entry reduced to what the run needs (description as plain text, capped for Gemini)
+    plus the metadata used to pick which entries are extracted (see score_feed_item)"""
+    __slots__ = ('guid', 'title', 'description', 'link', 'published_at', 'categories', 'temperature', 'merchant_price')
+    guid: str
+    title: str
+    description: str
+    link: str
+    published_at: object  # ISO timestamp in UTC
+    categories: list
+    temperature: object  # mydealz votes in degrees
+    merchant_price: object  # Price attribute of pepper:merchant (mydealz)
+
+
+@dataclass
+class ProductCandidate(_Record):
+    """A product with price extracted from a feed entry, waiting for its eBay price"""
+    __slots__ = ('source', 'log_id', 'product_name', 'rss_price', 'entry_title', 'entry_link',
+                 'estimated_ebay_price', 'expected_profit')
+    source: str
+    log_id: object
+    product_name: str
+    rss_price: float
+    entry_title: str
+    entry_link: str
+    estimated_ebay_price: object
+    expected_profit: object
+
+
+@dataclass
+class PriceQuote(_Record):
+    """Result of one market price lookup; to_row() gives an ebay_queries row
+    market_price is the combined price used for the profit check (ebay_price/profit columns)"""
+    __slots__ = ('log_id', 'source', 'product_name', 'rss_price', 'market_price', 'ebay_sold_price', 'ebay_offer_price',
+                 'ebay_sold_items_found', 'ebay_offer_items_found', 'error_message')
+    log_id: object
+    source: str
+    product_name: str
+    rss_price: object
+    market_price: object
+    ebay_sold_price: object
+    ebay_offer_price: object
+    ebay_sold_items_found: int
+    ebay_offer_items_found: int
+    error_message: object
+    
+    def to_row(self):
+        sold = float(self.ebay_sold_price) if self.ebay_sold_price else None
+        market = float(self.market_price) if self.market_price else None
+        rss_price = float(self.rss_price) if self.rss_price else None
+        profit = market - rss_price if (market and rss_price) else None
+        return {
+            "log_id": self.log_id,
+            "source": self.source or "",
+            "product_name": (self.product_name or "")[:500],
+            "rss_price": rss_price,
+            "ebay_price": market,  # Price used for the profit check
+            "ebay_sold_price": sold,
+            "ebay_offer_price": float(self.ebay_offer_price) if self.ebay_offer_price else None,
+            "ebay_median_price": sold,  # The sold median is the median price
+            "ebay_items_found": self.ebay_sold_items_found + self.ebay_offer_items_found,  # Total
+            "ebay_sold_items_found": self.ebay_sold_items_found,
+            "ebay_offer_items_found": self.ebay_offer_items_found,
+            "profit": float(profit) if profit else None,
+            "query_successful": market is not None or bool(self.ebay_offer_price),
+            "error_message": self.error_message
+        }
+
+
+@dataclass
+class Deal(_Record):
+    """A profitable deal; to_row() gives a deals row"""
+    __slots__ = ('source', 'product_name', 'product_url', 'rss_price', 'ebay_price', 'profit', 'ebay_fees',
+                 'rss_item_title', 'rss_item_link')
+    source: str
+    product_name: str
+    product_url: str
+    rss_price: float
+    ebay_price: float
+    profit: float
+    ebay_fees: float
+    rss_item_title: str
+    rss_item_link: str
+
+
+def _repaired_feed_chunks(chunks):
+    """Yield feed chunks with entities repaired outside CDATA sections, holding back a possibly split
+    entity or CDATA marker at each chunk end"""
+    pending = b''
+    in_cdata = False
+    for chunk in chunks:
+        if not chunk:
+            continue
+        data, pending, in_cdata = _repair_outside_cdata(pending + chunk, in_cdata)
+        yield data
+    if pending:
+        yield _repair_outside_cdata(pending, in_cdata, final=True)[0]
+
+
+def _split_marker_start(data, marker):
+    """Offset of a trailing prefix of marker in data (a marker split across two chunks), or -1"""
+    for length in range(min(len(marker) - 1, len(data)), 0, -1):
+        if data.endswith(marker[:length]):
+            return len(data) - length
+    return -1
+
+
+def _repair_outside_cdata(data, in_cdata, final=False):
+    """Repair entities in data except inside CDATA sections
+    Returns (repaired data, tail held back for the next chunk, whether data ends inside a CDATA section);
+    with final nothing is held back"""
+    parts = []
+    position = 0
+    while position < len(data):
+        if in_cdata:
+            end = data.find(_CDATA_END, position)
+            if end == -1:
+                cut = len(data) if final else _split_marker_start(data[position:], _CDATA_END)
+                cut = len(data) if cut == -1 else position + cut
+                parts.append(data[position:cut])
+                return b''.join(parts), data[cut:], True
+            parts.append(data[position:end + len(_CDATA_END)])
+            position = end + len(_CDATA_END)
+            in_cdata = False
+            continue
+        start = data.find(_CDATA_START, position)
+        if start == -1:
+            segment, rest = data[position:], b''
+            if not final:
+                cut = segment.rfind(b'&', max(0, len(segment) - FEED_MAX_ENTITY_LENGTH))
+                marker = _split_marker_start(segment, _CDATA_START)
+                if marker != -1 and (cut == -1 or marker < cut):
+                    cut = marker
+                if cut != -1:
+                    segment, rest = segment[:cut], segment[cut:]
+            parts.append(repair_feed_entities(segment, cdata=False))
+            return b''.join(parts), rest, False
+        parts.append(repair_feed_entities(data[position:start], cdata=False))
+        parts.append(_CDATA_START)
+        position = start + len(_CDATA_START)
+        in_cdata = True
+    return b''.join(parts), b'', in_cdata
+
+
+def _named_entity_to_charref(match):
+    """Replace an HTML-only named entity with a numeric character reference"""
+    name = match.group(1)
+    if name in (b'amp', b'lt', b'gt', b'quot', b'apos'):
+        return match.group(0)
+    codepoint = name2codepoint.get(name.decode('ascii'))
+    if codepoint is None:
+        # Unknown entity: keep it as literal text instead of aborting the parser
+        return b'&amp;' + name + b';'
+    return b'&#%d;' % codepoint
+
+
+def repair_feed_entities(data, cdata=True):
+    """Fix double-encoded entities (e.g. &amp;amp; -> &amp;), HTML-only entities and bare ampersands in feed XML
+    CDATA sections are left as they are; cdata=False treats data as plain text outside any CDATA section"""
+    if b'&' not in data:
+        return data
+    if cdata and _CDATA_START in data:
+        return _repair_outside_cdata(data, False, final=True)[0]
+    data = _DOUBLE_ENCODED_ENTITY_RE.sub(rb'&\1;', data)
+    data = _NAMED_ENTITY_RE.sub(_named_entity_to_charref, data)
+    return _BARE_AMPERSAND_RE.sub(b'&amp;', data)
+
+
+def _local_name(tag):
+    """Strip the XML namespace from an element tag"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _feed_entry_from_element(element):
+    """Normalize an RSS <item> or Atom <entry> element to a FeedItem
+    The description is reduced to plain text up to GEMINI_DESCRIPTION_CHARS, all the extraction reads"""
+    entry = {'title': '', 'description': '', 'link': '', 'guid': ''}
+    content = ''
+    published_at = None
+    categories = []
+    temperature = None
+    merchant_price = None
+    for child in element:
+        name = _local_name(child.tag)
+        text = ''.join(child.itertext()).strip()
+        if name == 'title':
+            entry['title'] = text
+        elif name in ('description', 'summary'):
+            entry['description'] = text
+        elif name in ('encoded', 'content'):
+            content = text
+        elif name == 'link':
+            # Atom links carry the URL in href, RSS links in the element text
+            href = child.get('href')
+            if href and child.get('rel', 'alternate') == 'alternate':
+                entry['link'] = href
+            elif text and not entry['link']:
+                entry['link'] = text
+        elif name in ('guid', 'id'):
+            entry['guid'] = text
+        elif name in ('pubDate', 'published', 'updated', 'date'):
+            published_at = published_at or _parse_feed_date(text)
+        elif name == 'category':
+            # RSS puts the category in the text, Atom in the term attribute
+            category = text or child.get('term')
+            if category:
+                categories.append(category)
+        elif name == 'temperature':
+            temperature = _parse_temperature(text)
+        elif name == 'merchant':
+            merchant_price = child.get('price') or merchant_price
+        if temperature is None and child.get('temperature'):
+            temperature = _parse_temperature(child.get('temperature'))
+    
+    if not entry['description']:
+        entry['description'] = content
+    if not entry['guid']:
+        entry['guid'] = entry['link'] or entry['title']
+    return FeedItem(
+        guid=entry['guid'],
+        title=entry['title'],
+        description=html_to_text(entry['description'], GEMINI_DESCRIPTION_CHARS),
+        link=entry['link'],
+        published_at=published_at,
+        categories=categories,
+        temperature=temperature,
+        merchant_price=merchant_price
+    )
+
+
+def _parse_feed_date(value):
+    """RSS (RFC 822) or Atom (ISO 8601) date as ISO timestamp in UTC, None if unparseable"""
+    if not value:
+        return None
     try:
-        # Always use Gemini first (no regex pre-filtering)
-        if not gemini_model:
-            logging.warning(f"Gemini model not initialized, skipping extraction for '{item_title[:60]}'")
-            return [(item_title, 0.0)]
-        
-        # Combine title and description
-        full_text = f"{item_title}\n{item_description[:1000]}"
-        
-        prompt = f"""Du bist ein Experte für die Extraktion von Produktinformationen aus deutschen Deal-Seiten.
-
-Analysiere folgenden RSS-Feed-Eintrag und extrahiere ALLE physischen Produkte mit ihren Preisen:
-
-{full_text}
-
-WICHTIGE REGELN:
-1. NUR physische Produkte extrahieren - IGNORIERE:
-   - Handytarife, Mobilfunkverträge, SIM-Karten
-   - Reisen, Hotels, Flüge, Urlaubsangebote
-   - Abonnements, Streaming-Dienste, Software-Lizenzen
-   - Gutscheine, Rabattcodes, Cashback-Angebote
-   - Dienstleistungen, Versicherungen, Finanzprodukte
-   - Events, Konzerte, Tickets
-
-2. WENN MEHRERE PRODUKTE IM TEXT SIND (z.B. "inkl.", "+", "GRATIS", "und"):
-   - Extrahiere JEDES Produkt EINZELN
-   - Jedes Produkt bekommt den GESAMTEN Preis (nicht aufgeteilt)
-   - Beispiel: "Akku-Heissluftgebläse Bosch GHG 18V-50 inkl. L-BOXX + GRATIS Akkupack ProCORE18V 4.0Ah für 164,90€"
-     → PRODUKT 1: Bosch Professional GHG 18V-50 (Hauptprodukt)
-     → PRODUKT 2: Bosch Professional ProCORE18V 4.0Ah (Zugabeartikel)
-     → Beide bekommen PREIS: 164.90
-
-3. PRODUKTNAMEN OPTIMIEREN für eBay-Suche:
-   - Entferne Marketing-Text: "GRATIS", "inkl.", "inklusive", "mit", "und", "+", "Zugabeartikel", "Geschenk"
-   - Fokussiere auf: Marke + Modell/Produktname
-   - Beispiele:
-     * "Akku-Heissluftgebläse Bosch Professional GHG 18V-50" → "Bosch Professional GHG 18V-50"
-     * "Mr. Robot - Komplette Serie - Bluray" → "Mr Robot Komplette Serie Bluray"
-     * "Samsung Galaxy S23 256GB" → "Samsung Galaxy S23"
-   - Verwende KURZE, PRÄZISE Namen (max. 8-10 Wörter)
-
-4. PREIS-Extraktion:
-   - Suche nach Preisen: "19,99€", "19.99€", "19,99 €", "19.99 EUR", "ab 19,99€", "statt 29,99€ jetzt 19,99€"
-   - Wenn mehrere Preise vorhanden sind, nimm den niedrigsten/aktuellen Preis
-   - Ignoriere Versandkosten
-   - Wenn kein Preis gefunden wird, gib PREIS: 0 zurück
-
-Antworte NUR in diesem exakten Format (ein Produkt pro Block):
-PRODUKT 1: [Kurzer, präziser Produktname für eBay-Suche]
-PREIS 1: [Zahl ohne Währungssymbol, Punkt als Dezimaltrennzeichen]
-
-PRODUKT 2: [Nur wenn ein zweites Produkt vorhanden ist]
-PREIS 2: [Gleicher Preis wie PREIS 1]
-
-Wenn es KEIN physisches Produkt ist:
-PRODUKT 1: [Originaltitel]
-PREIS 1: 0
-
-Beispiele:
-Eingabe: "Akku-Heissluftgebläse Bosch Professional GHG 18V-50 inkl. L-BOXX + GRATIS Akkupack Bosch Professional ProCORE18V 4.0Ah für 164,90€"
-Ausgabe:
-PRODUKT 1: Bosch Professional GHG 18V-50
-PREIS 1: 164.90
-PRODUKT 2: Bosch Professional ProCORE18V 4.0Ah
-PREIS 2: 164.90
-
-Eingabe: "Mr. Robot - Komplette Serie - Bluray für 54,99€"
-Ausgabe:
-PRODUKT 1: Mr Robot Komplette Serie Bluray
-PREIS 1: 54.99"""
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        parsed = _parse_timestamp(value)
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def _parse_temperature(value):
+    """mydealz temperature such as '523°' or '-12.5' as float, None if missing"""
+    match = re.search(r'-?\d+(?:[.,]\d+)?', value or '')
+    return float(match.group(0).replace(',', '.')) if match else None
+
+
+def iter_feed_entries(chunks, max_entries=None):
+    """Incrementally parse RSS/Atom bytes and lazily yield FeedItems
+    Stops reading chunks as soon as max_entries entries have been yielded"""
+    if max_entries is not None and max_entries <= 0:
+        return
+    
+    parser = XMLPullParser(events=('start', 'end'))
+    open_elements = []
+    yielded = 0
+    for data in _repaired_feed_chunks(chunks):
+        parser.feed(data)
+        for event, element in parser.read_events():
+            if event == 'start':
+                open_elements.append(element)
+                continue
+            open_elements.pop()
+            if _local_name(element.tag) not in ('item', 'entry'):
+                continue
+            
+            entry = _feed_entry_from_element(element)
+            # Drop the parsed element so memory stays bounded by a single entry
+            if open_elements:
+                open_elements[-1].remove(element)
+            element.clear()
+            
+            yield entry
+            yielded += 1
+            if max_entries is not None and yielded >= max_entries:
+                return
+    parser.close()
+
+
+def fetch_feed_entries(source_url, max_entries):
+    """Download a feed once over the shared HTTP client and return up to max_entries FeedItems
+    The bytes go straight into the streaming parser (which repairs entities on the fly) and the download
+    stops once enough entries are parsed. Parse errors after the first entry end the feed early.
+    Only the compact FeedItems are kept, so the connection is released before the slow extraction."""
+    entries = []
+    client = get_http_client()
+    with client.stream('GET', source_url, timeout=get_http_timeout(source_url)) as response:
+        if response.status_code != 200:
+            raise Exception(f"Failed to download feed: HTTP {response.status_code}")
+        try:
+            for entry in iter_feed_entries(response.iter_bytes(FEED_CHUNK_SIZE), max_entries):
+                entries.append(entry)
+        except ParseError as parse_error:
+            # Continue processing if we have entries despite the error
+            if not entries:
+                raise Exception(f"Feed parsing error: {parse_error}")
+            logging.warning(f"Feed parsing warning for {source_url} after {len(entries)} entries: {parse_error}")
+    return entries
+
+
+def html_to_text(value, max_chars=None):
+    """Reduce an HTML snippet from a feed to plain text (no tags, scripts or entities, collapsed whitespace)"""
+    text = _SCRIPT_STYLE_RE.sub(' ', value or '')
+    text = _HTML_TAG_RE.sub(' ', text)
+    text = _WHITESPACE_RE.sub(' ', unescape(text)).strip()
+    return text[:max_chars] if max_chars else text
+
+
+def parse_extraction_response(text):
+    """Parse Gemini's JSON reply and validate it against EXTRACTION_RESPONSE_SCHEMA
+    Returns list of (product_name, price, confidence) tuples, raises ValueError if the reply doesn't match"""
+    data = json.loads(text)
+    if not isinstance(data, dict) or not isinstance(data.get('products'), list):
+        raise ValueError("'products' array missing")
+    
+    products = []
+    for item in data['products']:
+        if not isinstance(item, dict):
+            raise ValueError(f"Product is not an object: {item!r}")
+        name = item.get('name')
+        price = item.get('price')
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError(f"Product without name: {item!r}")
+        if isinstance(price, bool) or not isinstance(price, (int, float)) or price < 0:
+            raise ValueError(f"Invalid price for '{name[:30]}': {price!r}")
+        confidence = item.get('confidence')
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+            raise ValueError(f"Invalid confidence for '{name[:30]}': {confidence!r}")
+        products.append((name.strip(), float(price), min(max(float(confidence), 0.0), 1.0)))
+    return products
+
+
+def _is_rate_limit_error(error):
+    """Check whether a Gemini API error is a quota/rate limit error (HTTP 429)
+    Only the API's 429 exceptions or messages starting with 429/quota/resource exhausted count: other errors
+    mention "generateContent" or the generate-content docs and must not block the budget or spare the breaker"""
+    try:
+        from google.api_core.exceptions import TooManyRequests  # ResourceExhausted is a subclass
+    except ImportError:
+        TooManyRequests = None
+    if TooManyRequests is not None and isinstance(error, TooManyRequests):
+        return True
+    return str(error).strip().lower().startswith(('429', 'quota', 'resource exhausted'))
+
+
+def _retry_delay_seconds(error, default=30):
+    """Retry delay suggested by a Gemini rate limit error ("retry in 12s"), plus a small buffer"""
+    match = re.search(r'retry in (\d+)', str(error).lower())
+    return int(match.group(1)) + 5 if match else default
+
+
+class RateBudget:
+    """Sliding one-minute request budget for one model, shared by all threads"""
+    
+    def __init__(self, requests_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self._calls = deque()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+    
+    def _prune(self, now):
+        while self._calls and now - self._calls[0] >= 60:
+            self._calls.popleft()
+    
+    def try_acquire(self):
+        """Take a request slot if one is free right now"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            if now < self._blocked_until or len(self._calls) >= self.requests_per_minute:
+                return False
+            self._calls.append(now)
+            return True
+    
+    def wait_time(self):
+        """Seconds until the next slot frees up"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            wait = max(self._blocked_until - now, 0.0)
+            if len(self._calls) >= self.requests_per_minute:
+                wait = max(wait, 60 - (now - self._calls[0]))
+            return wait
+    
+    def block(self, seconds):
+        """Stop handing out slots for a while (after the API reported a rate limit)"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class ExtractionTier:
+    """One Gemini model of the tiered extractor with its own rate budget and metrics"""
+    
+    def __init__(self, role, model_name, requests_per_minute):
+        self.role = role
+        self.model_name = model_name
+        self.budget = RateBudget(requests_per_minute)
+        self.metrics = {}
+        self.reset_metrics()
+    
+    def reset_metrics(self):
+        self.metrics = {
+            "calls": 0,
+            "successes": 0,
+            "invalid_replies": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "escalations": 0,
+            "latency_seconds": 0.0,
+            "prompt_tokens": 0,
+            "output_tokens": 0
+        }
+    
+    def extract(self, entry_text):
+        """Run one extraction on this tier's model (the caller must hold a budget slot)
+        Returns list of (product_name, price, confidence); raises on API errors and ValueError on invalid replies"""
+        model = get_gemini_extraction_model(self.model_name)
+        if not model:
+            raise Exception(f"Gemini model {self.model_name} not initialized")
+        breaker = get_circuit_breaker('gemini')
+        if not breaker.allow():
+            raise CircuitOpenError("Circuit breaker 'gemini' is open")
         
+        self.metrics["calls"] += 1
+        started = time.monotonic()
         try:
-            response = gemini_model.generate_content(prompt)
-            text = response.text
+            response = model.generate_content(entry_text)
         except Exception as api_error:
-            error_str = str(api_error)
-            # Check for quota/rate limit errors
-            if "429" in error_str or "quota" in error_str.lower() or "rate" in error_str.lower():
-                if retry_count < 3:
-                    # Extract retry delay if available
-                    wait_time = 30  # Default 30 seconds
-                    if "retry in" in error_str.lower():
-                        try:
-                            import re
-                            match = re.search(r'retry in (\d+)', error_str.lower())
-                            if match:
-                                wait_time = int(match.group(1)) + 5  # Add 5 seconds buffer
-                        except:
-                            pass
-                    
-                    logging.warning(f"Gemini quota exceeded, waiting {wait_time}s before retry {retry_count + 1}/3")
-                    time.sleep(wait_time)
-                    return extract_product_info_with_gemini(item_title, item_description, retry_count + 1)
-                else:
-                    logging.error(f"Gemini quota exceeded after 3 retries. Skipping extraction.")
-                    return [(item_title, 0.0)]
+            if _is_rate_limit_error(api_error):
+                # Throttling is handled by the rate budgets, the service itself is up
+                self.metrics["rate_limited"] += 1
+                self.budget.block(_retry_delay_seconds(api_error))
+                breaker.record_success()
             else:
-                raise  # Re-raise if it's not a quota error
+                self.metrics["failures"] += 1
+                breaker.record_failure(api_error)
+            raise
+        finally:
+            self.metrics["latency_seconds"] += time.monotonic() - started
+        breaker.record_success()
         
-        # Parse response - extract multiple products
-        products = []  # List of (product_name, price) tuples
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            self.metrics["prompt_tokens"] += getattr(usage, 'prompt_token_count', 0) or 0
+            self.metrics["output_tokens"] += getattr(usage, 'candidates_token_count', 0) or 0
         
-        # Try multiple parsing strategies
-        current_product = None
-        current_price = None
+        try:
+            # response.text raises ValueError for replies without parts (blocked, MAX_TOKENS)
+            products = parse_extraction_response(response.text)
+        except ValueError:
+            self.metrics["invalid_replies"] += 1
+            raise
+        self.metrics["successes"] += 1
+        return products
+    
+    def snapshot(self):
+        """Metrics of this tier for reporting"""
+        metrics = dict(self.metrics)
+        metrics["model"] = self.model_name
+        metrics["avg_latency_seconds"] = round(metrics["latency_seconds"] / metrics["calls"], 3) if metrics["calls"] else None
+        metrics["latency_seconds"] = round(metrics["latency_seconds"], 3)
+        return metrics
+
+
+def get_extraction_tiers():
+    """Return the extraction tiers by role ('primary', optional 'escalation' and 'overflow')"""
+    global _extraction_tiers
+    if _extraction_tiers is None:
+        with _client_lock:
+            if _extraction_tiers is None:
+                tiers = {"primary": ExtractionTier('primary', GEMINI_MODEL_NAME, GEMINI_PRIMARY_RPM)}
+                if GEMINI_ESCALATION_MODEL:
+                    tiers["escalation"] = ExtractionTier('escalation', GEMINI_ESCALATION_MODEL, GEMINI_ESCALATION_RPM)
+                if GEMINI_OVERFLOW_MODEL:
+                    tiers["overflow"] = ExtractionTier('overflow', GEMINI_OVERFLOW_MODEL, GEMINI_OVERFLOW_RPM)
+                _extraction_tiers = tiers
+    return _extraction_tiers
+
+
+class SourceExtractor(ABC):
+    """Reads product name and price of a feed entry without Gemini
+    extract() returns (product_name, price, confidence) or None; results with at least
+    SOURCE_EXTRACTOR_MIN_CONFIDENCE skip the model call"""
+    
+    name = None
+    
+    @abstractmethod
+    def extract(self, item):
+        """(product_name, price, confidence) for a FeedItem, or None"""
+
+
+class TitlePriceExtractor(SourceExtractor):
+    """Single product titles like "Bosch GHG 18V-50 für 89,99€ (statt 120€)" (DealDoktor, Schnäppchenfuchs)"""
+    
+    name = 'title'
+    
+    def product_from_title(self, title):
+        """(name, price, confidence) from the title layout, None if it does not match"""
+        title = html_to_text(title)
+        # Drop merchant tags ("[Amazon]") and reference prices ("(statt 120€)")
+        title = re.sub(r'^\s*\[[^\]]*\]\s*|\s*\[[^\]]*\]\s*$', '', title)
+        title = REFERENCE_PRICE_PATTERN.sub(' ', title).strip()
+        match = TITLE_LAYOUT_PATTERN.match(title)
+        if not match:
+            return None
+        name = re.sub(r'\s*(?:(?:bei|@)\s+\S+|[-–—:|])\s*$', '', match.group('name')).strip(' -–—:|')
+        price = parse_price_text(match.group('price'))
+        rest = title[match.end():]
+        # "Xbox Series X für 399€ + 2 Spiele gratis": bundles can follow the price as well
+        if not price or PRICE_PATTERN.search(rest) or AMBIGUOUS_TITLE_PATTERN.search(name) or AMBIGUOUS_TITLE_PATTERN.search(rest):
+            return None
+        if len(name) < 6 or len(name.split()) < 2 or len(name) > 120:
+            return None
+        # "ab 29,99€" is the cheapest of several variants
+        confidence = 0.6 if (match.group('qualifier') or '').lower() == 'ab' else 0.95
+        return name, price, confidence
+    
+    def extract(self, item):
+        if _has_non_physical_category(item):
+            return None
+        return self.product_from_title(item.title)
+
+
+class MydealzExtractor(TitlePriceExtractor):
+    """mydealz puts the deal price into <pepper:merchant price="...">, the title often carries it too"""
+    
+    name = 'mydealz'
+    
+    def extract(self, item):
+        if _has_non_physical_category(item):
+            return None
+        merchant_price = parse_price_text(item.merchant_price)
+        product = self.product_from_title(item.title)
+        if merchant_price is None:
+            return product
+        if product is None:
+            # Price only in the merchant field: the whole title is the product name
+            name = re.sub(r'^\s*\[[^\]]*\]\s*|\s*\[[^\]]*\]\s*$', '', html_to_text(item.title)).strip()
+            if PRICE_PATTERN.search(name) or AMBIGUOUS_TITLE_PATTERN.search(name) or len(name.split()) < 2 or len(name) > 120:
+                return None
+            return name, merchant_price, 0.9
+        name, title_price, confidence = product
+        # Title and merchant field disagree: leave it to Gemini
+        if abs(title_price - merchant_price) > 0.01:
+            return name, merchant_price, 0.5
+        return name, merchant_price, min(confidence + 0.03, 1.0)
+
+
+def _has_non_physical_category(item):
+    """Entry category matches ENTRY_NON_PHYSICAL_CATEGORIES"""
+    categories = ' '.join(item.categories or []).lower()
+    return bool(categories) and any(keyword in categories for keyword in ENTRY_NON_PHYSICAL_CATEGORIES)
+
+
+# Extractor per feed host (www. is ignored), see RSS_SOURCES
+SOURCE_EXTRACTOR_FACTORIES = {
+    'mydealz.de': MydealzExtractor,
+    'dealdoktor.de': TitlePriceExtractor,
+    'schnaeppchenfuchs.com': TitlePriceExtractor,
+}
+_source_extractors = {}
+
+
+def get_source_extractor(source_url):
+    """The extractor registered for the host of a feed URL (created on first use), None if there is none"""
+    host = (urlparse(source_url).hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    factory = SOURCE_EXTRACTOR_FACTORIES.get(host)
+    if factory is None:
+        return None
+    with _client_lock:
+        if host not in _source_extractors:
+            _source_extractors[host] = factory()
+        return _source_extractors[host]
+
+
+def extract_with_source_extractor(item, source_url):
+    """[(product_name, price)] if the feed's extractor is confident, otherwise None (ask Gemini)"""
+    if not SOURCE_EXTRACTORS_ENABLED:
+        return None
+    extractor = get_source_extractor(source_url)
+    if extractor is None:
+        return None
+    try:
+        product = extractor.extract(item)
+    except Exception as e:
+        logging.warning(f"Source extractor {extractor.name} failed for '{item.title[:50]}': {e}")
+        return None
+    if product is None or product[2] < SOURCE_EXTRACTOR_MIN_CONFIDENCE:
+        return None
+    logging.info(f"Source extraction ({extractor.name}): '{item.title[:50]}' -> {product[0][:30]}, {product[1]:.2f}€")
+    return [(product[0], product[1])]
+
+
+def extraction_metrics(reset=False):
+    """Per-tier extraction metrics since the last reset"""
+    metrics = {}
+    for role, tier in get_extraction_tiers().items():
+        metrics[role] = tier.snapshot()
+        if reset:
+            tier.reset_metrics()
+    return metrics
+
+
+def _needs_escalation(products):
+    """Multi-product or low-confidence results are re-checked by the stronger model"""
+    return len(products) > 1 or any(confidence < GEMINI_ESCALATION_CONFIDENCE for _, _, confidence in products)
+
+
+def extract_product_info_with_gemini(item_title, item_description):
+    """Extract product names and prices using the tiered Gemini extractor
+    The primary model handles the entry within its rate budget (overflow model while it is throttled);
+    low-confidence, multi-product or invalid (not empty) results escalate to the stronger model if it has budget.
+    Returns list of (product_name, price) tuples - can contain multiple products"""
+    try:
+        # Source extractors have already been tried (see extract_with_source_extractor)
+        if not get_gemini_model():
+            logging.warning(f"Gemini model not initialized, skipping extraction for '{item_title[:60]}'")
+            return [(item_title, 0.0)]
         
-        for line in text.split('\n'):
-            line = line.strip()
-            line_upper = line.upper()
-            
-            # Check for product lines (PRODUKT 1:, PRODUKT 2:, etc.)
-            if 'PRODUKT' in line_upper and ':' in line:
-                # Save previous product if exists
-                if current_product and current_price is not None:
-                    products.append((current_product, current_price))
-                
-                # Extract new product name
-                product_part = line.split(':', 1)[1].strip() if ':' in line else line.replace('PRODUKT', '').strip()
-                # Remove "PRODUKT 1:", "PRODUKT 2:" etc.
-                product_part = re.sub(r'^PRODUKT\s*\d+\s*:', '', product_part, flags=re.IGNORECASE).strip()
-                current_product = product_part if product_part else item_title
-                current_price = None
-            
-            # Check for price lines (PREIS 1:, PREIS 2:, etc.)
-            elif 'PREIS' in line_upper and ':' in line:
-                try:
-                    price_part = line.split(':', 1)[1].strip() if ':' in line else line.replace('PREIS', '').strip()
-                    # Remove "PREIS 1:", "PREIS 2:" etc.
-                    price_part = re.sub(r'^PREIS\s*\d+\s*:', '', price_part, flags=re.IGNORECASE).strip()
-                    # Remove currency symbols and clean
-                    price_part = price_part.replace('€', '').replace('EUR', '').replace('Euro', '').strip()
-                    # Replace comma with dot for decimal
-                    price_part = price_part.replace(',', '.')
-                    # Remove any non-numeric characters except dot
-                    price_part = re.sub(r'[^\d.]', '', price_part)
-                    if price_part:
-                        current_price = float(price_part)
-                except Exception as e:
-                    logging.debug(f"Price parsing failed for '{line}': {e}")
-                    current_price = 0.0
-        
-        # Save last product if exists
-        if current_product and current_price is not None:
-            products.append((current_product, current_price))
-        
-        # Fallback: if no products found, try old format
-        if not products:
-            product_name = item_title
-            price = 0.0
-            for line in text.split('\n'):
-                line = line.strip()
-                if 'PRODUKT:' in line.upper() and ':' in line:
-                    product_name = line.split(':', 1)[1].strip()
-                elif 'PREIS:' in line.upper() and ':' in line:
-                    try:
-                        price_part = line.split(':', 1)[1].strip()
-                        price_part = price_part.replace('€', '').replace('EUR', '').replace('Euro', '').strip()
-                        price_part = price_part.replace(',', '.')
-                        price_part = re.sub(r'[^\d.]', '', price_part)
-                        if price_part:
-                            price = float(price_part)
-                    except:
-                        pass
-            if price > 0:
-                products = [(product_name, price)]
-        
-        # If still no products, return default
-        if not products:
-            products = [(item_title, 0.0)]
+        tiers = get_extraction_tiers()
+        first_tiers = [tiers["primary"]] + ([tiers["overflow"]] if "overflow" in tiers else [])
+        escalation = tiers.get("escalation")
         
-        # Log extraction results
-        if len(products) > 1:
-            logging.info(f"Gemini found {len(products)} products: {[p[0][:30] for p in products]}")
+        # Combine title and plain-text description
+        entry_text = f"{html_to_text(item_title)}\n{html_to_text(item_description, GEMINI_DESCRIPTION_CHARS)}".strip()
         
-        if len(products) > 0:
-            product_names = ', '.join([p[0][:30] for p in products])
-            logging.info(f"Gemini extraction: '{item_title[:50]}' -> Products: {product_names}, Prices: {[p[1] for p in products]}")
-        else:
+        # 1. Primary model, spilling over to the alternate model while the primary is throttled
+        products = None
+        invalid_reply = False
+        deadline = time.monotonic() + GEMINI_MAX_WAIT_SECONDS
+        while products is None:
+            tier = next((t for t in first_tiers if t.budget.try_acquire()), None)
+            if tier is None:
+                wait_time = min(t.budget.wait_time() for t in first_tiers)
+                if time.monotonic() + wait_time > deadline:
+                    logging.error(f"Gemini rate budget exhausted for {GEMINI_MAX_WAIT_SECONDS:.0f}s. Skipping extraction.")
+                    return [(item_title, 0.0)]
+                time.sleep(max(wait_time, 0.1))
+                continue
+            try:
+                products = tier.extract(entry_text)
+            except ValueError as validation_error:
+                logging.warning(f"Gemini reply ({tier.model_name}) for '{item_title[:50]}' failed schema validation: {validation_error}")
+                products = []
+                invalid_reply = True
+                break
+            except Exception as api_error:
+                if not _is_rate_limit_error(api_error):
+                    raise
+                logging.warning(f"Gemini model {tier.model_name} rate limited, trying next tier")
+        
+        # 2. Escalate invalid or uncertain results if the stronger model has budget left
+        # (a valid empty list is the expected answer for non-physical entries and is not escalated)
+        if escalation and (invalid_reply or _needs_escalation(products)) and escalation.budget.try_acquire():
+            escalation.metrics["escalations"] += 1
+            try:
+                products = escalation.extract(entry_text)
+            except Exception as escalation_error:
+                logging.warning(f"Escalation to {escalation.model_name} failed, keeping first result: {escalation_error}")
+        
+        # Non-physical entries come back without products
+        if not products:
             logging.info(f"Gemini extraction: '{item_title[:50]}' -> No products found")
+            return [(item_title, 0.0)]
         
-        return products if products else [(item_title, 0.0)]
+        product_names = ', '.join([p[0][:30] for p in products])
+        logging.info(f"Gemini extraction: '{item_title[:50]}' -> Products: {product_names}, Prices: {[p[1] for p in products]}")
+        return [(name, price) for name, price, _ in products]
     except Exception as e:
         logging.error(f"Gemini extraction error for '{item_title[:50]}': {e}")
         return [(item_title, 0.0)]
 
 
+# German price such as "1.299,99€", "29,99 €", "29€" or "€ 29.99"
+PRICE_TEXT = r'(?:\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?)'
+PRICE_PATTERN = re.compile(rf'({PRICE_TEXT})\s?(?:€|EUR\b|Euro\b)|€\s?({PRICE_TEXT})', re.IGNORECASE)
+# "<product> für 29,99€", "<product> zum Bestpreis von 29,99€", "<product> - 29,99€", "<product> 29,99€"
+TITLE_LAYOUT_PATTERN = re.compile(
+    r'^(?P<name>.+?)\s*(?:\s(?P<qualifier>für|um|zu|ab|zum (?:Bestpreis|Preis|Tiefstpreis) von)\s+(?:nur\s+|je\s+)?|[-–—:|]\s*|\s)'
+    rf'(?P<price>{PRICE_TEXT}\s?(?:€|EUR\b|Euro\b)|€\s?{PRICE_TEXT})',
+    re.IGNORECASE
+)
+# Reference prices that are not the deal price
+REFERENCE_PRICE_PATTERN = re.compile(
+    rf'\(?\s*(?:statt|uvp|vorher|idealo|pvg|vergleichspreis)\s*:?\s*(?:ab\s+)?(?:{PRICE_TEXT}\s?(?:€|EUR\b|Euro\b)|€\s?{PRICE_TEXT})\s*\)?',
+    re.IGNORECASE
+)
+# Titles that name several products, a price range or no physical product are left to Gemini
+AMBIGUOUS_TITLE_PATTERN = re.compile(
+    r'\s\+\s|\s&\s|\bund\b|\boder\b|\binkl\b|/|%|\bbis zu\b|\bbundle\b|\bset\b|\bsammeldeal\b|\bdiverse\b|'
+    r'\bverschiedene\b|\balle\b|\bgutschein|\bcoupon|\bgratis\b|\bkostenlos\b|\bcashback\b|\babo\b|\btarif|'
+    r'\bvertrag\b|\bgb\s+lte\b|\ballnet\b',
+    re.IGNORECASE
+)
+
+
+def parse_price_text(text):
+    """First price in a German text as float ("1.299,99€" -> 1299.99), None if there is none"""
+    match = PRICE_PATTERN.search(text or '')
+    if not match:
+        return None
+    value = match.group(1) or match.group(2)
+    if ',' in value:
+        value = value.replace('.', '').replace(',', '.')
+    elif re.fullmatch(r'\d{1,3}(?:\.\d{3})+', value):
+        value = value.replace('.', '')
+    return float(value)
+
+
 def clean_product_name_for_ebay(product_name):
     """Clean and optimize product name for eBay API query
     Removes marketing text, keeps only essential product info"""
@@ -582,258 +2711,1149 @@ def clean_product_name_for_ebay(product_name):
     # Remove leading/trailing dashes and dots
     cleaned = cleaned.strip('.-')
     
-    # Limit length (eBay works better with shorter queries)
-    return cleaned[:80]
+    # Limit length (eBay works better with shorter queries)
+    return cleaned[:80]
+
+
+def _format_price(price):
+    """Format an optional price for log output"""
+    return f"{price:.2f}€" if price is not None else "-"
+
+
+def canonical_product_name(product_name):
+    """Canonical key for the price history: cleaned, lowercased, de-duplicated and sorted name tokens
+    e.g. "Bosch Professional GHG 18V-50" and "bosch GHG 18V-50 Professional" share one key"""
+    tokens = _name_tokens(clean_product_name_for_ebay(product_name))
+    return ' '.join(sorted(tokens))[:200]
+
+
+def _rolling_price_aggregates(samples):
+    """Compute median, min, count and trend slope (€/day, least squares) for [[unix_ts, price], ...]"""
+    if not samples:
+        return {"sample_count": 0, "median_price": None, "min_price": None, "last_price": None, "trend_slope": None}
+    
+    prices = sorted(price for _, price in samples)
+    count = len(prices)
+    middle = count // 2
+    median = prices[middle] if count % 2 else (prices[middle - 1] + prices[middle]) / 2
+    
+    slope = None
+    if count >= 2:
+        days = [ts / 86400.0 for ts, _ in samples]
+        mean_day = sum(days) / count
+        mean_price = sum(price for _, price in samples) / count
+        variance = sum((d - mean_day) ** 2 for d in days)
+        if variance > 0:
+            covariance = sum((d - mean_day) * (price - mean_price) for d, (_, price) in zip(days, samples))
+            slope = covariance / variance
+    
+    return {
+        "sample_count": count,
+        "median_price": round(median, 2),
+        "min_price": round(prices[0], 2),
+        "last_price": round(samples[-1][1], 2),
+        "trend_slope": round(slope, 4) if slope is not None else None
+    }
+
+
+def _prune_price_samples(samples, now=None):
+    """Drop samples outside the rolling window and cap the number of samples kept"""
+    cutoff = (now or time.time()) - PRICE_HISTORY_WINDOW_DAYS * 86400
+    samples = sorted((s for s in samples or [] if s[0] >= cutoff), key=lambda s: s[0])
+    return samples[-PRICE_HISTORY_MAX_SAMPLES:]
+
+
+def record_price_observation(product_name, price, observed_at=None):
+    """Add an eBay sold price to the product's rolling price history
+    Only the product's own row is read and rewritten, the aggregates are never rebuilt from ebay_queries"""
+    storage = get_storage()
+    canonical = canonical_product_name(product_name)
+    if not storage or not canonical or not price or price <= 0:
+        return
+    
+    try:
+        observed_at = observed_at or time.time()
+        existing_rows = storage.get_price_histories([canonical])
+        existing = existing_rows[0] if existing_rows else None
+        
+        samples = _prune_price_samples((existing or {}).get('samples') or [], now=observed_at)
+        samples.append([int(observed_at), round(float(price), 2)])
+        samples = _prune_price_samples(samples, now=observed_at)
+        
+        observed_iso = datetime.fromtimestamp(observed_at, timezone.utc).isoformat()
+        row = {
+            "canonical_name": canonical,
+            "product_name": product_name[:500],
+            "samples": samples,
+            "first_seen": (existing or {}).get('first_seen') or observed_iso,
+            "last_seen": observed_iso,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        row.update(_rolling_price_aggregates(samples))
+        storage.upsert_price_history(row)
+    except Exception as e:
+        logging.error(f"Failed to update price history for '{product_name[:50]}': {e}")
+
+
+def lookup_price_histories(product_names):
+    """Look up rolling price aggregates for several products at once
+    Returns dict canonical_name -> row (sample_count, median_price, min_price, trend_slope, last_seen, ...)"""
+    storage = get_storage()
+    canonical_names = sorted({canonical_product_name(name) for name in product_names if name} - {''})
+    if not storage or not canonical_names:
+        return {}
+    
+    histories = {}
+    try:
+        for row in storage.get_price_histories(canonical_names):
+            # Re-apply the rolling window in case the row hasn't been written to for a while
+            samples = _prune_price_samples(row.get('samples'))
+            if len(samples) != len(row.get('samples') or []):
+                row.update(_rolling_price_aggregates(samples))
+                row['samples'] = samples
+            histories[row['canonical_name']] = row
+    except Exception as e:
+        logging.warning(f"Could not load price history: {e}")
+    return histories
+
+
+def lookup_price_history(product_name):
+    """Rolling price aggregates for a single product, or None if it has no history"""
+    return lookup_price_histories([product_name]).get(canonical_product_name(product_name))
+
+
+def usable_price_history(history):
+    """Return the history row if it is recent and large enough to replace a live eBay call"""
+    if not history or PRICE_HISTORY_MAX_AGE_HOURS <= 0:
+        return None
+    if (history.get('sample_count') or 0) < PRICE_HISTORY_MIN_SAMPLES or not history.get('median_price'):
+        return None
+    try:
+        last_seen = datetime.fromisoformat(str(history['last_seen']).replace('Z', '+00:00'))
+    except (KeyError, ValueError):
+        return None
+    age_hours = (datetime.now(timezone.utc) - last_seen).total_seconds() / 3600
+    return history if age_hours <= PRICE_HISTORY_MAX_AGE_HOURS else None
+
+
+EBAY_FINDING_URL = "https://svcs.ebay.de/services/search/FindingService/v1"
+
+
+def _ebay_request(params, timeout):
+    """Single Finding API request; 429 and 5xx responses raise so they count as failures"""
+    response = get_http_session().get(EBAY_FINDING_URL, params=params, timeout=timeout, verify=True)
+    if response.status_code == 429 or response.status_code >= 500:
+        raise Exception(f"eBay HTTP {response.status_code}")
+    return response
+
+
+def _ebay_get(params, deadline, progress=None):
+    """GET the eBay Finding API through the eBay circuit breaker, retrying with backoff
+    only as long as the call's deadline (time.monotonic()) allows. A hedged call (progress.hedge)
+    makes a single attempt; progress.retrying is set before the first retry"""
+    breaker = get_circuit_breaker('ebay')
+    backoff = 0.5
+    max_attempts = 1 if progress is not None and progress.hedge else EBAY_MAX_ATTEMPTS
+    for attempt in range(max_attempts):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("eBay deadline exceeded")
+        try:
+            return breaker.call(_ebay_request, params, min(EBAY_REQUEST_TIMEOUT_SECONDS, remaining))
+        except CircuitOpenError:
+            raise
+        except Exception:
+            if attempt + 1 >= max_attempts or deadline - time.monotonic() <= backoff:
+                raise
+            if progress is not None:
+                progress.retrying.set()
+            time.sleep(backoff)
+            backoff *= 2
+
+
+def _ebay_item_prices(response, operation):
+    """Positive item prices from a Finding API response of the given operation"""
+    if response.status_code != 200:
+        raise Exception(f"eBay HTTP {response.status_code}")
+    data = response.json()
+    response_data = data.get(f'{operation}Response', [{}])[0]
+    if 'errorMessage' in response_data:
+        raise Exception(f"eBay {operation} error: {str(response_data['errorMessage'])[:200]}")
+    prices = []
+    search_result = response_data.get('searchResult', [{}])[0]
+    for item in search_result.get('item', []):
+        try:
+            selling_status = item.get('sellingStatus', [{}])[0]
+            current_price = selling_status.get('currentPrice', [{}])[0]
+            price_value = float(current_price.get('__value__', 0))
+        except (AttributeError, IndexError, TypeError, ValueError):
+            continue
+        if price_value > 0:
+            prices.append(price_value)
+    return prices
+
+
+@dataclass
+class ProviderPrice(_Record):
+    """Answer of one price provider; kind 'sold' prices are combined into the market price,
+    'offer' prices (cheapest current listing) are only recorded"""
+    __slots__ = ('provider', 'kind', 'price', 'item_count', 'error_message')
+    provider: str
+    kind: str
+    price: object
+    item_count: int
+    error_message: object
+
+
+class LookupProgress:
+    """State shared by fetch_market_prices() and one provider call: a hedged call makes a single attempt,
+    and a call that is already retrying (retrying set) is not hedged"""
+    
+    __slots__ = ('hedge', 'retrying')
+    
+    def __init__(self, hedge=False):
+        self.hedge = hedge
+        self.retrying = threading.Event()
+
+
+class PriceProvider(ABC):
+    """A market price source queried by fetch_market_prices()
+    lookup() must return a ProviderPrice (price None if nothing was found) and respect the deadline;
+    hedge_after_seconds starts a second, single-attempt request when the first attempt is slow (None = never).
+    breaker names the circuit breaker the provider depends on (None = always available)"""
+    
+    name = None
+    kind = 'sold'
+    weight = 1.0
+    deadline_seconds = EBAY_CALL_DEADLINE_SECONDS
+    hedge_after_seconds = None
+    breaker = None
+    
+    @abstractmethod
+    def lookup(self, product_name, deadline, progress=None):
+        """Look up the price of product_name before deadline (time.monotonic())"""
+
+
+class EbaySoldProvider(PriceProvider):
+    """Median of eBay items sold (new condition) in the last 90 days"""
+    
+    name = 'ebay_sold'
+    hedge_after_seconds = PRICE_HEDGE_AFTER_SECONDS or None
+    breaker = 'ebay'
+    
+    def lookup(self, product_name, deadline, progress=None):
+        if not EBAY_APP_ID:
+            return _ebay_app_id_missing(self)
+        end_time_from = datetime.now() - timedelta(days=90)
+        params = {
+            "OPERATION-NAME": "findCompletedItems",
+            "SERVICE-VERSION": "1.0.0",
+            "SECURITY-APPNAME": EBAY_APP_ID,
+            "RESPONSE-DATA-FORMAT": "JSON",
+            "REST-PAYLOAD": "",
+            "keywords": clean_product_name_for_ebay(product_name),
+            "itemFilter(0).name": "Condition",
+            "itemFilter(0).value": "New",
+            "itemFilter(1).name": "SoldItemsOnly",
+            "itemFilter(1).value": "true",
+            "itemFilter(2).name": "EndTimeFrom",
+            "itemFilter(2).value": end_time_from.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "paginationInput.entriesPerPage": "50"
+        }
+        prices = sorted(_ebay_item_prices(_ebay_get(params, deadline, progress), 'findCompletedItems'))
+        median = prices[len(prices) // 2] if prices else None
+        return ProviderPrice(provider=self.name, kind=self.kind, price=median, item_count=len(prices), error_message=None)
+
+
+class EbayOfferProvider(PriceProvider):
+    """Cheapest current "Buy It Now" listing (new condition) on eBay"""
+    
+    name = 'ebay_offer'
+    kind = 'offer'
+    hedge_after_seconds = PRICE_HEDGE_AFTER_SECONDS or None
+    breaker = 'ebay'
+    
+    def lookup(self, product_name, deadline, progress=None):
+        if not EBAY_APP_ID:
+            return _ebay_app_id_missing(self)
+        params = {
+            "OPERATION-NAME": "findItemsAdvanced",
+            "SERVICE-VERSION": "1.0.0",
+            "SECURITY-APPNAME": EBAY_APP_ID,
+            "RESPONSE-DATA-FORMAT": "JSON",
+            "REST-PAYLOAD": "",
+            "keywords": clean_product_name_for_ebay(product_name),
+            "itemFilter(0).name": "Condition",
+            "itemFilter(0).value": "New",
+            "itemFilter(1).name": "ListingType",
+            "itemFilter(1).value": "FixedPrice",  # Only "Buy It Now" items
+            "sortOrder": "PricePlusShippingLowest",  # Sort by lowest price
+            "paginationInput.entriesPerPage": "50"
+        }
+        prices = _ebay_item_prices(_ebay_get(params, deadline, progress), 'findItemsAdvanced')
+        return ProviderPrice(provider=self.name, kind=self.kind, price=min(prices) if prices else None, item_count=len(prices), error_message=None)
+
+
+def _ebay_app_id_missing(provider):
+    """Empty answer of an eBay provider without credentials"""
+    return ProviderPrice(provider=provider.name, kind=provider.kind, price=None, item_count=0, error_message="EBAY_APP_ID not set")
+
+
+class PriceHistoryProvider(PriceProvider):
+    """Rolling median from product_price_history, also when it is too old or small to skip eBay"""
+    
+    name = 'price_history'
+    weight = PRICE_HISTORY_PROVIDER_WEIGHT
+    
+    def lookup(self, product_name, deadline, progress=None):
+        history = lookup_price_history(product_name)
+        if not history or not history.get('median_price'):
+            return ProviderPrice(provider=self.name, kind=self.kind, price=None, item_count=0, error_message=None)
+        return ProviderPrice(provider=self.name, kind=self.kind, price=float(history['median_price']),
+                             item_count=history.get('sample_count') or 0, error_message=None)
+
+
+class StaticPriceProvider(PriceProvider):
+    """Fixed prices by canonical product name, a local stand-in for any provider in tests and offline runs
+    (e.g. StaticPriceProvider({"bosch ghg 18v-50": 120.0}, name='ebay_sold', delay_seconds=0.2))"""
+    
+    def __init__(self, prices, name='static', kind='sold', weight=1.0, delay_seconds=0.0, hedge_after_seconds=None):
+        self.prices = {canonical_product_name(product): float(price) for product, price in prices.items()}
+        self.name = name
+        self.kind = kind
+        self.weight = weight
+        self.delay_seconds = delay_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+    
+    def lookup(self, product_name, deadline, progress=None):
+        if self.delay_seconds:
+            time.sleep(min(self.delay_seconds, max(deadline - time.monotonic(), 0)))
+        price = self.prices.get(canonical_product_name(product_name))
+        return ProviderPrice(provider=self.name, kind=self.kind, price=price, item_count=1 if price else 0, error_message=None)
+
+
+def _static_price_provider():
+    """'static' entry of PRICE_PROVIDERS: prices from the JSON file STATIC_PRICES_FILE"""
+    if not STATIC_PRICES_FILE:
+        raise Exception("PRICE_PROVIDERS contains 'static' but STATIC_PRICES_FILE is not set")
+    with open(STATIC_PRICES_FILE, encoding='utf-8') as prices_file:
+        return StaticPriceProvider(json.load(prices_file))
+
+
+PRICE_PROVIDER_FACTORIES = {
+    'ebay_sold': EbaySoldProvider,
+    'ebay_offer': EbayOfferProvider,
+    'price_history': PriceHistoryProvider,
+    'static': _static_price_provider
+}
+
+
+def get_price_providers():
+    """Return the configured price providers (PRICE_PROVIDERS), created on first use"""
+    global _price_providers
+    if _price_providers is None:
+        with _client_lock:
+            if _price_providers is None:
+                providers = []
+                for name in PRICE_PROVIDERS:
+                    if name not in PRICE_PROVIDER_FACTORIES:
+                        logging.warning(f"Unknown price provider '{name}' in PRICE_PROVIDERS, ignoring it")
+                        continue
+                    providers.append(PRICE_PROVIDER_FACTORIES[name]())
+                _price_providers = providers
+    return _price_providers
+
+
+def set_price_providers(providers):
+    """Replace the price providers (e.g. with StaticPriceProvider stubs); None restores PRICE_PROVIDERS"""
+    global _price_providers
+    with _client_lock:
+        _price_providers = list(providers) if providers is not None else None
+
+
+def price_providers_available(providers=None):
+    """False if every price provider depends on a dependency whose circuit breaker is open"""
+    providers = get_price_providers() if providers is None else providers
+    return any(provider.breaker is None or not get_circuit_breaker(provider.breaker).is_open() for provider in providers)
+
+
+def get_price_executor():
+    """Return the shared thread pool for price provider fan-out"""
+    global _price_executor
+    if _price_executor is None:
+        with _client_lock:
+            if _price_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _price_executor = ThreadPoolExecutor(max_workers=PRICE_FANOUT_WORKERS, thread_name_prefix='price')
+    return _price_executor
+
+
+def fetch_market_prices(product_name, providers, budget_seconds=None):
+    """Query all providers concurrently within budget_seconds (PRICE_LOOKUP_BUDGET_SECONDS)
+    Each provider gets its own deadline (capped by the budget). A provider still in its first attempt after
+    hedge_after_seconds gets a second, single-attempt request and the first useful answer wins.
+    Returns {provider_name: ProviderPrice}; providers without an answer in time report a timeout"""
+    from concurrent.futures import wait, FIRST_COMPLETED
+    executor = get_price_executor()
+    started = time.monotonic()
+    budget_deadline = started + (budget_seconds or PRICE_LOOKUP_BUDGET_SECONDS)
+    
+    pending = {}  # future -> (provider, deadline, progress)
+    for provider in providers:
+        deadline = min(budget_deadline, started + provider.deadline_seconds)
+        progress = LookupProgress()
+        pending[executor.submit(provider.lookup, product_name, deadline, progress)] = (provider, deadline, progress)
+    
+    results = {}
+    hedged = set()
+    while pending:
+        now = time.monotonic()
+        if now >= budget_deadline:
+            break
+        wake_at = budget_deadline
+        for provider, _, _ in pending.values():
+            if provider.hedge_after_seconds and provider.name not in hedged:
+                wake_at = min(wake_at, started + provider.hedge_after_seconds)
+        done, _ = wait(list(pending), timeout=max(wake_at - now, 0), return_when=FIRST_COMPLETED)
+        
+        for future in done:
+            provider, _, _ = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = ProviderPrice(provider=provider.name, kind=provider.kind, price=None, item_count=0, error_message=str(e)[:200])
+            siblings = [f for f, (p, _, _) in pending.items() if p.name == provider.name]
+            if result.price is None and result.error_message and siblings:
+                # A failed attempt doesn't end the race while its hedge is still running
+                results.setdefault(provider.name, result)
+                continue
+            results[provider.name] = result
+            for sibling in siblings:
+                pending.pop(sibling)
+                sibling.cancel()
+        
+        # Hedge providers whose first attempt is still running after their hedge delay
+        # (a provider that already retries is failing, not slow, and a duplicate would only add load)
+        now = time.monotonic()
+        for provider, deadline, progress in list(pending.values()):
+            if (provider.hedge_after_seconds and provider.name not in hedged and not progress.retrying.is_set()
+                    and now - started >= provider.hedge_after_seconds):
+                hedged.add(provider.name)
+                logging.debug(f"Hedging slow price provider '{provider.name}'")
+                hedge = LookupProgress(hedge=True)
+                pending[executor.submit(provider.lookup, product_name, deadline, hedge)] = (provider, deadline, hedge)
+    
+    for provider, _, _ in pending.values():
+        if provider.name not in results:
+            results[provider.name] = ProviderPrice(provider=provider.name, kind=provider.kind, price=None, item_count=0,
+                                                   error_message=f"Timeout after {budget_deadline - started:.1f}s")
+    return results
+
+
+def combine_market_prices(results, providers):
+    """Weighted mean of all 'sold' prices that arrived (weights from the providers), None if there is none"""
+    weights = {provider.name: provider.weight for provider in providers}
+    weighted = [(result.price, weights.get(result.provider, 1.0)) for result in results.values()
+                if result.kind == 'sold' and result.price]
+    total_weight = sum(weight for _, weight in weighted)
+    if not total_weight:
+        return None
+    return sum(price * weight for price, weight in weighted) / total_weight
+
+
+def get_ebay_market_price(product_name, log_id=None, rss_price=None, source=None):
+    """Get the market price used for the profit check from all price providers (fetch_market_prices)
+    eBay sold median (Verkaufspreis), lowest eBay offer (Angebotspreis) and the other providers are
+    queried in parallel. Missing eBay credentials or an open eBay circuit breaker only empty the eBay
+    providers, the others still count. The lookup is stored in ebay_queries. Returns the combined market price or None"""
+    try:
+        # Clean product name for eBay query
+        cleaned_name = clean_product_name_for_ebay(product_name)
+        if not cleaned_name or len(cleaned_name) < 3:
+            logging.warning(f"Product name too short after cleaning: '{product_name[:50]}'")
+            return None
+        
+        providers = get_price_providers()
+        results = fetch_market_prices(product_name, providers)
+        market_price = combine_market_prices(results, providers)
+        empty = ProviderPrice(provider='', kind='', price=None, item_count=0, error_message=None)
+        sold = results.get('ebay_sold', empty)
+        offer = results.get('ebay_offer', empty)
+        errors = [f"{result.provider}: {result.error_message}" for result in results.values() if result.error_message]
+        
+        if market_price or offer.price:
+            provider_prices = ', '.join(f"{name}={_format_price(result.price)}" for name, result in results.items())
+            logging.info(f"eBay query '{product_name[:50]}': "
+                        f"Verkaufspreis (Median): {_format_price(sold.price)} ({sold.item_count} items) | "
+                        f"Angebotspreis (Niedrigster): {_format_price(offer.price)} ({offer.item_count} items) | "
+                        f"Marktpreis: {_format_price(market_price)} ({provider_prices})")
+        else:
+            logging.info(f"eBay query '{product_name[:50]}': Keine Preise gefunden")
+        
+        # Feed the rolling price history with real eBay sales only
+        if sold.price:
+            record_price_observation(product_name, sold.price)
+        
+        # Save eBay query to database for tracking
+        storage = get_storage()
+        if log_id and storage:
+            try:
+                quote = PriceQuote(
+                    log_id=log_id,
+                    source=source,
+                    product_name=product_name,
+                    rss_price=rss_price,
+                    market_price=market_price,
+                    ebay_sold_price=sold.price,
+                    ebay_offer_price=offer.price,
+                    ebay_sold_items_found=sold.item_count,
+                    ebay_offer_items_found=offer.item_count,
+                    error_message='; '.join(errors)[:500] or None
+                )
+                storage.insert_ebay_query(quote.to_row())
+            except Exception as e:
+                logging.error(f"Failed to save eBay query: {e}")
+        
+        return market_price
+    except Exception as e:
+        error_msg = str(e)
+        logging.error(f"eBay API error for '{product_name[:50] if product_name else 'unknown'}': {e}")
+        
+        # Save error to database
+        storage = get_storage()
+        if log_id and storage:
+            try:
+                quote = PriceQuote(
+                    log_id=log_id,
+                    source=source,
+                    product_name=product_name,
+                    rss_price=rss_price,
+                    market_price=None,
+                    ebay_sold_price=None,
+                    ebay_offer_price=None,
+                    ebay_sold_items_found=0,
+                    ebay_offer_items_found=0,
+                    error_message=error_msg
+                )
+                storage.insert_ebay_query(quote.to_row())
+            except:
+                pass
+        
+        return None
+
+
+def get_smtp_connection():
+    """Return a logged-in Gmail SMTP connection, reused between alerts while it stays alive"""
+    global _smtp_connection
+    import smtplib
+    with _client_lock:
+        if _smtp_connection is not None:
+            try:
+                if _smtp_connection.noop()[0] == 250:
+                    return _smtp_connection
+            except smtplib.SMTPException:
+                pass
+            close_smtp_connection()
+        server = smtplib.SMTP('smtp.gmail.com', 587, timeout=30)
+        server.starttls()
+        server.login(GMAIL_USER, GMAIL_PASSWORD)
+        _smtp_connection = server
+        return _smtp_connection
+
+
+def close_smtp_connection():
+    """Close the shared SMTP connection if one is open"""
+    global _smtp_connection
+    with _client_lock:
+        if _smtp_connection is not None:
+            try:
+                _smtp_connection.quit()
+            except Exception:
+                pass
+            _smtp_connection = None
+
+
+def send_email_alert(deal):
+    """Send email alert for a Deal via Gmail SMTP"""
+    try:
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+
+        msg = MIMEMultipart()
+        msg['From'] = GMAIL_USER
+        msg['To'] = ALERT_EMAIL
+        msg['Subject'] = f"🎯 ArbiBot: Profitabler Deal gefunden! (+{deal.profit:.2f}€)"
+        
+        body = f"""
+        Neuer profitabler Deal gefunden!
+        
+        Produkt: {deal.product_name}
+        Quelle: {deal.source}
+        RSS Preis: {deal.rss_price:.2f} €
+        eBay Preis (netto): {deal.ebay_price:.2f} €
+        Gewinn: {deal.profit:.2f} €
+        
+        Link: {deal.product_url}
+        """
+        
+        msg.attach(MIMEText(body, 'plain'))
+        
+        def send():
+            try:
+                get_smtp_connection().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # Gmail drops idle connections, reconnect once
+                close_smtp_connection()
+                get_smtp_connection().send_message(msg)
+        
+        get_circuit_breaker('smtp').call(send)
+        
+        logging.info(f"Email alert sent for deal: {deal.product_name}")
+    except Exception as e:
+        logging.error(f"Email sending error: {e}")
+
+
+def _name_tokens(product_name):
+    """Lowercase word tokens of a product name used for similarity matching"""
+    return set(re.findall(r'[a-z0-9äöüß]+(?:[-.][a-z0-9]+)*', (product_name or '').lower()))
+
+
+def load_ebay_price_history(limit=None):
+    """Load recent eBay query results used to rank candidates
+    Returns list of dicts with tokens, rss_price and sold_price (None if eBay found nothing)"""
+    storage = get_storage()
+    if not storage:
+        return []
+    
+    limit = limit or EBAY_HISTORY_SAMPLE_SIZE
+    try:
+        rows = storage.recent_ebay_queries(limit)
+    except Exception as e:
+        logging.warning(f"Could not load eBay price history for ranking: {e}")
+        return []
+    
+    history = []
+    for row in rows:
+        history.append({
+            "tokens": _name_tokens(row.get('product_name')),
+            "rss_price": float(row['rss_price']) if row.get('rss_price') else None,
+            "sold_price": float(row['ebay_sold_price']) if row.get('ebay_sold_price') else None
+        })
+    return history
+
+
+def _resale_prior(tokens, learned_ratios):
+    """Prior ratio of eBay price to deal price from brand/category keywords
+    Learned brand ratios from history are blended with the static priors by sample size"""
+    ratio = DEFAULT_RESALE_RATIO
+    for token in tokens:
+        if token in RESALE_RATIO_PRIORS:
+            ratio = RESALE_RATIO_PRIORS[token]
+            break
+    
+    for token in tokens:
+        if token in learned_ratios:
+            learned_ratio, samples = learned_ratios[token]
+            weight = samples / (samples + 5.0)
+            return weight * learned_ratio + (1 - weight) * ratio
+    return ratio
+
+
+def rank_ebay_candidates(candidates, history, price_histories=None):
+    """Sort ProductCandidates by expected profit, highest first
+    Expected profit = P(eBay finds a price) * (estimated eBay price - rss_price), where the estimate
+    blends the product's rolling price history, sold prices of similar historical queries and
+    brand/category resale priors"""
+    price_histories = price_histories or {}
+    # Overall hit rate and per-brand resale ratios from history
+    lookups = len(history)
+    hits = sum(1 for h in history if h['sold_price'])
+    base_hit_rate = (hits + 1.0) / (lookups + 2.0)
+    
+    ratio_sums = {}
+    for h in history:
+        if not (h['sold_price'] and h['rss_price']):
+            continue
+        for token in h['tokens']:
+            if token in RESALE_RATIO_PRIORS:
+                total, count = ratio_sums.get(token, (0.0, 0))
+                ratio_sums[token] = (total + h['sold_price'] / h['rss_price'], count + 1)
+    learned_ratios = {token: (total / count, count) for token, (total, count) in ratio_sums.items()}
+    
+    for candidate in candidates:
+        tokens = _name_tokens(candidate.product_name)
+        rss_price = candidate.rss_price
+        
+        # Similar historical queries (Jaccard similarity on name tokens)
+        similar_weight = 0.0
+        similar_hits = 0.0
+        price_weight = 0.0
+        weighted_price = 0.0
+        if tokens:
+            for h in history:
+                if not h['tokens']:
+                    continue
+                similarity = len(tokens & h['tokens']) / len(tokens | h['tokens'])
+                if similarity < 0.5:
+                    continue
+                similar_weight += similarity
+                if h['sold_price']:
+                    similar_hits += similarity
+                    price_weight += similarity
+                    weighted_price += similarity * h['sold_price']
+        
+        # Exact matches in the price history count once per sample
+        product_history = price_histories.get(canonical_product_name(candidate.product_name))
+        if product_history and product_history.get('median_price'):
+            samples = product_history.get('sample_count') or 1
+            similar_weight += samples
+            similar_hits += samples
+            price_weight += samples
+            weighted_price += samples * float(product_history['median_price'])
+        
+        prior_price = rss_price * _resale_prior(tokens, learned_ratios)
+        if price_weight:
+            # Trust history more the more similar queries we have seen
+            history_price = weighted_price / price_weight
+            estimated_price = (price_weight * history_price + prior_price) / (price_weight + 1.0)
+        else:
+            estimated_price = prior_price
+        hit_probability = (similar_hits + 2.0 * base_hit_rate) / (similar_weight + 2.0)
+        
+        candidate.estimated_ebay_price = estimated_price
+        candidate.expected_profit = hit_probability * (estimated_price - rss_price)
+    
+    return sorted(candidates, key=lambda c: c.expected_profit, reverse=True)
+
+
+def _parse_timestamp(value):
+    """Parse an ISO timestamp from Supabase into an aware datetime (None if missing/invalid)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def load_feed_registry():
+    """Return all enabled feeds from the feeds table
+    Falls back to RSS_SOURCES (polled on every run) if the table is missing or empty"""
+    try:
+        feeds = get_storage().enabled_feeds()
+        if feeds:
+            for feed in feeds:
+                feed['registered'] = True
+            return feeds
+        logging.warning("Feed registry is empty, using RSS_SOURCES")
+    except Exception as e:
+        logging.warning(f"Could not load feed registry, using RSS_SOURCES: {e}")
+    return [{"url": url, "registered": False} for url in RSS_SOURCES]
+
+
+def feed_is_due(feed, now):
+    """Check whether a feed's adaptive poll interval has elapsed"""
+    next_poll_at = _parse_timestamp(feed.get('next_poll_at'))
+    return next_poll_at is None or next_poll_at <= now
+
+
+def feed_scan_size(feed):
+    """Entries read per poll of a feed: ENTRY_SCAN_LIMIT, but at least the feed's extraction budget"""
+    max_entries = feed.get('max_entries') or int(os.getenv('MAX_ENTRIES_PER_FEED', '10'))
+    return max(ENTRY_SCAN_LIMIT, max_entries)
+
+
+def compute_poll_interval(feed, new_entries, entries_read, now):
+    """Learn the feed's new-entry rate and derive the next poll interval
+    Returns (new_entries_per_hour, interval_minutes). The interval aims to poll again once about half
+    of the entries one poll can see (feed_scan_size(), or fewer if the feed is shorter) are new.
+    Unprocessed entries carry over in feed_entries, so the extraction budget does not limit it.
+    If every entry read was new we likely missed some, so the interval is at least halved."""
+    min_minutes = feed.get('min_poll_interval_minutes') or FEED_MIN_POLL_MINUTES
+    max_minutes = feed.get('max_poll_interval_minutes') or FEED_MAX_POLL_MINUTES
+    current_minutes = feed.get('poll_interval_minutes') or FEED_DEFAULT_POLL_MINUTES
+    previous_rate = feed.get('new_entries_per_hour')
+    previous_rate = float(previous_rate) if previous_rate is not None else None
+    
+    last_polled_at = _parse_timestamp(feed.get('last_polled_at'))
+    if last_polled_at is None or not feed.get('recent_guids'):
+        # First poll: nothing to compare against yet
+        return previous_rate, current_minutes
+    
+    hours = max((now - last_polled_at).total_seconds() / 3600, 1 / 60)
+    observed_rate = new_entries / hours
+    rate = observed_rate if previous_rate is None else FEED_RATE_SMOOTHING * observed_rate + (1 - FEED_RATE_SMOOTHING) * previous_rate
+    
+    if rate <= 0:
+        interval = max_minutes
+    else:
+        window = min(entries_read, feed_scan_size(feed)) if entries_read else feed_scan_size(feed)
+        interval = 60 * (window / 2) / rate
+    if entries_read and new_entries >= entries_read:
+        interval = min(interval, current_minutes / 2)
+    
+    return round(rate, 3), int(min(max(interval, min_minutes), max_minutes))
+
+
+def update_feed_poll_state(feed, guids, now, failed=False):
+    """Store the learned rate, next poll time and recently seen GUIDs of a registered feed"""
+    if not feed.get('registered'):
+        return
+    
+    recent_guids = feed.get('recent_guids') or []
+    if failed:
+        rate = feed.get('new_entries_per_hour')
+        interval = feed.get('poll_interval_minutes') or FEED_DEFAULT_POLL_MINUTES
+    else:
+        seen = set(recent_guids)
+        new_entries = len([guid for guid in guids if guid not in seen])
+        rate, interval = compute_poll_interval(feed, new_entries, len(guids), now)
+        current = set(guids)
+        recent_guids = (list(guids) + [guid for guid in recent_guids if guid not in current])[:FEED_RECENT_GUIDS]
+    
+    try:
+        get_storage().update_feed(feed['id'], {
+            "new_entries_per_hour": rate,
+            "poll_interval_minutes": interval,
+            "recent_guids": recent_guids,
+            "last_polled_at": now.isoformat(),
+            "next_poll_at": (now + timedelta(minutes=interval)).isoformat()
+        })
+    except Exception as e:
+        logging.error(f"Failed to update poll state for {feed['url']}: {e}")
+
+
+def score_feed_item(item, now, seen_guids=()):
+    """Priority of a feed entry for the Gemini budget (higher is extracted first)
+    Weighs recency, unseen entries, a price in the title, mydealz temperature and non-physical categories
+    (see ENTRY_SCORE_WEIGHTS)"""
+    score = 0.0
+    published_at = _parse_timestamp(item.published_at)
+    if published_at is not None:
+        age_hours = max((now - published_at).total_seconds() / 3600, 0)
+        score += ENTRY_SCORE_WEIGHTS['recency'] * 0.5 ** (age_hours / ENTRY_RECENCY_HALF_LIFE_HOURS)
+    else:
+        # Without a date the entry counts as half a half-life old
+        score += ENTRY_SCORE_WEIGHTS['recency'] * 0.5 ** 0.5
+    if item.guid not in seen_guids:
+        score += ENTRY_SCORE_WEIGHTS['unseen']
+    if item.merchant_price or TITLE_PRICE_PATTERN.search(item.title or ''):
+        score += ENTRY_SCORE_WEIGHTS['title_price']
+    if item.temperature is not None:
+        score += ENTRY_SCORE_WEIGHTS['temperature'] * max(min(item.temperature, 1000), -1000) / 500
+    categories = ' '.join(item.categories or []).lower()
+    if categories and any(keyword in categories for keyword in ENTRY_NON_PHYSICAL_CATEGORIES):
+        score += ENTRY_SCORE_WEIGHTS['non_physical']
+    return score
+
+
+def select_feed_items(source_url, items, max_entries, now, seen_guids=()):
+    """Pick the max_entries best-scored entries from the fresh items and the unprocessed backlog of earlier runs
+    New items are added to feed_entries first, so entries that are not picked carry over to the next run.
+    Returns (selected FeedItems, number of entries left pending). Without the backlog only items are scored."""
+    cutoff = now - timedelta(hours=ENTRY_MAX_AGE_HOURS)
+    fresh = [item for item in items if (_parse_timestamp(item.published_at) or now) >= cutoff]
+    storage = get_storage()
+    try:
+        first_seen_at = now.isoformat()
+        storage.add_feed_entries([
+            dict(item.to_row(), feed_url=source_url, status='pending', first_seen_at=first_seen_at) for item in fresh
+        ])
+        pending = [
+            FeedItem(**{field: row.get(field) for field in FeedItem.__slots__})
+            for row in storage.pending_feed_entries(source_url, cutoff.isoformat(), ENTRY_SCAN_LIMIT * 4)
+        ]
+    except Exception as e:
+        logging.warning(f"Feed entry backlog unavailable for {source_url}, selecting from current entries only: {e}")
+        pending = fresh
+    ranked = sorted(pending, key=lambda item: score_feed_item(item, now, seen_guids), reverse=True)
+    return ranked[:max_entries], max(len(ranked) - max_entries, 0)
+
+
+def mark_feed_items_processed(source_url, guids):
+    """Remove extracted entries from the backlog of a feed"""
+    if not guids:
+        return
+    try:
+        get_storage().mark_feed_entries_processed(source_url, guids)
+    except Exception as e:
+        logging.warning(f"Could not mark feed entries of {source_url} as processed: {e}")
+
+
+def record_daily_stats(feed_runs):
+    """Add the per-feed counters of a run to the stats_daily rollup (one row per UTC day and source)"""
+    storage = get_storage()
+    day = datetime.now(timezone.utc).date().isoformat()
+    for source_url, _, stats in feed_runs:
+        try:
+            storage.increment_daily_stats(day, source_url, {
+                "runs": 1,
+                "feed_errors": 1 if stats["error"] else 0,
+                "entries_seen": stats["feed_products"],
+                "products_extracted": stats["gemini_with_price"],
+                "ebay_queries": stats["ebay_queries"],
+                "ebay_hits": stats["ebay_hits"],
+                "history_hits": stats["history_hits"],
+                "ebay_skipped": stats["ebay_skipped"],
+                "deals": stats["profitable_deals"],
+                "profit_sum": round(stats["profit_sum"], 2),
+                "profit_max": round(stats["profit_max"], 2) if stats["profit_max"] is not None else None
+            })
+        except Exception as e:
+            logging.error(f"Failed to update daily stats for {source_url}: {e}")
+
+
+def summarize_daily_stats(rows):
+    """Totals per source and overall from stats_daily rows, with eBay hit rate and average deal profit"""
+    def finish(totals):
+        totals["ebay_hit_rate"] = round(totals["ebay_hits"] / totals["ebay_queries"], 3) if totals["ebay_queries"] else None
+        totals["avg_profit"] = round(totals["profit_sum"] / totals["deals"], 2) if totals["deals"] else None
+        totals["profit_sum"] = round(totals["profit_sum"], 2)
+        return totals
+    
+    sources = {}
+    overall = dict.fromkeys(STATS_COUNTERS, 0)
+    overall["profit_max"] = None
+    for row in rows:
+        totals = sources.setdefault(row['source'], dict(dict.fromkeys(STATS_COUNTERS, 0), profit_max=None))
+        for target in (totals, overall):
+            for column in STATS_COUNTERS:
+                target[column] += float(row.get(column) or 0) if column == 'profit_sum' else int(row.get(column) or 0)
+            if row.get('profit_max') is not None:
+                target["profit_max"] = max(target["profit_max"] or 0, float(row['profit_max']))
+    return {
+        "sources": {source: finish(totals) for source, totals in sources.items()},
+        "total": finish(overall)
+    }
 
 
-def get_ebay_market_price(product_name, log_id=None, rss_price=None, source=None):
-    """Get market prices from eBay API: Verkaufspreis (median), Angebotspreis (lowest), Medianpreis (median sold)
-    Returns dict with: sold_price (median), offer_price (lowest current), median_price (same as sold_price)"""
+def run_retention_job():
+    """Compact old ebay_queries into daily summaries and delete old logs (see run_retention in schema.sql)
+    Returns the counts reported by the database, or None if retention is disabled or failed"""
+    storage = get_storage()
+    if not RETENTION_ENABLED or not storage:
+        return None
     try:
-        if not EBAY_APP_ID:
-            logging.warning("EBAY_APP_ID not set, skipping eBay query")
-            return None
-        
-        # Clean product name for eBay query
-        cleaned_name = clean_product_name_for_ebay(product_name)
-        if not cleaned_name or len(cleaned_name) < 3:
-            logging.warning(f"Product name too short after cleaning: '{product_name[:50]}'")
-            return None
-        
-        finding_url = "https://svcs.ebay.de/services/search/FindingService/v1"
-        from datetime import datetime, timedelta
-        
-        # Results
-        sold_prices = []  # Verkaufte Artikel (für Verkaufspreis und Medianpreis)
-        offer_prices = []  # Aktuelle Angebote (für niedrigsten Angebotspreis)
-        sold_items_found = 0
-        offer_items_found = 0
-        error_msg = None
-        
-        # 1. Search for SOLD items (findCompletedItems) - für Verkaufspreis und Medianpreis
+        result = storage.run_retention(EBAY_QUERY_RETENTION_DAYS, LOG_RETENTION_DAYS)
+        entry_cutoff = datetime.now(timezone.utc) - timedelta(hours=ENTRY_BACKLOG_RETENTION_HOURS)
+        result = dict(result or {}, feed_entries_deleted=storage.purge_feed_entries(entry_cutoff.isoformat()))
+        logging.info(f"Retention job finished: {result}")
+        return result
+    except Exception as e:
+        logging.error(f"Retention job failed: {e}")
+        return None
+
+
+def within_run_window(now=None):
+    """Check whether the local time lies inside the daily run window (8:00 - 20:00)"""
+    hour = (now or datetime.now()).hour
+    return RUN_WINDOW_START_HOUR <= hour < RUN_WINDOW_END_HOUR
+
+
+def seconds_until_run_window(now=None):
+    """Seconds until the next start of the daily run window (0 inside the window)"""
+    now = now or datetime.now()
+    if within_run_window(now):
+        return 0.0
+    start = now.replace(hour=RUN_WINDOW_START_HOUR, minute=0, second=0, microsecond=0)
+    if now.hour >= RUN_WINDOW_END_HOUR:
+        start += timedelta(days=1)
+    return (start - now).total_seconds()
+
+
+def extractor_bypass_rate(stats):
+    """Share of extracted entries of a feed that skipped Gemini"""
+    extracted = stats["extractor_hits"] + stats["gemini_extractions"]
+    return round(stats["extractor_hits"] / extracted, 3) if extracted else 0.0
+
+
+def iter_product_candidates(items, source_url, log_id, stats, should_stop, processed_guids=None):
+    """Lazily extract ProductCandidates (products with a price) from FeedItems
+    Entries are still counted but not sent to Gemini once should_stop() returns True. GUIDs of entries
+    sent to Gemini are appended to processed_guids."""
+    for item in items:
+        stats["feed_products"] += 1
+        if should_stop():
+            continue
+        if processed_guids is not None:
+            processed_guids.append(item.guid)
         try:
-            end_time_from = datetime.now() - timedelta(days=90)
-            finding_params_sold = {
-                "OPERATION-NAME": "findCompletedItems",
-                "SERVICE-VERSION": "1.0.0",
-                "SECURITY-APPNAME": EBAY_APP_ID,
-                "RESPONSE-DATA-FORMAT": "JSON",
-                "REST-PAYLOAD": "",
-                "keywords": cleaned_name,
-                "itemFilter(0).name": "Condition",
-                "itemFilter(0).value": "New",
-                "itemFilter(1).name": "SoldItemsOnly",
-                "itemFilter(1).value": "true",
-                "itemFilter(2).name": "EndTimeFrom",
-                "itemFilter(2).value": end_time_from.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-                "paginationInput.entriesPerPage": "50"
-            }
-            
-            response_sold = session.get(finding_url, params=finding_params_sold, timeout=15, verify=True)
-            
-            if response_sold.status_code == 200:
-                data_sold = response_sold.json()
-                if 'findCompletedItemsResponse' in data_sold:
-                    response_data = data_sold['findCompletedItemsResponse'][0]
-                    if 'errorMessage' not in response_data:
-                        try:
-                            search_result = response_data.get('searchResult', [{}])[0]
-                            items = search_result.get('item', [])
-                            sold_items_found = len(items)
-                            for item in items:
-                                try:
-                                    selling_status = item.get('sellingStatus', [{}])[0]
-                                    current_price = selling_status.get('currentPrice', [{}])[0]
-                                    price_value = float(current_price.get('__value__', 0))
-                                    if price_value > 0:
-                                        sold_prices.append(price_value)
-                                except:
-                                    continue
-                        except Exception as e:
-                            logging.debug(f"Error parsing sold items: {e}")
+            # Structured fields / title layout of the source first, Gemini only if that is not confident
+            products = extract_with_source_extractor(item, source_url)
+            if products:
+                stats["extractor_hits"] += 1
+            else:
+                # Extract product info with Gemini (can return multiple products)
+                # Rate limiting is handled by the per-model budgets of the tiered extractor
+                products = extract_product_info_with_gemini(item.title, item.description)
+                stats["gemini_extractions"] += 1
         except Exception as e:
-            logging.debug(f"Error querying sold items: {e}")
+            logging.error(f"Error processing entry: {e}")
+            continue
         
-        # Small delay between requests
-        time.sleep(0.5)
-        
-        # 2. Search for CURRENT listings (findItemsAdvanced) - für niedrigsten Angebotspreis
+        for product_name, rss_price in products:
+            if rss_price <= 0:
+                continue
+            stats["gemini_with_price"] += 1
+            yield ProductCandidate(
+                source=source_url,
+                log_id=log_id,
+                product_name=product_name,
+                rss_price=rss_price,
+                entry_title=item.title,
+                entry_link=item.link,
+                estimated_ebay_price=None,
+                expected_profit=None
+            )
+
+
+class RunAlreadyActiveError(Exception):
+    """Raised by process_rss_feeds while another run holds the run lock"""
+    pass
+
+
+class RunLock:
+    """Lease-based lock in the run_locks table, renewed by a heartbeat thread while the run is active
+    A crashed run stops renewing and its lock expires after lease_seconds. If the lease cannot be renewed
+    (another caller took over the expired lock) lost is set and the run should stop.
+    Without a usable run_locks table the run proceeds unlocked and state() reports 'unavailable'."""
+    
+    def __init__(self, name=RUN_LOCK_NAME, lease_seconds=RUN_LOCK_LEASE_SECONDS):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        self.lost = threading.Event()
+        self.unavailable = False
+        self._held = False
+        self._stop = threading.Event()
+        self._heartbeat = None
+    
+    def state(self):
+        """'held', 'lost' or 'unavailable' (run without lock protection), for the run result"""
+        if self.unavailable:
+            return 'unavailable'
+        return 'lost' if self.lost.is_set() else 'held'
+    
+    def __enter__(self):
+        storage = get_storage()
         try:
-            finding_params_offer = {
-                "OPERATION-NAME": "findItemsAdvanced",
-                "SERVICE-VERSION": "1.0.0",
-                "SECURITY-APPNAME": EBAY_APP_ID,
-                "RESPONSE-DATA-FORMAT": "JSON",
-                "REST-PAYLOAD": "",
-                "keywords": cleaned_name,
-                "itemFilter(0).name": "Condition",
-                "itemFilter(0).value": "New",
-                "itemFilter(1).name": "ListingType",
-                "itemFilter(1).value": "FixedPrice",  # Only "Buy It Now" items
-                "sortOrder": "PricePlusShippingLowest",  # Sort by lowest price
-                "paginationInput.entriesPerPage": "50"
-            }
-            
-            response_offer = session.get(finding_url, params=finding_params_offer, timeout=15, verify=True)
-            
-            if response_offer.status_code == 200:
-                data_offer = response_offer.json()
-                if 'findItemsAdvancedResponse' in data_offer:
-                    response_data = data_offer['findItemsAdvancedResponse'][0]
-                    if 'errorMessage' not in response_data:
-                        try:
-                            search_result = response_data.get('searchResult', [{}])[0]
-                            items = search_result.get('item', [])
-                            offer_items_found = len(items)
-                            for item in items:
-                                try:
-                                    selling_status = item.get('sellingStatus', [{}])[0]
-                                    current_price = selling_status.get('currentPrice', [{}])[0]
-                                    price_value = float(current_price.get('__value__', 0))
-                                    if price_value > 0:
-                                        offer_prices.append(price_value)
-                                except:
-                                    continue
-                        except Exception as e:
-                            logging.debug(f"Error parsing offer items: {e}")
+            acquired = storage.acquire_run_lock(self.name, self.owner, self.lease_seconds)
         except Exception as e:
-            logging.debug(f"Error querying offer items: {e}")
-        
-        # Calculate prices
-        sold_price_median = None
-        offer_price_lowest = None
-        median_price = None
-        
-        if sold_prices:
-            sold_prices.sort()
-            sold_price_median = sold_prices[len(sold_prices) // 2]  # Median
-            median_price = sold_price_median  # Same as sold_price_median
-        
-        if offer_prices:
-            offer_price_lowest = min(offer_prices)  # Lowest current offer
-        
-        # Use sold_price_median for profit calculation (backward compatibility)
-        ebay_price_result = sold_price_median
-        
-        logging.info(f"eBay query '{product_name[:50]}': "
-                    f"Verkaufspreis (Median): {sold_price_median:.2f}€ ({len(sold_prices)} items) | "
-                    f"Angebotspreis (Niedrigster): {offer_price_lowest:.2f}€ ({len(offer_prices)} items) | "
-                    f"Medianpreis: {median_price:.2f}€" if median_price else "Keine Preise gefunden")
-        
-        # Save eBay query to database for tracking
-        if log_id and supabase:
+            logging.warning(f"Run lock unavailable, running without it: {e}")
+            self.unavailable = True
+            return self
+        if not acquired:
+            raise RunAlreadyActiveError(f"Another run holds the lock '{self.name}'")
+        self._held = True
+        self._heartbeat = threading.Thread(target=self._renew_loop, name='run-lock-heartbeat', daemon=True)
+        self._heartbeat.start()
+        return self
+    
+    def _renew_loop(self):
+        storage = get_storage()
+        renewed_at = time.monotonic()
+        while not self._stop.wait(self.lease_seconds / 3):
             try:
-                profit = (sold_price_median - rss_price) if (sold_price_median and rss_price) else None
-                query_entry = {
-                    "log_id": log_id,
-                    "source": source or "",
-                    "product_name": product_name[:500],
-                    "rss_price": float(rss_price) if rss_price else None,
-                    "ebay_price": float(sold_price_median) if sold_price_median else None,  # Backward compatibility
-                    "ebay_sold_price": float(sold_price_median) if sold_price_median else None,
-                    "ebay_offer_price": float(offer_price_lowest) if offer_price_lowest else None,
-                    "ebay_median_price": float(median_price) if median_price else None,
-                    "ebay_items_found": sold_items_found + offer_items_found,  # Total
-                    "ebay_sold_items_found": sold_items_found,
-                    "ebay_offer_items_found": offer_items_found,
-                    "profit": float(profit) if profit else None,
-                    "query_successful": sold_price_median is not None or offer_price_lowest is not None,
-                    "error_message": error_msg
-                }
-                supabase.table('ebay_queries').insert(query_entry).execute()
+                if not storage.renew_run_lock(self.name, self.owner, self.lease_seconds):
+                    logging.error(f"Run lock '{self.name}' was taken over, stopping the run")
+                    self.lost.set()
+                    return
+                renewed_at = time.monotonic()
             except Exception as e:
-                logging.error(f"Failed to save eBay query: {e}")
-        
-        return ebay_price_result
-    except Exception as e:
-        error_msg = str(e)
-        logging.error(f"eBay API error for '{product_name[:50] if product_name else 'unknown'}': {e}")
-        
-        # Save error to database
-        if log_id and supabase:
+                logging.warning(f"Run lock heartbeat failed: {e}")
+                if time.monotonic() - renewed_at >= self.lease_seconds:
+                    logging.error(f"Run lock '{self.name}' expired without heartbeat, stopping the run")
+                    self.lost.set()
+                    return
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        if self._held and not self.lost.is_set():
             try:
-                query_entry = {
-                    "log_id": log_id,
-                    "source": source or "",
-                    "product_name": product_name[:500] if product_name else "",
-                    "rss_price": float(rss_price) if rss_price else None,
-                    "ebay_price": None,
-                    "ebay_sold_price": None,
-                    "ebay_offer_price": None,
-                    "ebay_median_price": None,
-                    "ebay_items_found": 0,
-                    "ebay_sold_items_found": 0,
-                    "ebay_offer_items_found": 0,
-                    "profit": None,
-                    "query_successful": False,
-                    "error_message": error_msg
-                }
-                supabase.table('ebay_queries').insert(query_entry).execute()
-            except:
-                pass
-        
-        return None
-
-
-def send_email_alert(deal):
-    """Send email alert via Gmail SMTP"""
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = GMAIL_USER
-        msg['To'] = ALERT_EMAIL
-        msg['Subject'] = f"🎯 ArbiBot: Profitabler Deal gefunden! (+{deal['profit']:.2f}€)"
-        
-        body = f"""
-        Neuer profitabler Deal gefunden!
-        
-        Produkt: {deal['product_name']}
-        Quelle: {deal['source']}
-        RSS Preis: {deal['rss_price']:.2f} €
-        eBay Preis (netto): {deal['ebay_price']:.2f} €
-        Gewinn: {deal['profit']:.2f} €
-        
-        Link: {deal['product_url']}
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(GMAIL_USER, GMAIL_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        
-        logging.info(f"Email alert sent for deal: {deal['product_name']}")
-    except Exception as e:
-        logging.error(f"Email sending error: {e}")
+                get_storage().release_run_lock(self.name, self.owner)
+            except Exception as e:
+                logging.warning(f"Could not release run lock '{self.name}', it expires in {self.lease_seconds}s: {e}")
+        self._held = False
+        return False
 
 
-def process_rss_feeds(force_time_window=False):
-    """Main function to process RSS feeds and find arbitrage opportunities"""
-    if not supabase:
-        raise Exception("Supabase not initialized. Check SUPABASE_URL and SUPABASE_KEY.")
+def process_rss_feeds(force_time_window=False, ignore_schedule=False, stop_event=None, run_lock=None):
+    """Main function to process RSS feeds and find arbitrage opportunities
+    Only feeds whose adaptive poll interval has elapsed are processed (ignore_schedule polls all).
+    Products from all feeds are extracted first, then priced on eBay in order of expected profit
+    until EBAY_MAX_QUERIES_PER_RUN or RUN_TIME_BUDGET_SECONDS is used up.
+    A set stop_event (worker shutdown) ends the run early like an exhausted time budget.
+    Raises RunAlreadyActiveError while another run holds the run lock; callers that already entered
+    a RunLock (profiled cron runs, so a rejected run is not profiled) pass it as run_lock"""
+    storage = get_storage()
+    if not storage:
+        raise Exception(f"Storage not initialized ({STORAGE_BACKEND}: {storage_error}). Check STORAGE_BACKEND, SUPABASE_URL and SUPABASE_KEY.")
     
-    if not gemini_model:
+    if not get_gemini_model():
         raise Exception("Gemini not initialized. Check GEMINI_API_KEY.")
     
     current_hour = datetime.now().hour
     
     # Check if within allowed time window (8:00 - 20:00)
-    if not force_time_window and (current_hour < 8 or current_hour >= 20):
+    if not force_time_window and not within_run_window():
         logging.info(f"Skipping cron job - outside time window (current hour: {current_hour})")
         return {"status": "skipped", "message": f"Outside time window (current hour: {current_hour}, allowed: 8:00-20:00)"}
     
+    # Feeds are only selected once the lock is held, so a run that just finished has updated their schedule
+    if run_lock is not None:
+        return _process_due_feeds(storage, ignore_schedule, stop_event, run_lock)
+    with RunLock() as run_lock:
+        return _process_due_feeds(storage, ignore_schedule, stop_event, run_lock)
+
+
+def _process_due_feeds(storage, ignore_schedule, stop_event, run_lock):
+    """Body of process_rss_feeds, runs while the run lock is held"""
+    now = datetime.now(timezone.utc)
+    feeds = [feed for feed in load_feed_registry() if ignore_schedule or feed_is_due(feed, now)]
+    if not feeds:
+        logging.info("Skipping cron job - no feed is due")
+        return {"status": "skipped", "message": "Kein Feed ist fällig", "run_lock": run_lock.state()}
+    
+    run_started = time.monotonic()
+    extraction_metrics(reset=True)
     total_products_found = 0
     total_deals_found = 0
     
-    for source_url in RSS_SOURCES:
+    def time_budget_exhausted():
+        if stop_event is not None and stop_event.is_set():
+            return True
+        if run_lock.lost.is_set():
+            return True
+        return RUN_TIME_BUDGET_SECONDS > 0 and time.monotonic() - run_started >= RUN_TIME_BUDGET_SECONDS
+    
+    # 1. Extract products from all feeds
+    feed_runs = []  # (source_url, log_id, stats)
+    candidates = []
+    for feed in feeds:
+        source_url = feed['url']
+        entry_guids = []
         # Statistics for this feed
-        feed_products = 0
-        gemini_extractions = 0
-        gemini_with_price = 0
-        ebay_queries = 0
-        ebay_found = 0
-        profitable_deals = 0
+        stats = {
+            "feed_products": 0,
+            "gemini_extractions": 0,
+            "extractor_hits": 0,
+            "gemini_with_price": 0,
+            "ebay_queries": 0,
+            "ebay_found": 0,
+            "ebay_skipped": 0,
+            "history_hits": 0,
+            "ebay_hits": 0,
+            "profitable_deals": 0,
+            "profit_sum": 0.0,
+            "profit_max": None,
+            "entries_pending": 0,
+            "error": None
+        }
+        current_log_id = None
         
         try:
             # Create log entry
@@ -843,194 +3863,413 @@ def process_rss_feeds(force_time_window=False):
                 "products_found": 0,
                 "message": "Feed wird verarbeitet..."
             }
-            supabase.table('logs').insert(log_entry).execute()
+            # Log ID for eBay queries tracking
+            current_log_id = storage.create_log(log_entry)
             
-            # Parse RSS feed with better error handling
-            # Try to fix common XML issues before parsing
-            try:
-                feed = feedparser.parse(source_url)
-            except Exception as parse_error:
-                logging.warning(f"Initial feed parse failed for {source_url}: {parse_error}")
-                # Try downloading and fixing common issues
-                try:
-                    import requests
-                    feed_response = requests.get(source_url, timeout=10)
-                    if feed_response.status_code == 200:
-                        # Fix double-encoded HTML entities (e.g., &amp;amp; -> &amp;)
-                        feed_content = feed_response.text
-                        feed_content = feed_content.replace('&amp;amp;', '&amp;')
-                        feed_content = feed_content.replace('&amp;lt;', '&lt;')
-                        feed_content = feed_content.replace('&amp;gt;', '&gt;')
-                        feed_content = feed_content.replace('&amp;quot;', '&quot;')
-                        feed_content = feed_content.replace('&amp;apos;', '&apos;')
-                        # Parse the fixed content
-                        feed = feedparser.parse(feed_content)
-                    else:
-                        raise Exception(f"Failed to download feed: HTTP {feed_response.status_code}")
-                except Exception as download_error:
-                    logging.error(f"Failed to download and fix feed {source_url}: {download_error}")
-                    raise Exception(f"Feed parsing error: {parse_error}")
+            # Only the max_entries best-scored entries are extracted to avoid timeout and quota issues
+            # The feed is streamed and only read until ENTRY_SCAN_LIMIT entries have been parsed
+            max_entries = feed.get('max_entries') or int(os.getenv('MAX_ENTRIES_PER_FEED', '10'))  # Limit to avoid timeout and quota
+            items = fetch_feed_entries(source_url, feed_scan_size(feed))
+            entry_guids = [item.guid for item in items]
+            seen_guids = set(feed.get('recent_guids') or [])
+            update_feed_poll_state(feed, entry_guids, now)
+            items, stats["entries_pending"] = select_feed_items(source_url, items, max_entries, now, seen_guids)
+            
+            processed_guids = []
+            candidates.extend(iter_product_candidates(items, source_url, current_log_id, stats, time_budget_exhausted, processed_guids))
+            mark_feed_items_processed(source_url, processed_guids)
+            del items
+            
+            total_products_found += stats["feed_products"]
+            
+            # Progress update for the live dashboard while the eBay phase is pending
+            if current_log_id:
+                storage.update_log(current_log_id, {
+                    "products_found": stats["feed_products"],
+                    "message": f"Extraktion abgeschlossen | Feed-Einträge: {stats['feed_products']} | Mit Preis gefunden: {stats['gemini_with_price']} | Warte auf eBay-Preise..."
+                })
+        except Exception as e:
+            logging.error(f"Error processing feed {source_url}: {e}")
+            stats["error"] = str(e)
+            if not entry_guids:
+                update_feed_poll_state(feed, [], now, failed=True)
+        feed_runs.append((source_url, current_log_id, stats))
+    
+    # 2. Price the most promising candidates first, using the price history where it is fresh enough
+    feed_stats = {source_url: stats for source_url, _, stats in feed_runs}
+    price_histories = lookup_price_histories([c.product_name for c in candidates]) if candidates else {}
+    ranked = rank_ebay_candidates(candidates, load_ebay_price_history(), price_histories) if candidates else []
+    ebay_calls = 0
+    budget_skipped = 0
+    circuit_skipped = 0
+    for candidate in ranked:
+        stats = feed_stats[candidate.source]
+        try:
+            product_name = candidate.product_name
+            rss_price = candidate.rss_price
             
-            # Log warnings but don't fail completely if feed has minor issues
-            if feed.bozo:
-                bozo_msg = str(feed.bozo_exception) if feed.bozo_exception else "Unknown parsing error"
-                logging.warning(f"Feed parsing warning for {source_url}: {bozo_msg}")
-                # Continue processing if we have entries despite the warning
-                if not feed.entries or len(feed.entries) == 0:
-                    raise Exception(f"Feed parsing error: {bozo_msg}")
+            history = usable_price_history(price_histories.get(canonical_product_name(product_name)))
+            if history:
+                ebay_price = float(history["median_price"])
+                stats["history_hits"] += 1
+            elif (EBAY_MAX_QUERIES_PER_RUN > 0 and ebay_calls >= EBAY_MAX_QUERIES_PER_RUN) or time_budget_exhausted():
+                stats["ebay_skipped"] += 1
+                budget_skipped += 1
+                continue
+            elif not price_providers_available():
+                # All price sources are down, don't spend the run waiting for them
+                stats["ebay_skipped"] += 1
+                circuit_skipped += 1
+                continue
+            else:
+                # Get eBay market price (with tracking)
+                ebay_price = get_ebay_market_price(product_name, log_id=candidate.log_id, rss_price=rss_price, source=candidate.source)
+                ebay_calls += 1
+                stats["ebay_queries"] += 1
+            
+            if ebay_price is None or ebay_price <= 0:
+                continue
             
-            feed_products = len(feed.entries)
-            total_products_found += feed_products
+            stats["ebay_found"] += 1
+            if not history:
+                stats["ebay_hits"] += 1
             
-            # Get log ID for eBay queries tracking
-            latest_log = supabase.table('logs').select('id').eq('source', source_url).order('timestamp', desc=True).limit(1).execute()
-            current_log_id = latest_log.data[0]['id'] if latest_log.data else None
+            # Calculate profit
+            profit = ebay_price - rss_price
             
-            # Process each entry with rate limiting (limit to first 10 to avoid timeout and quota issues)
-            max_entries = int(os.getenv('MAX_ENTRIES_PER_FEED', '10'))  # Limit to avoid timeout and quota
-            for idx, entry in enumerate(feed.entries[:max_entries]):
+            # Check if profit > PROFIT_THRESHOLD (15€)
+            if profit > PROFIT_THRESHOLD:
+                deal = Deal(
+                    source=candidate.source,
+                    product_name=product_name,
+                    product_url=candidate.entry_link,
+                    rss_price=float(rss_price),
+                    ebay_price=float(ebay_price),
+                    profit=float(profit),
+                    ebay_fees=float(ebay_price * 0.10),
+                    rss_item_title=candidate.entry_title,
+                    rss_item_link=candidate.entry_link
+                )
+                
+                # Save to database
+                storage.insert_deal(deal.to_row())
+                stats["profitable_deals"] += 1
+                stats["profit_sum"] += deal.profit
+                stats["profit_max"] = max(stats["profit_max"] or deal.profit, deal.profit)
+                total_deals_found += 1
+                
+                # Send email alert
                 try:
-                    # Rate limiting: wait between Gemini API calls to avoid quota issues
-                    # Free tier gemini-2.0-flash-lite: 30 RPM = 1 request every 2 seconds
-                    if idx > 0:
-                        wait_time = int(os.getenv('GEMINI_RATE_LIMIT_SECONDS', '2'))
-                        time.sleep(wait_time)  # Wait 2 seconds between requests for free tier (30 RPM limit)
-                    
-                    # Extract product info with Gemini (can return multiple products)
-                    products = extract_product_info_with_gemini(
-                        entry.get('title', ''),
-                        entry.get('description', '')
-                    )
-                    gemini_extractions += 1
-                    
-                    # Process each product found by Gemini
-                    for product_name, rss_price in products:
-                        if rss_price <= 0:
-                            continue
-                        
-                        gemini_with_price += 1
-                        
-                        # Get eBay market price (with tracking)
-                        ebay_price = get_ebay_market_price(product_name, log_id=current_log_id, rss_price=rss_price, source=source_url)
-                        ebay_queries += 1
-                        
-                        if ebay_price is None or ebay_price <= 0:
-                            continue
-                        
-                        ebay_found += 1
-                        
-                        # Calculate profit
-                        profit = ebay_price - rss_price
-                        
-                        # Check if profit > 15€
-                        if profit > 15:
-                            deal = {
-                                "source": source_url,
-                                "product_name": product_name,
-                                "product_url": entry.get('link', ''),
-                                "rss_price": float(rss_price),
-                                "ebay_price": float(ebay_price),
-                                "profit": float(profit),
-                                "ebay_fees": float(ebay_price * 0.10),
-                                "rss_item_title": entry.get('title', ''),
-                                "rss_item_link": entry.get('link', '')
-                            }
-                            
-                            # Save to database
-                            supabase.table('deals').insert(deal).execute()
-                            profitable_deals += 1
-                            total_deals_found += 1
-                            
-                            # Send email alert
-                            try:
-                                send_email_alert(deal)
-                            except Exception as email_error:
-                                logging.error(f"Failed to send email alert: {email_error}")
-                        
-                except Exception as e:
-                    logging.error(f"Error processing entry: {e}")
-                    continue
+                    send_email_alert(deal)
+                except Exception as email_error:
+                    logging.error(f"Failed to send email alert: {email_error}")
+        except Exception as e:
+            logging.error(f"Error processing product '{candidate.product_name[:50]}': {e}")
+            continue
+    
+    if budget_skipped:
+        logging.info(f"eBay budget exhausted, skipped {budget_skipped} lower-ranked candidates")
+    if circuit_skipped:
+        logging.warning(f"Circuit breakers of all price providers open, skipped {circuit_skipped} candidates")
+    
+    # 3. Update log entries
+    for source_url, log_id, stats in feed_runs:
+        if log_id is None:
+            continue
+        try:
+            if stats["error"]:
+                storage.update_log(log_id, {
+                    "status": "Error",
+                    "products_found": stats["feed_products"],
+                    "message": f"Fehler: {stats['error']} | Feed-Einträge: {stats['feed_products']}"
+                })
+                continue
             
             # Create detailed message
             message_parts = [
-                f"Feed-Einträge: {feed_products}",
-                f"Gemini-Extraktionen: {gemini_extractions}",
-                f"Mit Preis gefunden: {gemini_with_price}",
-                f"eBay-Abfragen: {ebay_queries}",
-                f"eBay-Preise gefunden: {ebay_found}",
-                f"Profitabel (>15€): {profitable_deals}"
+                f"Feed-Einträge: {stats['feed_products']}",
+                f"Gemini-Extraktionen: {stats['gemini_extractions']}",
+                f"Mit Preis gefunden: {stats['gemini_with_price']}",
+                f"eBay-Abfragen: {stats['ebay_queries']}",
+                f"eBay-Preise gefunden: {stats['ebay_found']}",
+                f"Profitabel (>{PROFIT_THRESHOLD:g}€): {stats['profitable_deals']}"
             ]
-            detailed_message = " | ".join(message_parts)
-            
-            # Update log entry (get latest log ID first)
-            latest_log = supabase.table('logs').select('id').eq('source', source_url).order('timestamp', desc=True).limit(1).execute()
-            if latest_log.data:
-                log_id = latest_log.data[0]['id']
-                supabase.table('logs').update({
-                    "status": "Success",
-                    "products_found": feed_products,
-                    "message": detailed_message
-                }).eq('id', log_id).execute()
-            
+            if stats["history_hits"]:
+                message_parts.append(f"Preis-Historie genutzt: {stats['history_hits']}")
+            if stats["ebay_skipped"]:
+                message_parts.append(f"eBay übersprungen (Budget/Ausfall): {stats['ebay_skipped']}")
+            if stats["extractor_hits"]:
+                message_parts.append(f"Ohne Gemini (Quell-Extraktor): {stats['extractor_hits']} ({extractor_bypass_rate(stats):.0%})")
+            if stats["entries_pending"]:
+                message_parts.append(f"Einträge im Rückstand: {stats['entries_pending']}")
+            storage.update_log(log_id, {
+                "status": "Success",
+                "products_found": stats["feed_products"],
+                "message": " | ".join(message_parts)
+            })
         except Exception as e:
-            logging.error(f"Error processing feed {source_url}: {e}")
-            # Update log entry with error (get latest log ID first)
-            latest_log = supabase.table('logs').select('id').eq('source', source_url).order('timestamp', desc=True).limit(1).execute()
-            if latest_log.data:
-                log_id = latest_log.data[0]['id']
-                error_message = f"Fehler: {str(e)} | Feed-Einträge: {feed_products}"
-                supabase.table('logs').update({
-                    "status": "Error",
-                    "products_found": feed_products,
-                    "message": error_message
-                }).eq('id', log_id).execute()
+            logging.error(f"Failed to update log entry for {source_url}: {e}")
+    
+    # Dashboard analytics read only from the daily rollup
+    record_daily_stats(feed_runs)
+    
+    # Keep hot tables small
+    retention = run_retention_job()
     
     return {
         "status": "success",
         "products_found": total_products_found,
-        "deals_found": total_deals_found
+        "deals_found": total_deals_found,
+        "gemini_tiers": extraction_metrics(),
+        "source_extractors": {
+            source_url: {"bypassed": stats["extractor_hits"], "gemini": stats["gemini_extractions"], "bypass_rate": extractor_bypass_rate(stats)}
+            for source_url, _, stats in feed_runs
+        },
+        "retention": retention,
+        "run_lock": run_lock.state()
     }
 
 
+def _frame_label(code):
+    """Frame name used in collapsed stacks: file:function"""
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """Sampling profiler: a background thread records the stack of one thread every interval
+    and aggregates them as collapsed stacks ("outer;inner;leaf count", flamegraph.pl format)"""
+    
+    def __init__(self, thread_id, interval_seconds):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks = {}
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+    
+    def _run(self):
+        import sys
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and len(labels) < PROFILE_MAX_STACK_DEPTH:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                stack = ';'.join(reversed(labels))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.sample_count += 1
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def collapsed(self):
+        return '\n'.join(f"{stack} {count}" for stack, count in sorted(self.stacks.items()))
+    
+    def report(self, limit=30):
+        """Top frames by self samples (leaf of the stack)"""
+        leaves = {}
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(';', 1)[-1]
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        total = self.sample_count or 1
+        lines = [f"{count:>7} {100.0 * count / total:5.1f}%  {leaf}" for leaf, count in sorted(leaves.items(), key=lambda item: -item[1])[:limit]]
+        return f"{self.sample_count} Samples à {self.interval_seconds * 1000:g} ms\n\n  self  share  frame\n" + '\n'.join(lines)
+
+
+def _cprofile_collapsed(stats):
+    """Caller;callee pairs from pstats weighted by the callee's own time in microseconds
+    (cProfile keeps no full stacks, so the flamegraph is two levels deep)"""
+    lines = []
+    for (filename, _, function), (_, _, tottime, _, callers) in stats.stats.items():
+        callee = f"{os.path.basename(filename)}:{function}"
+        total_calls = sum(caller_stats[0] for caller_stats in callers.values()) or 1
+        if not callers:
+            weight = int(tottime * 1_000_000)
+            if weight:
+                lines.append(f"{callee} {weight}")
+            continue
+        for (caller_file, _, caller_function), caller_stats in callers.items():
+            # Split the callee's own time by the share of calls from each caller
+            weight = int(tottime * 1_000_000 * caller_stats[0] / total_calls)
+            if weight:
+                lines.append(f"{os.path.basename(caller_file)}:{caller_function};{callee} {weight}")
+    return '\n'.join(sorted(lines))
+
+
+def save_profile(profile_row):
+    """Store a profile in the storage backend, returns its id (None if storage is unavailable)"""
+    storage = get_storage()
+    if not storage:
+        logging.error("Storage not initialized, profile not saved")
+        return None
+    try:
+        return storage.insert_profile(profile_row)
+    except Exception as e:
+        logging.error(f"Failed to save profile: {e}")
+        return None
+
+
+def run_profiled(mode, function, *args, **kwargs):
+    """Run function under the sampling ('sample') or deterministic ('cprofile') profiler and store
+    collapsed stacks plus a text report in the profiles table (also when function raises)
+    Returns (result, profile_id)"""
+    started = time.monotonic()
+    run_status = 'error'
+    if mode == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL_MS / 1000.0)
+        sampler.start()
+    
+    profile_id = None
+    try:
+        result = function(*args, **kwargs)
+        run_status = result.get('status') if isinstance(result, dict) else 'success'
+    finally:
+        if mode == 'cprofile':
+            import io
+            import pstats
+            profiler.disable()
+            report = io.StringIO()
+            stats = pstats.Stats(profiler, stream=report)
+            stats.sort_stats('cumulative').print_stats(40)
+            sample_count = int(stats.total_calls)
+            collapsed = _cprofile_collapsed(stats)
+            report = report.getvalue()
+        else:
+            sampler.stop()
+            sample_count = sampler.sample_count
+            collapsed = sampler.collapsed()
+            report = sampler.report()
+        profile_id = save_profile({
+            "mode": mode,
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "sample_count": sample_count,
+            "run_status": run_status,
+            "collapsed_stacks": collapsed,
+            "report": report
+        })
+        logging.info(f"Profile {profile_id} ({mode}) saved: {sample_count} samples/calls")
+    return result, profile_id
+
+
+def format_timestamp(value):
+    """Format an ISO timestamp from Supabase for display"""
+    if not value:
+        return value
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return dt.strftime('%Y-%m-%d %H:%M:%S')
+    except (AttributeError, ValueError):
+        return value
+
+
+def _stream_cursor(log_cursor, deal_cursor):
+    """Encode the live stream position (last log updated_at, last deal id) as an SSE event id"""
+    return f"{log_cursor}|{deal_cursor}"
+
+
+def _sse_event(event, data, event_id=None):
+    """Format a Server-Sent Event"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
 @app.route('/')
 @requires_auth
 def dashboard():
     """Dashboard route with Live Logs and Winners views"""
     try:
-        if not supabase:
-            return "Error: Supabase not initialized. Check SUPABASE_URL and SUPABASE_KEY.", 500
+        storage = get_storage()
+        if not storage:
+            return f"Error: Storage not initialized ({STORAGE_BACKEND}: {storage_error}). Check STORAGE_BACKEND, SUPABASE_URL and SUPABASE_KEY.", 500
         
         # Get logs (last 100 entries)
-        logs_response = supabase.table('logs').select('*').order('timestamp', desc=True).limit(100).execute()
-        logs = logs_response.data if hasattr(logs_response, 'data') and logs_response.data else []
-        
-        # Format timestamp for display
-        for log in logs:
-            if log.get('timestamp'):
-                try:
-                    dt = datetime.fromisoformat(log['timestamp'].replace('Z', '+00:00'))
-                    log['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
+        logs = storage.recent_logs(100)
         
         # Get deals (last 100 entries)
-        deals_response = supabase.table('deals').select('*').order('timestamp', desc=True).limit(100).execute()
-        deals = deals_response.data if hasattr(deals_response, 'data') and deals_response.data else []
+        deals = storage.recent_deals(100)
+        
+        # The live stream continues from the newest rows rendered here
+        log_cursor = max((log['updated_at'] for log in logs if log.get('updated_at')), default=None)
+        deal_cursor = max((deal['id'] for deal in deals if deal.get('id')), default=0)
+        stream_cursor = _stream_cursor(log_cursor or datetime.now(timezone.utc).isoformat(), deal_cursor)
         
         # Format timestamp for display
-        for deal in deals:
-            if deal.get('timestamp'):
-                try:
-                    dt = datetime.fromisoformat(deal['timestamp'].replace('Z', '+00:00'))
-                    deal['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
+        for row in logs + deals:
+            row['timestamp'] = format_timestamp(row.get('timestamp'))
         
-        return render_template_string(DASHBOARD_TEMPLATE, logs=logs, deals=deals)
+        return render_template_string(DASHBOARD_TEMPLATE, logs=logs, deals=deals, stream_cursor=stream_cursor,
+                                      search_min_chars=SEARCH_MIN_QUERY_CHARS)
     except Exception as e:
         return f"Error loading dashboard: {str(e)}", 500
 
 
+@app.route('/api/stream', methods=['GET'])
+@requires_auth
+def stream_events():
+    """Server-Sent Events stream of new/updated logs and new deals for the dashboard
+    Resumes from ?cursor= or the Last-Event-ID header; the stream ends after SSE_MAX_STREAM_SECONDS
+    and the browser reconnects automatically"""
+    storage = get_storage()
+    if not storage:
+        return {"error": "Storage not initialized"}, 500
+    
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor', '')
+    log_cursor, _, deal_cursor = cursor.partition('|')
+    log_cursor = log_cursor or datetime.now(timezone.utc).isoformat()
+    try:
+        deal_cursor = int(deal_cursor)
+    except ValueError:
+        deal_cursor = storage.latest_deal_id()
+    
+    def generate(log_cursor, deal_cursor):
+        yield f"retry: {int(SSE_POLL_SECONDS * 1000) + 1000}\n\n"
+        started = time.monotonic()
+        last_sent = started
+        while time.monotonic() - started < SSE_MAX_STREAM_SECONDS:
+            try:
+                logs = storage.logs_updated_since(log_cursor)
+                for log in logs:
+                    log_cursor = log['updated_at']
+                    log['timestamp'] = format_timestamp(log.get('timestamp'))
+                    yield _sse_event('log', log, _stream_cursor(log_cursor, deal_cursor))
+                
+                deals = storage.deals_after(deal_cursor)
+                for deal in deals:
+                    deal_cursor = deal['id']
+                    deal['timestamp'] = format_timestamp(deal.get('timestamp'))
+                    yield _sse_event('deal', deal, _stream_cursor(log_cursor, deal_cursor))
+                
+                if logs or deals:
+                    last_sent = time.monotonic()
+            except Exception as e:
+                logging.error(f"Live stream query failed: {e}")
+                yield _sse_event('stream-error', {"message": str(e)})
+            
+            if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(SSE_POLL_SECONDS)
+    
+    return Response(
+        stream_with_context(generate(log_cursor, deal_cursor)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/cron', methods=['GET', 'POST'])
 def cron_job():
     """Cron job endpoint - can be called by external cron services"""
@@ -1046,17 +4285,41 @@ def cron_job():
         # Allow manual override of time window with ?force=true parameter
         force_run = request.args.get('force', '').lower() == 'true'
         
+        # Optional profiling with ?profile=sample or ?profile=cprofile
+        profile_mode = request.args.get('profile', '').lower()
+        if profile_mode and profile_mode not in PROFILE_MODES:
+            return {
+                "status": "error",
+                "message": f"Unknown profile mode '{profile_mode}' (allowed: {', '.join(PROFILE_MODES)})"
+            }, 400
+        
+        run_kwargs = {}
         if force_run:
-            # Override time window check for manual testing
-            logging.info("Manual cron execution forced (time window check bypassed)")
-            result = process_rss_feeds(force_time_window=True)
-        else:
-            result = process_rss_feeds()
+            # Override time window and feed schedule checks for manual testing
+            logging.info("Manual cron execution forced (time window and feed schedule bypassed)")
+            run_kwargs = {"force_time_window": True, "ignore_schedule": True}
+        
+        if profile_mode:
+            # Take the lock before the profiler starts, a rejected run must not store a profile
+            with RunLock() as run_lock:
+                result, profile_id = run_profiled(profile_mode, process_rss_feeds, run_lock=run_lock, **run_kwargs)
+            return {
+                "status": "success",
+                "result": result,
+                "profile_id": profile_id
+            }, 200
         
+        result = process_rss_feeds(**run_kwargs)
         return {
             "status": "success",
             "result": result
         }, 200
+    except RunAlreadyActiveError as e:
+        logging.info(f"Cron job skipped: {e}")
+        return {
+            "status": "already_running",
+            "message": "Ein Lauf ist bereits aktiv"
+        }, 409
     except Exception as e:
         logging.error(f"Cron job error: {e}")
         return {
@@ -1065,10 +4328,114 @@ def cron_job():
         }, 500
 
 
+@app.route('/api/stats', methods=['GET'])
+@requires_auth
+def get_stats():
+    """Deals, eBay hit rate and profit per source and day, read only from the stats_daily rollup"""
+    storage = get_storage()
+    if not storage:
+        return {"error": "Storage not initialized"}, 500
+    try:
+        days = max(1, min(int(request.args.get('days', STATS_DEFAULT_DAYS)), 366))
+    except ValueError:
+        return {"error": "days must be a number"}, 400
+    since_day = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+    try:
+        rows = storage.daily_stats(since_day)
+    except Exception as e:
+        logging.error(f"Error loading daily stats: {e}")
+        return {"error": str(e)}, 500
+    return dict(summarize_daily_stats(rows), days=days, since=since_day, daily=rows), 200
+
+
+@app.route('/api/search', methods=['GET'])
+@requires_auth
+def get_search_results():
+    """Ranked, paginated product search over deals and the eBay query history (?q=...&page=1&per_page=20)"""
+    storage = get_storage()
+    if not storage:
+        return {"error": "Storage not initialized"}, 500
+    query = ' '.join(request.args.get('q', '').split())
+    if len(query) < SEARCH_MIN_QUERY_CHARS:
+        return {"error": f"q must have at least {SEARCH_MIN_QUERY_CHARS} characters"}, 400
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = max(1, min(int(request.args.get('per_page', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE))
+    except ValueError:
+        return {"error": "page and per_page must be numbers"}, 400
+    try:
+        # One extra row tells whether there is a next page without counting all matches
+        rows = storage.search_products(query, per_page + 1, (page - 1) * per_page)
+    except Exception as e:
+        logging.error(f"Error searching products: {e}")
+        return {"error": str(e)}, 500
+    return {
+        "query": query,
+        "page": page,
+        "per_page": per_page,
+        "has_more": len(rows) > per_page,
+        "results": rows[:per_page]
+    }, 200
+
+
+@app.route('/api/profiles', methods=['GET'])
+@requires_auth
+def list_profiles():
+    """List stored run profiles (without stacks)"""
+    storage = get_storage()
+    if not storage:
+        return {"error": "Storage not initialized"}, 500
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        profiles = storage.recent_profiles(limit)
+    except Exception as e:
+        logging.error(f"Error loading profiles: {e}")
+        return {"error": str(e)}, 500
+    return {"profiles": profiles, "count": len(profiles)}, 200
+
+
+@app.route('/api/profiles/<int:profile_id>', methods=['GET'])
+@requires_auth
+def download_profile(profile_id):
+    """Download a profile: collapsed stacks for flamegraph.pl/speedscope (default) or ?format=report"""
+    storage = get_storage()
+    if not storage:
+        return {"error": "Storage not initialized"}, 500
+    try:
+        profile = storage.get_profile(profile_id)
+    except Exception as e:
+        logging.error(f"Error loading profile {profile_id}: {e}")
+        return {"error": str(e)}, 500
+    if not profile:
+        return {"error": "Profile not found"}, 404
+    
+    output_format = request.args.get('format', 'collapsed')
+    if output_format == 'json':
+        return profile, 200
+    if output_format == 'report':
+        body, extension = profile.get('report') or '', 'txt'
+    else:
+        body, extension = profile.get('collapsed_stacks') or '', 'collapsed'
+    return Response(
+        body,
+        mimetype='text/plain',
+        headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}-{profile.get("mode")}.{extension}'}
+    )
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check endpoint"""
-    return {"status": "ok"}, 200
+    """Health check endpoint with the state of the circuit breakers"""
+    circuits = {name: breaker.snapshot() for name, breaker in CIRCUIT_BREAKERS.items()}
+    degraded = any(circuit["state"] != 'closed' for circuit in circuits.values())
+    return {"status": "degraded" if degraded else "ok", "circuits": circuits}, 200
+
+
+@app.route('/api/circuits', methods=['GET'])
+@requires_auth
+def get_circuits():
+    """Circuit breaker state including the text of the last error"""
+    return {"circuits": {name: breaker.snapshot(include_error_text=True) for name, breaker in CIRCUIT_BREAKERS.items()}}, 200
 
 
 @app.route('/api/ebay-queries/<int:log_id>', methods=['GET'])
@@ -1076,12 +4443,12 @@ def health():
 def get_ebay_queries(log_id):
     """Get eBay queries for a specific log entry"""
     try:
-        if not supabase:
-            return {"error": "Supabase not initialized"}, 500
+        storage = get_storage()
+        if not storage:
+            return {"error": "Storage not initialized"}, 500
         
         try:
-            queries_response = supabase.table('ebay_queries').select('*').eq('log_id', log_id).order('timestamp', desc=True).execute()
-            queries = queries_response.data if hasattr(queries_response, 'data') and queries_response.data else []
+            queries = storage.ebay_queries_for_log(log_id)
         except Exception as table_error:
             # Table might not exist yet - return empty list
             logging.warning(f"ebay_queries table might not exist: {table_error}")
@@ -1103,18 +4470,58 @@ def get_ebay_queries(log_id):
         }, 500
 
 
+@app.route('/api/feeds', methods=['GET'])
+@requires_auth
+def get_feeds():
+    """List registered feeds with their learned poll intervals"""
+    try:
+        if not get_storage():
+            return {"error": "Storage not initialized"}, 500
+        feeds = load_feed_registry()
+        for feed in feeds:
+            feed.pop('recent_guids', None)
+        return {"feeds": feeds, "count": len(feeds)}, 200
+    except Exception as e:
+        logging.error(f"Error fetching feeds: {e}")
+        return {"error": str(e), "feeds": []}, 500
+
+
+@app.route('/api/price-history', methods=['GET'])
+@requires_auth
+def get_price_history():
+    """Get rolling price aggregates for a product name (?name=...)"""
+    product_name = request.args.get('name', '').strip()
+    if not product_name:
+        return {"error": "Parameter 'name' is required"}, 400
+    
+    history = lookup_price_history(product_name)
+    if history:
+        history.pop('samples', None)
+    return {
+        "product_name": product_name,
+        "canonical_name": canonical_product_name(product_name),
+        "history": history,
+        "usable_without_ebay": usable_price_history(history) is not None
+    }, 200
+
+
 @app.route('/debug', methods=['GET'])
 @requires_auth
 def debug():
     """Debug endpoint to check environment variables (without exposing secrets)"""
     debug_info = {
-        "supabase_initialized": supabase is not None,
-        "supabase_error": supabase_error if 'supabase_error' in globals() else None,
+        "storage_backend": STORAGE_BACKEND,
+        "storage_initialized": get_storage() is not None,
+        "storage_error": storage_error,
+        "supabase_initialized": get_supabase() is not None if STORAGE_BACKEND == 'supabase' else None,
+        "supabase_error": supabase_error,
         "supabase_url_set": bool(SUPABASE_URL),
         "supabase_url_preview": SUPABASE_URL[:20] + "..." if SUPABASE_URL else None,
         "supabase_key_set": bool(SUPABASE_KEY),
         "supabase_key_preview": SUPABASE_KEY[:10] + "..." if SUPABASE_KEY else None,
-        "gemini_initialized": gemini_model is not None,
+        "gemini_initialized": get_gemini_model() is not None,
+        "gemini_tiers": extraction_metrics(),
+        "gemini_error": gemini_error,
         "gemini_key_set": bool(GEMINI_API_KEY),
         "gemini_key_preview": GEMINI_API_KEY[:10] + "..." if GEMINI_API_KEY else None,
         "ebay_app_id_set": bool(EBAY_APP_ID),
@@ -1145,6 +4552,7 @@ def favicon_png():
 def test_gemini():
     """Test endpoint to verify Gemini API is working"""
     try:
+        gemini_model = get_gemini_model()
         if not gemini_model:
             return {
                 "error": "Gemini not initialized",
@@ -1160,7 +4568,7 @@ def test_gemini():
             "status": "success",
             "gemini_working": True,
             "test_response": response.text[:200],
-            "gemini_model": GEMINI_MODEL_NAME if 'GEMINI_MODEL_NAME' in globals() else "gemini-2.0-flash-lite"
+            "gemini_model": GEMINI_MODEL_NAME
         }, 200
     except Exception as e:
         return {
@@ -1171,6 +4579,206 @@ def test_gemini():
         }, 500
 
 
+def measure_import_time(module_name='app'):
+    """Import a module in a fresh interpreter with `python -X importtime`
+    Returns (cumulative_ms, heavy modules from LAZY_IMPORTS that were loaded eagerly)"""
+    import subprocess
+    import sys
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"Importing {module_name} failed: {result.stderr.strip().splitlines()[-1:]}")
+    
+    cumulative_us = None
+    loaded = set()
+    # Lines look like: "import time:       512 |       1834 |   flask.app"
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue  # Header line
+        package = parts[2].strip()
+        loaded.add(package)
+        # Top-level imports have exactly one space of indentation
+        if package == module_name and not parts[2].startswith('  '):
+            cumulative_us = cumulative
+    
+    eager = [name for name in LAZY_IMPORTS if name in loaded]
+    return (cumulative_us / 1000.0 if cumulative_us is not None else None), eager
+
+
+@app.cli.command('check-import-time')
+@click.option('--runs', type=click.IntRange(min=1), default=IMPORT_TIME_RUNS, show_default=True,
+              help='Fresh interpreters to measure; the budget applies to the median')
+def check_import_time(runs):
+    """Fail if importing app.py exceeds IMPORT_TIME_BUDGET_MS (median of several runs) or loads heavy modules eagerly"""
+    import statistics
+    timings = []
+    eager = set()
+    for _ in range(runs):
+        run_ms, run_eager = measure_import_time()
+        if run_ms is None:
+            print("Could not find import time for 'app' in -X importtime output")
+            raise SystemExit(1)
+        timings.append(run_ms)
+        eager.update(run_eager)
+    cumulative_ms = statistics.median(timings)
+    eager = sorted(eager)
+    
+    print(f"Import time app.py: {cumulative_ms:.1f} ms median of {runs} runs "
+          f"({min(timings):.1f}-{max(timings):.1f} ms, Budget: {IMPORT_TIME_BUDGET_MS} ms)")
+    failed = False
+    if cumulative_ms > IMPORT_TIME_BUDGET_MS:
+        print("FAIL: import time budget exceeded")
+        failed = True
+    if eager:
+        print(f"FAIL: heavy modules imported at import time: {', '.join(eager)}")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+    print("OK")
+
+
+@dataclass
+class ProfitPolicy(_Record):
+    """Fee/shipping model: net profit = price * (1 - fee_rate) - fixed_fee - shipping_cost - rss_price"""
+    __slots__ = ('name', 'fee_rate', 'fixed_fee', 'shipping_cost', 'threshold')
+    name: str
+    fee_rate: float
+    fixed_fee: float
+    shipping_cost: float
+    threshold: float
+
+
+def score_ebay_query(row, policy, scored_at):
+    """Net profit of one ebay_query_prices row under policy as an ebay_query_scores row, None without prices
+    Same formula as rescore_ebay_queries() in schema.sql"""
+    if not row.get('rss_price') or not (row.get('ebay_price') or row.get('ebay_sold_price')):
+        return None
+    rss_price = float(row['rss_price'])
+    # ebay_price is the price the live profit check used, older rows only have the sold median
+    market_price = float(row.get('ebay_price') or row['ebay_sold_price'])
+    fees = round(market_price * policy.fee_rate + policy.fixed_fee, 2)
+    net_profit = round(market_price - rss_price - fees - policy.shipping_cost, 2)
+    return {
+        "policy": policy.name,
+        "query_id": row['id'],
+        "day": str(row.get('timestamp') or '')[:10] or None,
+        "source": row.get('source'),
+        "rss_price": rss_price,
+        "market_price": market_price,
+        "fees": fees,
+        "shipping_cost": policy.shipping_cost,
+        "gross_profit": round(market_price - rss_price, 2),
+        "net_profit": net_profit,
+        "profitable": net_profit > policy.threshold,
+        "scored_at": scored_at
+    }
+
+
+def rescore_ebay_queries(policy, since=None, page_size=RESCORE_PAGE_SIZE, progress=None):
+    """Score ebay_query_prices (raw and archived queries) under policy into ebay_query_scores
+    Supabase does it in one database call, SQLite page by page. Returns totals for the policy and for the
+    live rule (gross profit > PROFIT_THRESHOLD)"""
+    storage = get_storage()
+    if not storage:
+        raise Exception(f"Storage not initialized ({STORAGE_BACKEND}: {storage_error})")
+    return storage.rescore_ebay_queries(policy, PROFIT_THRESHOLD, since, page_size, progress)
+
+
+def close_clients():
+    """Close all shared clients so a worker can exit cleanly"""
+    global _http_client, _http_session, _price_executor
+    close_smtp_connection()
+    with _client_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+        if _price_executor is not None:
+            _price_executor.shutdown(wait=False)
+            _price_executor = None
+        if _storage is not None:
+            _storage.close()
+
+
+def run_worker(stop_event, interval_minutes=None):
+    """Run process_rss_feeds every interval inside the daily run window until stop_event is set
+    Clients and caches stay warm between ticks; the adaptive feed schedule decides which feeds are polled"""
+    interval_seconds = (interval_minutes or WORKER_INTERVAL_MINUTES) * 60
+    logging.info(f"Worker started (interval: {interval_seconds / 60:g} min, window: {RUN_WINDOW_START_HOUR}:00-{RUN_WINDOW_END_HOUR}:00)")
+    try:
+        while not stop_event.is_set():
+            wait_seconds = seconds_until_run_window()
+            if wait_seconds > 0:
+                logging.info(f"Worker outside run window, sleeping {wait_seconds / 60:.0f} min")
+                stop_event.wait(wait_seconds)
+                continue
+            
+            tick_started = time.monotonic()
+            try:
+                result = process_rss_feeds(stop_event=stop_event)
+                logging.info(f"Worker run finished: {result.get('status')} - {result.get('message', '')}")
+            except RunAlreadyActiveError:
+                logging.info("Another run is active, skipping this tick")
+            except Exception as e:
+                logging.error(f"Worker run failed: {e}")
+            stop_event.wait(max(interval_seconds - (time.monotonic() - tick_started), 0))
+    finally:
+        close_clients()
+        logging.info("Worker stopped")
+
+
+@app.cli.command('worker')
+def worker_command():
+    """Run the bot as a long-running daemon with an internal scheduler (SIGTERM/SIGINT stop it gracefully)"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    stop_event = threading.Event()
+    
+    def request_stop(signum, frame):
+        logging.info(f"Received signal {signum}, finishing current step and shutting down")
+        stop_event.set()
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    run_worker(stop_event)
+
+
+@app.cli.command('rescore')
+@click.option('--policy', 'policy_name', default='default', show_default=True, help='Name the scores are stored under')
+@click.option('--fee-rate', type=float, default=EBAY_FEE_RATE, show_default=True, help='eBay fee as share of the sale price')
+@click.option('--fixed-fee', type=float, default=EBAY_FIXED_FEE, show_default=True, help='Fixed fee per sale in €')
+@click.option('--shipping', type=float, default=SHIPPING_COST, show_default=True, help='Shipping cost per sale in €')
+@click.option('--threshold', type=float, default=PROFIT_THRESHOLD, show_default=True, help='Minimum net profit in €')
+@click.option('--since', default=None, help='Only queries from this ISO date on')
+@click.option('--page-size', type=int, default=RESCORE_PAGE_SIZE, show_default=True, help='Rows per page (SQLite only)')
+def rescore_command(policy_name, fee_rate, fixed_fee, shipping, threshold, since, page_size):
+    """Recompute net profit of historical ebay_queries under a fee/shipping policy into ebay_query_scores"""
+    policy = ProfitPolicy(name=policy_name, fee_rate=fee_rate, fixed_fee=fixed_fee, shipping_cost=shipping, threshold=threshold)
+    started = time.monotonic()
+    
+    def progress(totals):
+        print(f"  {totals['rows']} Abfragen gelesen, {totals['scored']} bewertet", end='\r', flush=True)
+    
+    totals = rescore_ebay_queries(policy, since=since, page_size=page_size, progress=progress)
+    print()
+    print(f"Policy '{policy.name}': Gebühr {policy.fee_rate:.1%} + {policy.fixed_fee:.2f} €, Versand {policy.shipping_cost:.2f} €, Schwelle {policy.threshold:g} €")
+    print(f"Bewertet: {totals['scored']} von {totals['rows']} Abfragen in {time.monotonic() - started:.1f}s")
+    print(f"Profitabel: {totals['profitable']} (Netto-Gewinn gesamt: {totals['profit_sum']:.2f} €)")
+    print(f"Profitabel nach aktueller Regel (Brutto > {PROFIT_THRESHOLD:g} €): {totals['live_rule_profitable']}")
+
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -0,0 +1,24 @@
+-- Migration: Add updated_at to logs for the dashboard live stream (/api/stream)
+-- Run this in Supabase SQL Editor if the table already exists
+
+ALTER TABLE logs
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+-- Existing rows: use their creation time
+UPDATE logs
+SET updated_at = COALESCE(created_at, timestamp)
+WHERE updated_at IS NULL OR updated_at > COALESCE(created_at, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_logs_updated_at ON logs(updated_at);
+
+-- Set updated_at on every update
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_logs_updated_at ON logs;
+CREATE TRIGGER trg_logs_updated_at BEFORE UPDATE ON logs
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
@@ -0,0 +1,10 @@
+-- Migration: Add rss_price_count (weight of avg_rss_price) to ebay_query_daily_summaries
+-- Run this in Supabase SQL Editor if the table already exists, then re-run schema.sql (compact_ebay_queries)
+
+ALTER TABLE ebay_query_daily_summaries
+ADD COLUMN IF NOT EXISTS rss_price_count INTEGER DEFAULT 0;
+
+-- Older summaries only know query_count: a day with an average counts all its queries as priced
+UPDATE ebay_query_daily_summaries
+SET rss_price_count = query_count
+WHERE avg_rss_price IS NOT NULL AND COALESCE(rss_price_count, 0) = 0;
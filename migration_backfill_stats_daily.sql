@@ -0,0 +1,25 @@
+-- Migration: Fill stats_daily from existing history
+-- Run once in Supabase SQL Editor after creating stats_daily and increment_stats_daily() from schema.sql.
+-- Days that already have a stats_daily row are left untouched. Feed entries of past runs are not
+-- recorded anywhere, so runs/entries_seen/products_extracted stay 0 for backfilled days.
+
+INSERT INTO stats_daily (day, source, ebay_queries, ebay_hits, deals, profit_sum, profit_max)
+SELECT day, source, SUM(ebay_queries), SUM(ebay_hits), SUM(deals), SUM(profit_sum), MAX(profit_max)
+FROM (
+    SELECT "timestamp"::date AS day, source, COUNT(*) AS ebay_queries,
+           COUNT(*) FILTER (WHERE ebay_sold_price IS NOT NULL) AS ebay_hits,
+           0 AS deals, 0 AS profit_sum, NULL::DECIMAL AS profit_max
+    FROM ebay_queries
+    GROUP BY 1, 2
+    UNION ALL
+    -- Raw rows already compacted by the retention job (successful_count also counts offer-only hits)
+    SELECT day, source, SUM(query_count), SUM(successful_count), 0, 0, NULL
+    FROM ebay_query_daily_summaries
+    GROUP BY 1, 2
+    UNION ALL
+    SELECT "timestamp"::date, source, 0, 0, COUNT(*), SUM(profit), MAX(profit)
+    FROM deals
+    GROUP BY 1, 2
+) history
+GROUP BY day, source
+ON CONFLICT (day, source) DO NOTHING;
@@ -8,7 +8,8 @@ CREATE TABLE IF NOT EXISTS logs (
     status VARCHAR(50) NOT NULL, -- 'Success', 'Error', 'Processing'
     products_found INTEGER DEFAULT 0,
     message TEXT,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() -- Für den Live-Stream im Dashboard
 );
 
 -- Tabelle für profitable Deals
@@ -58,8 +59,492 @@ CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_logs_status ON logs(status);
 CREATE INDEX IF NOT EXISTS idx_deals_timestamp ON deals(timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_deals_profit ON deals(profit DESC);
+CREATE INDEX IF NOT EXISTS idx_logs_updated_at ON logs(updated_at);
+
+-- updated_at bei jeder Änderung eines Log-Eintrags setzen (Live-Stream)
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_logs_updated_at ON logs;
+CREATE TRIGGER trg_logs_updated_at BEFORE UPDATE ON logs
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
 
 -- Kommentare für Dokumentation
 COMMENT ON TABLE logs IS 'Log-Einträge für Feed-Verarbeitungsaktivitäten';
 COMMENT ON TABLE deals IS 'Gefundene profitable Arbitrage-Deals';
 
+
+-- Preis-Historie pro Produkt (Schlüssel: kanonischer Produktname)
+-- Rollierende Aggregate über PRICE_HISTORY_WINDOW_DAYS, inkrementell bei jeder eBay-Abfrage aktualisiert
+CREATE TABLE IF NOT EXISTS product_price_history (
+    canonical_name TEXT PRIMARY KEY, -- Sortierte, bereinigte Namens-Tokens
+    product_name TEXT NOT NULL, -- Zuletzt gesehene Schreibweise
+    sample_count INTEGER DEFAULT 0,
+    median_price DECIMAL(10, 2),
+    min_price DECIMAL(10, 2),
+    last_price DECIMAL(10, 2),
+    trend_slope DECIMAL(10, 4), -- Preisänderung in € pro Tag (lineare Regression)
+    samples JSONB DEFAULT '[]'::jsonb, -- [[unix_timestamp, preis], ...] innerhalb des Fensters
+    first_seen TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    last_seen TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_price_history_last_seen ON product_price_history(last_seen DESC);
+
+COMMENT ON TABLE product_price_history IS 'Rollierende eBay-Verkaufspreis-Aggregate pro Produkt';
+
+-- Feed-Registry mit adaptiven Abrufintervallen
+CREATE TABLE IF NOT EXISTS feeds (
+    id SERIAL PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    name VARCHAR(255),
+    enabled BOOLEAN DEFAULT true,
+    max_entries INTEGER, -- NULL = MAX_ENTRIES_PER_FEED
+    poll_interval_minutes INTEGER DEFAULT 120, -- Gelerntes Abrufintervall
+    min_poll_interval_minutes INTEGER, -- NULL = FEED_MIN_POLL_MINUTES
+    max_poll_interval_minutes INTEGER, -- NULL = FEED_MAX_POLL_MINUTES
+    new_entries_per_hour DECIMAL(10, 3), -- Geglättete Rate neuer Einträge
+    recent_guids JSONB DEFAULT '[]'::jsonb, -- Zuletzt gesehene Einträge zur Erkennung neuer Einträge
+    last_polled_at TIMESTAMP WITH TIME ZONE,
+    next_poll_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_feeds_next_poll_at ON feeds(next_poll_at) WHERE enabled;
+
+INSERT INTO feeds (url, name) VALUES
+    ('https://www.mydealz.de/rss/alles', 'mydealz'),
+    ('https://www.dealdoktor.de/feed/', 'DealDoktor'),
+    ('https://schnaeppchenfuchs.com/rss', 'Schnäppchenfuchs')
+ON CONFLICT (url) DO NOTHING;
+
+COMMENT ON TABLE feeds IS 'RSS-Feeds mit Einstellungen und adaptivem Abrufintervall';
+
+-- Gelesene Feed-Einträge; noch nicht extrahierte (pending) werden im nächsten Lauf erneut bewertet
+CREATE TABLE IF NOT EXISTS feed_entries (
+    feed_url TEXT NOT NULL,
+    guid TEXT NOT NULL,
+    title TEXT,
+    description TEXT, -- Klartext, gekürzt auf GEMINI_DESCRIPTION_CHARS
+    link TEXT,
+    published_at TIMESTAMP WITH TIME ZONE,
+    categories JSONB DEFAULT '[]'::jsonb,
+    temperature DECIMAL(10, 2), -- mydealz-Temperatur in Grad
+    merchant_price TEXT, -- Preis aus pepper:merchant (mydealz)
+    status VARCHAR(20) NOT NULL DEFAULT 'pending', -- pending | processed
+    first_seen_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    processed_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (feed_url, guid)
+);
+
+CREATE INDEX IF NOT EXISTS idx_feed_entries_pending ON feed_entries(feed_url, status, first_seen_at DESC);
+
+COMMENT ON TABLE feed_entries IS 'Rückstand gelesener Feed-Einträge für die Auswahl pro Lauf';
+
+-- Retention: Tägliche Zusammenfassungen kompaktierter eBay-Abfragen
+-- Rohzeilen älter als das Aufbewahrungsfenster werden pro Produkt und Tag zusammengefasst und danach gelöscht
+CREATE TABLE IF NOT EXISTS ebay_query_daily_summaries (
+    day DATE NOT NULL,
+    source VARCHAR(255) NOT NULL,
+    product_name TEXT NOT NULL,
+    query_count INTEGER DEFAULT 0,
+    successful_count INTEGER DEFAULT 0,
+    avg_rss_price DECIMAL(10, 2),
+    rss_price_count INTEGER DEFAULT 0, -- Abfragen mit RSS-Preis (Gewicht von avg_rss_price)
+    min_sold_price DECIMAL(10, 2),
+    median_sold_price DECIMAL(10, 2),
+    max_sold_price DECIMAL(10, 2),
+    min_offer_price DECIMAL(10, 2),
+    max_profit DECIMAL(10, 2),
+    PRIMARY KEY (day, source, product_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ebay_query_daily_summaries_day ON ebay_query_daily_summaries(day DESC);
+
+-- Schlankes Archiv kompaktierter eBay-Abfragen: nur die Preise, die `rescore` pro Abfrage braucht
+CREATE TABLE IF NOT EXISTS ebay_query_archive (
+    id INTEGER PRIMARY KEY, -- id der ursprünglichen ebay_queries-Zeile
+    "timestamp" TIMESTAMP WITH TIME ZONE NOT NULL,
+    source VARCHAR(255),
+    rss_price DECIMAL(10, 2),
+    ebay_price DECIMAL(10, 2),
+    ebay_sold_price DECIMAL(10, 2)
+);
+
+-- Rohe und archivierte Preise zusammen, Grundlage für `rescore`
+CREATE OR REPLACE VIEW ebay_query_prices AS
+    SELECT id, "timestamp", source, rss_price, ebay_price, ebay_sold_price FROM ebay_queries
+    UNION ALL
+    SELECT id, "timestamp", source, rss_price, ebay_price, ebay_sold_price FROM ebay_query_archive;
+
+COMMENT ON TABLE ebay_query_archive IS 'Preise kompaktierter eBay-Abfragen für die Neubewertung';
+
+-- Kompaktiert eBay-Abfragen älter als p_retention_days Tage; gibt die Anzahl gelöschter Rohzeilen zurück
+CREATE OR REPLACE FUNCTION compact_ebay_queries(p_retention_days INTEGER DEFAULT 30) RETURNS INTEGER AS $$
+DECLARE
+    cutoff TIMESTAMP WITH TIME ZONE := date_trunc('day', NOW() - make_interval(days => p_retention_days));
+    deleted INTEGER;
+BEGIN
+    INSERT INTO ebay_query_daily_summaries AS s (
+        day, source, product_name, query_count, successful_count, avg_rss_price, rss_price_count,
+        min_sold_price, median_sold_price, max_sold_price, min_offer_price, max_profit
+    )
+    SELECT
+        "timestamp"::date,
+        source,
+        product_name,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE query_successful),
+        AVG(rss_price),
+        COUNT(rss_price),
+        MIN(ebay_sold_price),
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY ebay_sold_price),
+        MAX(ebay_sold_price),
+        MIN(ebay_offer_price),
+        MAX(profit)
+    FROM ebay_queries
+    WHERE "timestamp" < cutoff
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, source, product_name) DO UPDATE SET
+        -- Late rows for an already compacted day: medians are merged as a count-weighted mean,
+        -- the RSS average only over rows that had a price (a missing average does not count as 0 €)
+        avg_rss_price = COALESCE(
+            (COALESCE(s.avg_rss_price * s.rss_price_count, 0) + COALESCE(EXCLUDED.avg_rss_price * EXCLUDED.rss_price_count, 0))
+                / NULLIF(CASE WHEN s.avg_rss_price IS NULL THEN 0 ELSE s.rss_price_count END
+                         + CASE WHEN EXCLUDED.avg_rss_price IS NULL THEN 0 ELSE EXCLUDED.rss_price_count END, 0),
+            s.avg_rss_price, EXCLUDED.avg_rss_price),
+        rss_price_count = s.rss_price_count + EXCLUDED.rss_price_count,
+        median_sold_price = COALESCE(
+            (s.median_sold_price * s.successful_count + EXCLUDED.median_sold_price * EXCLUDED.successful_count)
+                / NULLIF(s.successful_count + EXCLUDED.successful_count, 0),
+            s.median_sold_price, EXCLUDED.median_sold_price),
+        query_count = s.query_count + EXCLUDED.query_count,
+        successful_count = s.successful_count + EXCLUDED.successful_count,
+        min_sold_price = LEAST(s.min_sold_price, EXCLUDED.min_sold_price),
+        max_sold_price = GREATEST(s.max_sold_price, EXCLUDED.max_sold_price),
+        min_offer_price = LEAST(s.min_offer_price, EXCLUDED.min_offer_price),
+        max_profit = GREATEST(s.max_profit, EXCLUDED.max_profit);
+
+    -- Preise für `rescore` bleiben pro Abfrage erhalten
+    INSERT INTO ebay_query_archive (id, "timestamp", source, rss_price, ebay_price, ebay_sold_price)
+    SELECT id, "timestamp", source, rss_price, ebay_price, ebay_sold_price
+    FROM ebay_queries
+    WHERE "timestamp" < cutoff AND rss_price IS NOT NULL AND (ebay_price IS NOT NULL OR ebay_sold_price IS NOT NULL)
+    ON CONFLICT (id) DO NOTHING;
+
+    DELETE FROM ebay_queries WHERE "timestamp" < cutoff;
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retention-Job: kompaktiert eBay-Abfragen und löscht alte Log-Einträge
+-- Wird am Ende jedes Cron-Laufs aufgerufen; alternativ per pg_cron:
+-- SELECT cron.schedule('arbibot-retention', '30 3 * * *', $$SELECT run_retention(30, 30)$$);
+CREATE OR REPLACE FUNCTION run_retention(p_query_retention_days INTEGER DEFAULT 30, p_log_retention_days INTEGER DEFAULT 30) RETURNS JSON AS $$
+DECLARE
+    queries_compacted INTEGER;
+    logs_deleted INTEGER;
+BEGIN
+    queries_compacted := compact_ebay_queries(p_query_retention_days);
+    DELETE FROM logs WHERE "timestamp" < NOW() - make_interval(days => p_log_retention_days);
+    GET DIAGNOSTICS logs_deleted = ROW_COUNT;
+    RETURN json_build_object('ebay_queries_compacted', queries_compacted, 'logs_deleted', logs_deleted);
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON TABLE ebay_query_daily_summaries IS 'Tägliche Zusammenfassung kompaktierter eBay-Abfragen';
+
+-- Tägliche Statistik pro Quelle, wird am Ende jedes Laufs inkrementell fortgeschrieben
+-- Dashboard-Auswertungen (/api/stats) lesen nur diese Tabelle statt deals/ebay_queries
+CREATE TABLE IF NOT EXISTS stats_daily (
+    day DATE NOT NULL,
+    source VARCHAR(255) NOT NULL,
+    runs INTEGER DEFAULT 0,
+    feed_errors INTEGER DEFAULT 0,
+    entries_seen INTEGER DEFAULT 0, -- Verarbeitete Feed-Einträge
+    products_extracted INTEGER DEFAULT 0, -- Produkte mit Preis
+    ebay_queries INTEGER DEFAULT 0, -- Live-Abfragen bei eBay
+    ebay_hits INTEGER DEFAULT 0, -- Live-Abfragen mit Verkaufspreis
+    history_hits INTEGER DEFAULT 0, -- Preise aus product_price_history
+    ebay_skipped INTEGER DEFAULT 0,
+    deals INTEGER DEFAULT 0,
+    profit_sum DECIMAL(12, 2) DEFAULT 0,
+    profit_max DECIMAL(10, 2),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (day, source)
+);
+
+-- Addiert die Zähler eines Laufs atomar (profit_max als Maximum)
+CREATE OR REPLACE FUNCTION increment_stats_daily(p_day DATE, p_source TEXT, p_counts JSONB) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO stats_daily AS s (
+        day, source, runs, feed_errors, entries_seen, products_extracted, ebay_queries, ebay_hits,
+        history_hits, ebay_skipped, deals, profit_sum, profit_max, updated_at
+    ) VALUES (
+        p_day,
+        p_source,
+        COALESCE((p_counts->>'runs')::INTEGER, 0),
+        COALESCE((p_counts->>'feed_errors')::INTEGER, 0),
+        COALESCE((p_counts->>'entries_seen')::INTEGER, 0),
+        COALESCE((p_counts->>'products_extracted')::INTEGER, 0),
+        COALESCE((p_counts->>'ebay_queries')::INTEGER, 0),
+        COALESCE((p_counts->>'ebay_hits')::INTEGER, 0),
+        COALESCE((p_counts->>'history_hits')::INTEGER, 0),
+        COALESCE((p_counts->>'ebay_skipped')::INTEGER, 0),
+        COALESCE((p_counts->>'deals')::INTEGER, 0),
+        COALESCE((p_counts->>'profit_sum')::DECIMAL, 0),
+        (p_counts->>'profit_max')::DECIMAL,
+        NOW()
+    )
+    ON CONFLICT (day, source) DO UPDATE SET
+        runs = s.runs + EXCLUDED.runs,
+        feed_errors = s.feed_errors + EXCLUDED.feed_errors,
+        entries_seen = s.entries_seen + EXCLUDED.entries_seen,
+        products_extracted = s.products_extracted + EXCLUDED.products_extracted,
+        ebay_queries = s.ebay_queries + EXCLUDED.ebay_queries,
+        ebay_hits = s.ebay_hits + EXCLUDED.ebay_hits,
+        history_hits = s.history_hits + EXCLUDED.history_hits,
+        ebay_skipped = s.ebay_skipped + EXCLUDED.ebay_skipped,
+        deals = s.deals + EXCLUDED.deals,
+        profit_sum = s.profit_sum + EXCLUDED.profit_sum,
+        profit_max = GREATEST(s.profit_max, EXCLUDED.profit_max),
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON TABLE stats_daily IS 'Tägliche Statistik pro Quelle (inkrementell gepflegt)';
+
+-- Neu bewertete eBay-Abfragen (`flask --app app rescore`): Netto-Gewinn pro Gebühren-/Versand-Policy
+-- Keine Fremdschlüssel, damit Bewertungen die Retention der Rohzeilen überdauern
+CREATE TABLE IF NOT EXISTS ebay_query_scores (
+    policy VARCHAR(100) NOT NULL,
+    query_id INTEGER NOT NULL, -- ebay_queries.id
+    day DATE,
+    source VARCHAR(255),
+    rss_price DECIMAL(10, 2),
+    market_price DECIMAL(10, 2), -- Für die Gewinnprüfung genutzter Preis
+    fees DECIMAL(10, 2),
+    shipping_cost DECIMAL(10, 2),
+    gross_profit DECIMAL(10, 2),
+    net_profit DECIMAL(10, 2),
+    profitable BOOLEAN,
+    scored_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (policy, query_id)
+);
+
+-- Vergleich der Policies
+CREATE OR REPLACE VIEW ebay_query_score_summary AS
+SELECT
+    policy,
+    COUNT(*) AS scored,
+    COUNT(*) FILTER (WHERE profitable) AS profitable,
+    COALESCE(SUM(net_profit) FILTER (WHERE profitable), 0) AS profit_sum,
+    AVG(net_profit) AS avg_net_profit,
+    MIN(day) AS first_day,
+    MAX(day) AS last_day
+FROM ebay_query_scores
+GROUP BY policy;
+
+COMMENT ON TABLE ebay_query_scores IS 'Netto-Gewinn historischer eBay-Abfragen je Gebühren-Policy';
+
+-- Bewertet alle Zeilen aus ebay_query_prices (ab p_since) in einem Schritt unter einer Policy
+-- Gleiche Formel wie score_ebay_query() in app.py; Zeilen ohne RSS- oder Marktpreis werden übersprungen
+CREATE OR REPLACE FUNCTION rescore_ebay_queries(
+    p_policy VARCHAR,
+    p_fee_rate DECIMAL,
+    p_fixed_fee DECIMAL,
+    p_shipping DECIMAL,
+    p_threshold DECIMAL,
+    p_since TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_live_threshold DECIMAL DEFAULT 15
+)
+RETURNS TABLE (
+    row_count BIGINT,
+    scored BIGINT,
+    profitable BIGINT,
+    profit_sum DECIMAL,
+    live_rule_profitable BIGINT
+) AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH candidates AS (
+        SELECT p.id, p."timestamp", p.source, p.rss_price,
+               -- ebay_price ist der Preis der Live-Prüfung, ältere Zeilen haben nur den Verkaufs-Median
+               COALESCE(NULLIF(p.ebay_price, 0), p.ebay_sold_price) AS market_price
+        FROM ebay_query_prices p
+        WHERE p_since IS NULL OR p."timestamp" >= p_since
+    ), priced AS (
+        SELECT c.*, ROUND(c.market_price * p_fee_rate + p_fixed_fee, 2) AS fees
+        FROM candidates c
+        WHERE COALESCE(c.rss_price, 0) <> 0 AND COALESCE(c.market_price, 0) <> 0
+    ), written AS (
+        INSERT INTO ebay_query_scores AS sc (
+            policy, query_id, day, source, rss_price, market_price, fees, shipping_cost,
+            gross_profit, net_profit, profitable, scored_at
+        )
+        SELECT p_policy, pr.id, pr."timestamp"::date, pr.source, pr.rss_price, pr.market_price, pr.fees, p_shipping,
+               ROUND(pr.market_price - pr.rss_price, 2),
+               ROUND(pr.market_price - pr.rss_price - pr.fees - p_shipping, 2),
+               ROUND(pr.market_price - pr.rss_price - pr.fees - p_shipping, 2) > p_threshold,
+               NOW()
+        FROM priced pr
+        ON CONFLICT (policy, query_id) DO UPDATE SET
+            day = EXCLUDED.day,
+            source = EXCLUDED.source,
+            rss_price = EXCLUDED.rss_price,
+            market_price = EXCLUDED.market_price,
+            fees = EXCLUDED.fees,
+            shipping_cost = EXCLUDED.shipping_cost,
+            gross_profit = EXCLUDED.gross_profit,
+            net_profit = EXCLUDED.net_profit,
+            profitable = EXCLUDED.profitable,
+            scored_at = EXCLUDED.scored_at
+        RETURNING sc.gross_profit, sc.net_profit, sc.profitable
+    )
+    SELECT
+        (SELECT COUNT(*) FROM candidates),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE w.profitable),
+        COALESCE(SUM(w.net_profit) FILTER (WHERE w.profitable), 0),
+        COUNT(*) FILTER (WHERE w.gross_profit > p_live_threshold)
+    FROM written w;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Profile von Cron-Läufen (/api/cron?profile=sample|cprofile)
+-- collapsed_stacks im Format von flamegraph.pl ("aussen;innen;blatt anzahl"), direkt in speedscope ladbar
+CREATE TABLE IF NOT EXISTS profiles (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    mode VARCHAR(20) NOT NULL, -- 'sample' oder 'cprofile'
+    duration_seconds DECIMAL(10, 3),
+    sample_count INTEGER, -- Samples (sample) bzw. Funktionsaufrufe (cprofile)
+    run_status VARCHAR(50),
+    collapsed_stacks TEXT,
+    report TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_profiles_created_at ON profiles(created_at DESC);
+
+COMMENT ON TABLE profiles IS 'Profile einzelner Cron-Läufe';
+
+-- Run-Sperre: verhindert überlappende Läufe (Cron, Plattform-Retries, manuelle Aufrufe, Worker)
+-- Advisory Locks gelten nur pro Datenbankverbindung und passen nicht zu PostgREST, daher eine Tabelle mit Lease
+CREATE TABLE IF NOT EXISTS run_locks (
+    name VARCHAR(100) PRIMARY KEY,
+    owner TEXT NOT NULL, -- host:pid:zufall des laufenden Prozesses
+    acquired_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    heartbeat_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL -- Abgelaufene Sperren dürfen übernommen werden
+);
+
+-- Übernimmt die Sperre, wenn sie frei, abgelaufen oder bereits im Besitz von p_owner ist
+CREATE OR REPLACE FUNCTION acquire_run_lock(p_name TEXT, p_owner TEXT, p_lease_seconds INTEGER) RETURNS BOOLEAN AS $$
+BEGIN
+    INSERT INTO run_locks AS l (name, owner, acquired_at, heartbeat_at, expires_at)
+    VALUES (p_name, p_owner, NOW(), NOW(), NOW() + make_interval(secs => p_lease_seconds))
+    ON CONFLICT (name) DO UPDATE SET
+        owner = EXCLUDED.owner,
+        acquired_at = EXCLUDED.acquired_at,
+        heartbeat_at = EXCLUDED.heartbeat_at,
+        expires_at = EXCLUDED.expires_at
+    WHERE l.expires_at < NOW() OR l.owner = p_owner;
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Heartbeat: verlängert die Lease; FALSE, wenn die Sperre inzwischen einem anderen Lauf gehört
+CREATE OR REPLACE FUNCTION renew_run_lock(p_name TEXT, p_owner TEXT, p_lease_seconds INTEGER) RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE run_locks SET heartbeat_at = NOW(), expires_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE name = p_name AND owner = p_owner;
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION release_run_lock(p_name TEXT, p_owner TEXT) RETURNS VOID AS $$
+BEGIN
+    DELETE FROM run_locks WHERE name = p_name AND owner = p_owner;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON TABLE run_locks IS 'Lease-basierte Sperre gegen parallele Läufe';
+
+-- Produktsuche (/api/search) über Deals und eBay-Abfragen inkl. kompaktierter Tage
+-- Trigramm-Indizes beschleunigen ILIKE '%...%' und Wortähnlichkeit (<%) auch bei Millionen Zeilen
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_deals_product_name_trgm ON deals USING GIN (product_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_ebay_queries_product_name_trgm ON ebay_queries USING GIN (product_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_ebay_query_daily_summaries_product_name_trgm ON ebay_query_daily_summaries USING GIN (product_name gin_trgm_ops);
+
+-- Deals einzeln, eBay-Abfragen pro Produktname zusammengefasst; sortiert nach Wortähnlichkeit, dann Aktualität
+-- Treffer enthalten jedes Suchwort (wie SQLiteStorage.search_products). Pro Quelle werden nur die p_candidates
+-- ähnlichsten Zeilen gelesen und erst danach gruppiert; das längste Wort nutzt den Trigramm-Index
+DROP FUNCTION IF EXISTS search_products(TEXT, INTEGER, INTEGER);
+CREATE OR REPLACE FUNCTION search_products(p_query TEXT, p_limit INTEGER DEFAULT 20, p_offset INTEGER DEFAULT 0,
+                                           p_candidates INTEGER DEFAULT 1000)
+RETURNS TABLE (
+    kind TEXT,
+    id INTEGER,
+    product_name TEXT,
+    source TEXT,
+    hits BIGINT,
+    rss_price DECIMAL,
+    ebay_price DECIMAL,
+    profit DECIMAL,
+    last_seen TIMESTAMP WITH TIME ZONE,
+    rank REAL
+) AS $$
+#variable_conflict use_column
+DECLARE
+    v_patterns TEXT[] := ARRAY(
+        SELECT '%' || replace(replace(replace(w.word, '\', '\\'), '%', '\%'), '_', '\_') || '%'
+        FROM regexp_split_to_table(lower(btrim(p_query)), '\s+') AS w(word)
+        WHERE w.word <> ''
+        ORDER BY length(w.word) DESC
+    );
+BEGIN
+    RETURN QUERY
+    WITH deal_candidates AS (
+        SELECT d.id, d.product_name, d.source, d.rss_price, d.ebay_price, d.profit, d."timestamp"
+        FROM deals d
+        WHERE d.product_name ILIKE v_patterns[1] AND d.product_name ILIKE ALL (v_patterns)
+        ORDER BY word_similarity(p_query, d.product_name) DESC, d."timestamp" DESC
+        LIMIT p_candidates
+    ), history AS (
+        (SELECT q.product_name, q.source, 1::BIGINT AS hits, q.rss_price, q.ebay_sold_price AS sold_price, q.profit, q."timestamp" AS seen_at
+         FROM ebay_queries q
+         WHERE q.product_name ILIKE v_patterns[1] AND q.product_name ILIKE ALL (v_patterns)
+         ORDER BY word_similarity(p_query, q.product_name) DESC, q."timestamp" DESC
+         LIMIT p_candidates)
+        UNION ALL
+        (SELECT s.product_name, s.source, s.query_count::BIGINT, s.avg_rss_price, s.median_sold_price, s.max_profit, s.day::TIMESTAMP WITH TIME ZONE
+         FROM ebay_query_daily_summaries s
+         WHERE s.product_name ILIKE v_patterns[1] AND s.product_name ILIKE ALL (v_patterns)
+         ORDER BY word_similarity(p_query, s.product_name) DESC, s.day DESC
+         LIMIT p_candidates)
+    ), results AS (
+        SELECT 'deal'::TEXT AS kind, d.id, d.product_name, d.source::TEXT, 1::BIGINT AS hits,
+               d.rss_price::DECIMAL, d.ebay_price::DECIMAL, d.profit::DECIMAL, d."timestamp" AS last_seen
+        FROM deal_candidates d
+        UNION ALL
+        SELECT 'query'::TEXT, NULL::INTEGER, h.product_name, MIN(h.source)::TEXT, SUM(h.hits)::BIGINT,
+               ROUND(AVG(h.rss_price), 2), ROUND(AVG(h.sold_price), 2), MAX(h.profit)::DECIMAL, MAX(h.seen_at)
+        FROM history h
+        GROUP BY h.product_name
+    )
+    SELECT r.kind, r.id, r.product_name, r.source, r.hits, r.rss_price, r.ebay_price, r.profit, r.last_seen,
+           word_similarity(p_query, r.product_name) AS rank
+    FROM results r
+    ORDER BY word_similarity(p_query, r.product_name) DESC, similarity(p_query, r.product_name) DESC, r.last_seen DESC NULLS LAST
+    LIMIT p_limit OFFSET p_offset;
+END;
+$$ LANGUAGE plpgsql STABLE;
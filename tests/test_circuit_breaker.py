@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+import app
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = app.CircuitBreaker('test', failure_threshold=2, reset_seconds=0.2)
+
+    breaker.record_failure(RuntimeError('HTTP 503'))
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure(RuntimeError('HTTP 503'))
+    assert breaker.state == 'open'
+
+    # Cooldown: calls are rejected without using up the probe
+    assert breaker.is_open()
+    assert not breaker.allow()
+    with pytest.raises(app.CircuitOpenError):
+        breaker.call(lambda: 'never called')
+    assert breaker.rejected_calls == 2
+
+    time.sleep(0.25)
+    assert not breaker.is_open()
+    assert breaker.allow()  # the single half-open probe
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.snapshot()['consecutive_failures'] == 0
+
+
+def failing_call():
+    raise ValueError('still down')
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = app.CircuitBreaker('test', failure_threshold=1, reset_seconds=0.1)
+    breaker.record_failure(ValueError('https://svcs.ebay.com/?SECURITY-APPNAME=secret'))
+    time.sleep(0.15)
+
+    with pytest.raises(ValueError):
+        breaker.call(failing_call)
+
+    assert breaker.state == 'open'
+    snapshot = breaker.snapshot()
+    assert snapshot['last_error_type'] == 'ValueError'
+    assert 'last_error' not in snapshot
+    assert breaker.snapshot(include_error_text=True)['last_error'] == 'still down'
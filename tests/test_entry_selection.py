@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app
+
+FEED = 'https://www.mydealz.de/rss/alle'
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    backend = app.SQLiteStorage(str(tmp_path / 'arbibot.db'))
+    monkeypatch.setattr(app, 'get_storage', lambda: backend)
+    yield backend
+    backend.close()
+
+
+def item(guid, hours_old, title='Bosch GSR 12V', categories=(), temperature=None):
+    return app.FeedItem(guid=guid, title=title, description='', link=f'https://example.com/{guid}',
+                        published_at=(NOW - timedelta(hours=hours_old)).isoformat(), categories=list(categories),
+                        temperature=temperature, merchant_price=None)
+
+
+def test_score_prefers_fresh_unseen_priced_hot_entries():
+    fresh = item('a', 0, title='Bosch GSR 12V für 59€', temperature=500)
+    assert app.score_feed_item(fresh, NOW) > app.score_feed_item(fresh, NOW, seen_guids={'a'})
+    assert app.score_feed_item(item('b', 0), NOW) > app.score_feed_item(item('b', 12), NOW)
+    assert app.score_feed_item(item('c', 0, categories=['Gutscheine']), NOW) < app.score_feed_item(item('c', 12), NOW)
+
+
+def test_unprocessed_entries_carry_over_to_the_next_run(storage):
+    first_run = [
+        item('old', 10),
+        item('hot', 0, title='Bosch GHG 18V-50 für 89€', temperature=800),
+        item('voucher', 0, title='10€ Gutschein', categories=['Gutscheine']),
+        item('expired', app.ENTRY_MAX_AGE_HOURS + 1),
+    ]
+
+    selected, pending = app.select_feed_items(FEED, first_run, 1, NOW)
+    assert [entry.guid for entry in selected] == ['hot']
+    assert pending == 2  # 'expired' is never selected
+    app.mark_feed_items_processed(FEED, [entry.guid for entry in selected])
+
+    # Next poll: the feed still lists the old entries plus a new one, all of the first run were seen
+    later = NOW + timedelta(hours=1)
+    second_run = first_run + [item('new', -1, title='Makita DHP484 für 99€')]  # published at 'later'
+    seen = {entry.guid for entry in first_run}
+
+    selected, pending = app.select_feed_items(FEED, second_run, 3, later, seen_guids=seen)
+
+    assert [entry.guid for entry in selected] == ['new', 'old', 'voucher']
+    assert pending == 0
+    rows = storage._query('SELECT guid, status FROM feed_entries ORDER BY guid')
+    assert {row['guid']: row['status'] for row in rows}['hot'] == 'processed'
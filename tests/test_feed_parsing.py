@@ -0,0 +1,17 @@
+import pytest
+
+import app
+
+FEED = (b'<rss><channel><item><title>Tom &amp;amp; Jerry &nbsp;& Co</title>'
+        b'<description><![CDATA[<p>S&amp;P 500 &nbsp; & mehr]]&gt;</p>]]></description><guid>1</guid></item>'
+        b'</channel></rss>')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 8, 9, 10, len(FEED)])
+def test_entities_are_repaired_outside_cdata_only(chunk_size):
+    chunks = [FEED[i:i + chunk_size] for i in range(0, len(FEED), chunk_size)]
+
+    assert b''.join(app._repaired_feed_chunks(chunks)) == app.repair_feed_entities(FEED)
+    item, = app.iter_feed_entries(chunks)
+    assert item.title == 'Tom & Jerry \xa0& Co'
+    assert item.description == 'S&P 500 & mehr]]>'
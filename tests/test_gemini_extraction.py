@@ -0,0 +1,93 @@
+import pytest
+from google.api_core import exceptions as api_exceptions
+from google.generativeai import protos
+from google.generativeai.types import GenerateContentResponse
+
+import app
+
+
+class FakeModel:
+    def __init__(self, reply):
+        self.reply = reply
+
+    def generate_content(self, entry_text):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return self.reply
+
+
+def blocked_reply():
+    """Reply without parts, its .text raises ValueError mentioning the generate-content docs"""
+    return GenerateContentResponse.from_response(protos.GenerateContentResponse({'candidates': [{'finish_reason': 'MAX_TOKENS'}]}))
+
+
+def json_reply(text):
+    return GenerateContentResponse.from_response(protos.GenerateContentResponse(
+        {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finish_reason': 'STOP'}]}))
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = app.CircuitBreaker('gemini', failure_threshold=2, reset_seconds=60)
+    monkeypatch.setitem(app.CIRCUIT_BREAKERS, 'gemini', breaker)
+    return breaker
+
+
+@pytest.fixture
+def models(monkeypatch):
+    models = {}
+    monkeypatch.setattr(app, 'get_gemini_extraction_model', lambda model_name=None: models[model_name])
+    return models
+
+
+def test_reply_without_parts_is_an_invalid_reply(breaker, models):
+    models['primary-model'] = FakeModel(blocked_reply())
+    tier = app.ExtractionTier('primary', 'primary-model', 10)
+
+    with pytest.raises(ValueError, match='generate-content'):
+        tier.extract('Bosch GHG 18V-50 für 89€')
+
+    assert tier.metrics['invalid_replies'] == 1
+    assert tier.metrics['rate_limited'] == 0
+    assert tier.budget.wait_time() == 0
+    assert breaker.consecutive_failures == 0
+
+
+def test_server_error_is_a_breaker_failure_not_throttling(breaker, models):
+    error = api_exceptions.InternalServerError('POST https://generativelanguage.googleapis.com/v1beta/models/m:generateContent')
+    models['primary-model'] = FakeModel(error)
+    tier = app.ExtractionTier('primary', 'primary-model', 10)
+
+    with pytest.raises(api_exceptions.InternalServerError):
+        tier.extract('Bosch GHG 18V-50 für 89€')
+
+    assert not app._is_rate_limit_error(error)
+    assert tier.metrics['failures'] == 1
+    assert tier.metrics['rate_limited'] == 0
+    assert breaker.consecutive_failures == 1
+
+
+def test_quota_error_blocks_the_budget(breaker, models):
+    error = api_exceptions.ResourceExhausted('Quota exceeded, retry in 7s')
+    models['primary-model'] = FakeModel(error)
+    tier = app.ExtractionTier('primary', 'primary-model', 10)
+
+    with pytest.raises(api_exceptions.ResourceExhausted):
+        tier.extract('Bosch GHG 18V-50 für 89€')
+
+    assert tier.metrics['rate_limited'] == 1
+    assert tier.budget.wait_time() > 10
+    assert breaker.consecutive_failures == 0
+
+
+def test_blocked_reply_escalates(breaker, models, monkeypatch):
+    models['primary-model'] = FakeModel(blocked_reply())
+    models['strong-model'] = FakeModel(json_reply('{"products": [{"name": "Bosch GHG 18V-50", "price": 89.0, "confidence": 0.95}]}'))
+    tiers = {'primary': app.ExtractionTier('primary', 'primary-model', 10),
+             'escalation': app.ExtractionTier('escalation', 'strong-model', 10)}
+    monkeypatch.setattr(app, 'get_extraction_tiers', lambda: tiers)
+    monkeypatch.setattr(app, 'get_gemini_model', lambda: object())
+
+    assert app.extract_product_info_with_gemini('Bosch GHG 18V-50 für 89€', '') == [('Bosch GHG 18V-50', 89.0)]
+    assert tiers['primary'].metrics['invalid_replies'] == 1
+    assert tiers['escalation'].metrics['escalations'] == 1
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+import app
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def polled_feed(hours_ago, **fields):
+    feed = {'last_polled_at': (NOW - timedelta(hours=hours_ago)).isoformat(), 'recent_guids': ['a'],
+            'poll_interval_minutes': 120}
+    feed.update(fields)
+    return feed
+
+
+def test_first_poll_keeps_the_current_interval():
+    assert app.compute_poll_interval({'poll_interval_minutes': 90}, 50, 50, NOW) == (None, 90)
+    assert app.compute_poll_interval({}, 0, 0, NOW) == (None, app.FEED_DEFAULT_POLL_MINUTES)
+
+
+def test_rate_is_smoothed_and_targets_half_the_scan_window(monkeypatch):
+    monkeypatch.setattr(app, 'ENTRY_SCAN_LIMIT', 50)
+    feed = polled_feed(0.5, new_entries_per_hour=10.0, max_entries=5)
+
+    rate, interval = app.compute_poll_interval(feed, 10, 50, NOW)
+
+    assert rate == 0.3 * 20 + 0.7 * 10
+    assert interval == int(60 * 25 / rate)  # half of the 50 scanned entries, not of max_entries
+
+
+def test_short_feed_uses_its_own_length_as_window(monkeypatch):
+    monkeypatch.setattr(app, 'ENTRY_SCAN_LIMIT', 50)
+
+    rate, interval = app.compute_poll_interval(polled_feed(1), 2, 20, NOW)
+
+    assert (rate, interval) == (2.0, 300)
+
+
+def test_no_new_entries_backs_off_to_the_maximum():
+    feed = polled_feed(2, new_entries_per_hour=0.0, max_poll_interval_minutes=600)
+
+    assert app.compute_poll_interval(feed, 0, 50, NOW) == (0.0, 600)
+
+
+def test_saturated_poll_at_least_halves_the_interval(monkeypatch):
+    monkeypatch.setattr(app, 'ENTRY_SCAN_LIMIT', 50)
+    feed = polled_feed(10, poll_interval_minutes=200)
+
+    # 10 of 10 entries new: the rate alone would allow 60 * 5 / 1 = 300 minutes
+    assert app.compute_poll_interval(feed, 10, 10, NOW) == (1.0, 100)
+    # The minimum still applies
+    assert app.compute_poll_interval(dict(feed, poll_interval_minutes=20), 10, 10, NOW) == (1.0, app.FEED_MIN_POLL_MINUTES)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import app
+
+
+class ScriptedProvider(app.PriceProvider):
+    """First attempt and hedge behave differently; records when each call started"""
+
+    name = 'ebay_sold'
+
+    def __init__(self, first, hedge=None, hedge_after_seconds=None):
+        self.first = first
+        self.hedge = hedge
+        self.hedge_after_seconds = hedge_after_seconds
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def lookup(self, product_name, deadline, progress=None):
+        hedged = progress is not None and progress.hedge
+        with self._lock:
+            self.calls.append((time.monotonic(), hedged))
+        delay, price = self.hedge if hedged else self.first
+        time.sleep(delay)
+        if isinstance(price, Exception):
+            raise price
+        return app.ProviderPrice(provider=self.name, kind=self.kind, price=price, item_count=1, error_message=None)
+
+
+def test_provider_without_answer_in_budget_reports_timeout():
+    provider = ScriptedProvider(first=(1.0, 120.0))
+
+    results = app.fetch_market_prices('Bosch GHG 18V-50', [provider], budget_seconds=0.3)
+
+    assert results['ebay_sold'].price is None
+    assert results['ebay_sold'].error_message == 'Timeout after 0.3s'
+
+
+def test_hedge_starts_after_hedge_delay_and_wins():
+    provider = ScriptedProvider(first=(1.0, 100.0), hedge=(0.0, 120.0), hedge_after_seconds=0.2)
+    started = time.monotonic()
+
+    results = app.fetch_market_prices('Bosch GHG 18V-50', [provider], budget_seconds=2)
+
+    assert results['ebay_sold'].price == 120.0
+    assert time.monotonic() - started < 0.8
+    (first_at, first_hedged), (hedge_at, hedged) = provider.calls
+    assert not first_hedged and hedged
+    assert hedge_at - first_at >= 0.2
+
+
+def test_failed_first_attempt_does_not_end_the_race_while_the_hedge_runs():
+    provider = ScriptedProvider(first=(0.3, RuntimeError('HTTP 503')), hedge=(0.4, 120.0), hedge_after_seconds=0.1)
+
+    results = app.fetch_market_prices('Bosch GHG 18V-50', [provider], budget_seconds=2)
+
+    assert results['ebay_sold'].price == 120.0
+    assert results['ebay_sold'].error_message is None
+
+
+def test_failed_attempt_is_reported_when_the_hedge_finds_nothing():
+    provider = ScriptedProvider(first=(0.3, RuntimeError('HTTP 503')), hedge=(0.4, None), hedge_after_seconds=0.1)
+
+    results = app.fetch_market_prices('Bosch GHG 18V-50', [provider], budget_seconds=2)
+
+    assert results['ebay_sold'].price is None
+
+
+def test_combine_weights_sold_prices_and_ignores_offers():
+    providers = [
+        app.StaticPriceProvider({'Bosch GHG 18V-50': 120.0}, name='ebay_sold'),
+        app.StaticPriceProvider({'Bosch GHG 18V-50': 90.0}, name='price_history', weight=0.5),
+        app.StaticPriceProvider({'Bosch GHG 18V-50': 60.0}, name='ebay_offer', kind='offer'),
+    ]
+
+    results = app.fetch_market_prices('Bosch GHG 18V-50', providers, budget_seconds=1)
+
+    assert results['ebay_offer'].price == 60.0
+    assert app.combine_market_prices(results, providers) == (120.0 + 0.5 * 90.0) / 1.5
+    assert app.combine_market_prices({'ebay_offer': results['ebay_offer']}, providers) is None
@@ -0,0 +1,53 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    backend = app.SQLiteStorage(str(tmp_path / 'arbibot.db'))
+    monkeypatch.setattr(app, 'get_storage', lambda: backend)
+    yield backend
+    backend.close()
+
+
+POLICY = app.ProfitPolicy(name='test', fee_rate=0.1, fixed_fee=0.35, shipping_cost=4.99, threshold=15)
+
+
+def test_net_profit_formula():
+    row = {'id': 7, 'timestamp': '2026-03-01T10:00:00+00:00', 'source': 'mydealz',
+           'rss_price': 50.0, 'ebay_price': 100.0, 'ebay_sold_price': 90.0}
+
+    score = app.score_ebay_query(row, POLICY, 'now')
+
+    assert score['market_price'] == 100.0  # the price of the live check wins over the sold median
+    assert score['fees'] == 10.35
+    assert score['gross_profit'] == 50.0
+    assert score['net_profit'] == 34.66
+    assert score['profitable'] is True
+    assert score['day'] == '2026-03-01'
+    assert app.score_ebay_query(dict(row, ebay_price=None), POLICY, 'now')['market_price'] == 90.0
+    assert app.score_ebay_query(dict(row, rss_price=None), POLICY, 'now') is None
+
+
+def test_rescore_totals_include_archived_rows(storage, monkeypatch):
+    monkeypatch.setattr(app, 'PROFIT_THRESHOLD', 15.0)
+    rows = [
+        (50.0, 100.0, None),  # net 34.66, gross 50: profitable under both rules
+        (60.0, None, 78.0),  # net 5.88, gross 18: only the live rule
+        (60.0, 70.0, None),  # net -2.34, gross 10: neither
+        (40.0, None, None),  # no market price: skipped
+    ]
+    for rss_price, ebay_price, sold_price in rows:
+        storage.insert_ebay_query({'source': 'mydealz', 'product_name': 'Bosch GSR 12V', 'rss_price': rss_price,
+                                   'ebay_price': ebay_price, 'ebay_sold_price': sold_price})
+    storage._execute("INSERT INTO ebay_query_archive (id, timestamp, source, rss_price, ebay_price, ebay_sold_price) "
+                     "VALUES (1000, '2026-01-01T00:00:00+00:00', 'mydealz', 20.0, 50.0, NULL)")  # net 19.66, gross 30
+
+    totals = app.rescore_ebay_queries(POLICY, page_size=2)
+
+    assert totals == {"rows": 5, "scored": 4, "profitable": 2, "profit_sum": 54.32, "live_rule_profitable": 3}
+    assert app.rescore_ebay_queries(POLICY) == totals  # scores are replaced, not duplicated
+    assert storage._execute('SELECT COUNT(*) FROM ebay_query_scores').fetchone()[0] == 4
+    since = app.rescore_ebay_queries(POLICY, since='2026-02-01')
+    assert since["rows"] == 4 and since["scored"] == 3
@@ -0,0 +1,67 @@
+import pytest
+
+import app
+
+LOCK = 'process_rss_feeds'
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    backend = app.SQLiteStorage(str(tmp_path / 'arbibot.db'))
+    monkeypatch.setattr(app, 'get_storage', lambda: backend)
+    yield backend
+    backend.close()
+
+
+def lock_owner(storage):
+    row = storage._execute('SELECT owner FROM run_locks WHERE name = ?', (LOCK,)).fetchone()
+    return row['owner'] if row else None
+
+
+def test_second_acquire_is_rejected(storage):
+    assert storage.acquire_run_lock(LOCK, 'a', 60)
+    assert not storage.acquire_run_lock(LOCK, 'b', 60)
+    assert storage.acquire_run_lock(LOCK, 'a', 60)  # the owner may re-acquire
+    assert lock_owner(storage) == 'a'
+
+
+def test_expired_lock_is_taken_over_and_old_owner_cannot_renew(storage):
+    assert storage.acquire_run_lock(LOCK, 'a', -1)  # already expired: a crashed run
+
+    assert storage.acquire_run_lock(LOCK, 'b', 60)
+    assert lock_owner(storage) == 'b'
+    assert not storage.renew_run_lock(LOCK, 'a', 60)
+    assert storage.renew_run_lock(LOCK, 'b', 60)
+
+
+def test_release_by_non_owner_is_a_no_op(storage):
+    assert storage.acquire_run_lock(LOCK, 'a', 60)
+
+    storage.release_run_lock(LOCK, 'b')
+    assert lock_owner(storage) == 'a'
+    storage.release_run_lock(LOCK, 'a')
+    assert lock_owner(storage) is None
+
+
+def test_nested_run_lock_raises(storage):
+    with app.RunLock(LOCK, lease_seconds=60) as outer:
+        with pytest.raises(app.RunAlreadyActiveError):
+            with app.RunLock(LOCK, lease_seconds=60):
+                pass
+        assert outer.state() == 'held'
+        assert lock_owner(storage) == outer.owner
+    assert lock_owner(storage) is None
+
+
+def test_run_lock_reports_takeover_as_lost(storage):
+    with app.RunLock(LOCK, lease_seconds=0.3) as run_lock:
+        storage._execute('UPDATE run_locks SET owner = ? WHERE name = ?', ('other', LOCK))
+        assert run_lock.lost.wait(1)
+        assert run_lock.state() == 'lost'
+    assert lock_owner(storage) == 'other'  # a lost lock is not released
+
+
+def test_missing_run_locks_table_is_reported(storage):
+    storage._execute('DROP TABLE run_locks')
+    with app.RunLock(LOCK) as run_lock:
+        assert run_lock.state() == 'unavailable'
@@ -0,0 +1,14 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('title, expected', [
+    ('Bosch GHG 18V-50 für 89,99€ (statt 120€)', ('Bosch GHG 18V-50', 89.99, 0.95)),
+    ('[Amazon] Sony WH-1000XM5 für 279€', ('Sony WH-1000XM5', 279.0, 0.95)),
+    ('Xbox Series X 1TB für 399€ + 2 Spiele gratis', None),
+    ('Xbox Series X 1TB für 399€ inkl. Controller', None),
+    ('Apple AirPods Pro oder AirPods 3 für 199€', None),
+])
+def test_title_price_extractor(title, expected):
+    assert app.TitlePriceExtractor().product_from_title(title) == expected
@@ -0,0 +1,153 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def storage(tmp_path):
+    backend = app.SQLiteStorage(str(tmp_path / 'arbibot.db'))
+    yield backend
+    backend.close()
+
+
+def test_backend_without_all_methods_fails_at_construction():
+    class PartialStorage(app.StorageBackend):
+        def create_log(self, entry):
+            return 1
+
+    with pytest.raises(TypeError):
+        PartialStorage()
+
+
+def test_logs(storage):
+    first = storage.create_log({'source': 'mydealz', 'status': 'running'})
+    second = storage.create_log({'source': 'dealdoktor', 'status': 'running'})
+    storage.update_log(first, {'status': 'success', 'products_found': 3})
+
+    logs = {row['id']: row for row in storage.recent_logs(10)}
+    assert set(logs) == {first, second}
+    assert logs[first]['status'] == 'success'
+    assert logs[first]['products_found'] == 3
+
+    changed = storage.logs_updated_since(logs[second]['updated_at'])
+    assert [row['id'] for row in changed] == [first]
+
+
+def test_deals(storage):
+    assert storage.latest_deal_id() == 0
+    for price in (10.0, 20.0):
+        storage.insert_deal({'source': 'mydealz', 'product_name': f'Produkt {price}',
+                             'rss_price': price, 'ebay_price': price * 2, 'profit': price})
+
+    latest = storage.latest_deal_id()
+    assert len(storage.recent_deals(10)) == 2
+    assert [row['rss_price'] for row in storage.deals_after(latest - 1)] == [20.0]
+    assert storage.deals_after(latest) == []
+
+
+def test_ebay_queries(storage):
+    log_id = storage.create_log({'source': 'mydealz', 'status': 'running'})
+    storage.insert_ebay_query({'log_id': log_id, 'source': 'mydealz', 'product_name': 'Bosch GSR 12V',
+                               'rss_price': 59.0, 'ebay_sold_price': 80.0, 'query_successful': True})
+    storage.insert_ebay_query({'log_id': None, 'source': 'mydealz', 'product_name': 'Makita DHP',
+                               'rss_price': 99.0, 'query_successful': False})
+
+    rows = storage.ebay_queries_for_log(log_id)
+    assert len(rows) == 1
+    assert rows[0]['query_successful'] is True
+    recent = {row['product_name']: row for row in storage.recent_ebay_queries(10)}
+    assert recent['Bosch GSR 12V']['ebay_sold_price'] == 80.0
+    assert recent['Makita DHP']['ebay_sold_price'] is None
+
+
+def test_price_history(storage):
+    row = {'canonical_name': 'bosch gsr 12v', 'product_name': 'Bosch GSR 12V', 'sample_count': 2,
+           'median_price': 75.0, 'samples': [{'price': 70.0}, {'price': 80.0}]}
+    storage.upsert_price_history(row)
+    storage.upsert_price_history(dict(row, sample_count=3, samples=row['samples'] + [{'price': 90.0}]))
+
+    histories = storage.get_price_histories(['bosch gsr 12v', 'unbekannt'])
+    assert len(histories) == 1
+    assert histories[0]['sample_count'] == 3
+    assert histories[0]['samples'][-1] == {'price': 90.0}
+
+
+def test_search_products(storage):
+    storage.insert_deal({'source': 'mydealz', 'product_name': 'Bosch GHG 18V-50 Heißluftgebläse',
+                         'rss_price': 89.0, 'ebay_price': 120.0, 'profit': 31.0})
+    for price in (90.0, 110.0):
+        storage.insert_ebay_query({'source': 'mydealz', 'product_name': 'Bosch GHG 18V-50',
+                                   'rss_price': price, 'ebay_sold_price': 120.0})
+    storage.insert_ebay_query({'source': 'mydealz', 'product_name': 'Bosch GSR 12V', 'rss_price': 59.0})
+
+    rows = storage.search_products('ghg bosch', 10)
+    assert [(row['kind'], row['product_name']) for row in rows] == [
+        ('query', 'Bosch GHG 18V-50'), ('deal', 'Bosch GHG 18V-50 Heißluftgebläse')]
+    assert rows[0]['hits'] == 2
+    assert rows[0]['rss_price'] == 100.0
+    assert storage.search_products('bosch 100%', 10) == []
+
+
+def test_daily_stats_increments_counters_and_keeps_profit_max(storage):
+    storage.increment_daily_stats('2026-03-01', 'mydealz', {'runs': 1, 'deals': 2, 'profit_sum': 40.0, 'profit_max': 25.0})
+    storage.increment_daily_stats('2026-03-01', 'mydealz', {'runs': 1, 'deals': 1, 'profit_sum': 10.0, 'profit_max': None})
+    storage.increment_daily_stats('2026-03-01', 'dealdoktor', {'runs': 1, 'profit_max': None})
+
+    rows = {row['source']: row for row in storage.daily_stats('2026-03-01')}
+    assert rows['mydealz']['runs'] == 2
+    assert rows['mydealz']['deals'] == 3
+    assert rows['mydealz']['profit_sum'] == 50.0
+    assert rows['mydealz']['profit_max'] == 25.0
+    assert rows['mydealz']['ebay_queries'] == 0
+    assert rows['dealdoktor']['profit_max'] is None
+
+    storage.increment_daily_stats('2026-03-01', 'dealdoktor', {'runs': 1, 'profit_max': 12.5})
+    storage.increment_daily_stats('2026-03-01', 'dealdoktor', {'runs': 1, 'profit_max': 8.0})
+    assert {row['source']: row for row in storage.daily_stats('2026-03-01')}['dealdoktor']['profit_max'] == 12.5
+
+
+def test_retention_compacts_merges_and_archives(storage):
+    now = datetime.now(timezone.utc)
+    old = (now - timedelta(days=40)).replace(hour=12).isoformat()
+    day = old[:10]
+    # An earlier compaction of the same day saw only queries without RSS price
+    storage._insert('ebay_query_daily_summaries', {'day': day, 'source': 'mydealz', 'product_name': 'Bosch GSR 12V',
+                                                   'query_count': 3, 'successful_count': 0, 'avg_rss_price': None,
+                                                   'rss_price_count': 0})
+    late_rows = [(100.0, 120.0, True), (50.0, None, False), (None, None, False)]
+    for rss_price, sold_price, successful in late_rows:
+        storage._insert('ebay_queries', {'timestamp': old, 'created_at': old, 'source': 'mydealz', 'product_name': 'Bosch GSR 12V',
+                                         'rss_price': rss_price, 'ebay_sold_price': sold_price, 'query_successful': successful})
+    storage.insert_ebay_query({'source': 'mydealz', 'product_name': 'Bosch GSR 12V', 'rss_price': 60.0, 'ebay_sold_price': 80.0})
+    storage._insert('logs', {'timestamp': old, 'created_at': old, 'updated_at': old, 'source': 'mydealz', 'status': 'Success'})
+
+    assert storage.run_retention(30, 30) == {"ebay_queries_compacted": 3, "logs_deleted": 1}
+
+    summary, = storage._query('SELECT * FROM ebay_query_daily_summaries')
+    assert summary['query_count'] == 6
+    assert summary['rss_price_count'] == 2
+    assert summary['avg_rss_price'] == 75.0  # the earlier NULL average does not count as 0 €
+    assert summary['median_sold_price'] == 120.0
+    archived = storage._query('SELECT * FROM ebay_query_archive')
+    assert [(row['rss_price'], row['ebay_sold_price']) for row in archived] == [(100.0, 120.0)]
+    assert [row['rss_price'] for row in storage.recent_ebay_queries(10)] == [60.0]
+
+
+def test_close_closes_connections_of_all_threads(storage):
+    connections = [storage._connection()]
+    threads = [threading.Thread(target=lambda: connections.append(storage._connection())) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+        thread.join()
+    assert len({id(connection) for connection in connections}) == 3
+
+    storage.close()
+
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
+    assert storage.recent_logs(1) == []  # a later call opens a new connection